@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Compare les transports de l'API sur la même image : multipart, JSON/base64
+et trames binaires WebSocket
+
+Pour chaque transport : débit, latences p50/p95, CPU du client et, avec
+--server-pid (Linux), CPU du serveur par image. Avec une petite image et
+un modèle rapide, l'écart de CPU serveur mesure le coût du transport
+(parsing multipart, base64) plutôt que celui de l'inférence.
+
+Usage :
+    python benchmark_transports.py http://localhost:8000 test_image.png --requests 200 --concurrency 8
+    python benchmark_transports.py http://localhost:8000 tiny_test.png --server-pid $(pgrep -f main.py)
+"""
+
+import argparse
+import asyncio
+import base64
+import os
+import statistics
+import time
+from typing import Awaitable, Callable, List, Optional
+
+import httpx
+
+from client import AsyncBackgroundRemovalClient, StreamingBackgroundRemovalClient
+
+TRANSPORTS = ('multipart', 'base64', 'websocket')
+
+
+def server_cpu_seconds(pid: Optional[int]) -> Optional[float]:
+    """Temps CPU (utilisateur + système) du processus serveur et de ses enfants terminés"""
+    if pid is None:
+        return None
+    with open(f"/proc/{pid}/stat") as handle:
+        fields = handle.read().rsplit(")", 1)[1].split()
+    # utime, stime, cutime, cstime (champs 14 à 17)
+    return sum(int(value) for value in fields[11:15]) / os.sysconf("SC_CLK_TCK")
+
+
+async def run_requests(call: Callable[[], Awaitable[None]], requests: int, concurrency: int) -> List[float]:
+    """Latences (ms) de `requests` appels, au plus `concurrency` à la fois"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one():
+        async with semaphore:
+            started = time.perf_counter()
+            await call()
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    await asyncio.gather(*(one() for _ in range(requests)))
+    return latencies
+
+
+async def benchmark(transport: str, api_url: str, path: str, model: str,
+                    requests: int, concurrency: int, server_pid: Optional[int]) -> dict:
+    """Mesures d'un transport (une requête de chauffe non comptée)"""
+    # Les clients reçoivent le chemin, pour envoyer le type MIME du fichier
+    if transport == 'multipart':
+        client = AsyncBackgroundRemovalClient(api_url, max_concurrency=concurrency, max_retries=0)
+
+        async def call():
+            await client.remove_background(path, model=model)
+    elif transport == 'base64':
+        client = httpx.AsyncClient(
+            base_url=api_url, timeout=120.0,
+            limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        )
+        with open(path, "rb") as handle:
+            encoded = base64.b64encode(handle.read()).decode()
+
+        async def call():
+            response = await client.post("/remove-background-base64", json={'image': encoded, 'model': model})
+            response.raise_for_status()
+            base64.b64decode(response.json()['image'])
+    else:
+        client = StreamingBackgroundRemovalClient(api_url, max_in_flight=concurrency, max_retries=0)
+        await client.connect()
+
+        async def call():
+            await client.remove_background(path, model=model)
+
+    try:
+        await call()
+        cpu_before, server_before = time.process_time(), server_cpu_seconds(server_pid)
+        started = time.perf_counter()
+        latencies = await run_requests(call, requests, concurrency)
+        elapsed = time.perf_counter() - started
+        cpu, server_after = time.process_time() - cpu_before, server_cpu_seconds(server_pid)
+    finally:
+        if isinstance(client, httpx.AsyncClient):
+            await client.aclose()
+        else:
+            await client.close()
+
+    latencies.sort()
+    results = {
+        'transport': transport,
+        'req_s': requests / elapsed,
+        'p50_ms': statistics.median(latencies),
+        'p95_ms': latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+        'client_cpu_ms': cpu * 1000 / requests,
+    }
+    if server_before is not None:
+        results['server_cpu_ms'] = (server_after - server_before) * 1000 / requests
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare les transports de l'API (multipart, base64, WebSocket)")
+    parser.add_argument("api_url")
+    parser.add_argument("image")
+    parser.add_argument("--model", default="u2net")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--transports", default=",".join(TRANSPORTS),
+                        help=f"Transports à mesurer, parmi {','.join(TRANSPORTS)}")
+    parser.add_argument("--server-pid", type=int, default=None,
+                        help="PID du serveur (Linux) pour mesurer son CPU par image")
+    args = parser.parse_args()
+
+    print(f"🚀 {args.requests} requêtes par transport, {args.concurrency} en parallèle, "
+          f"image de {os.path.getsize(args.image)} bytes, modèle {args.model}")
+
+    for transport in args.transports.split(","):
+        try:
+            results = asyncio.run(benchmark(
+                transport, args.api_url, args.image, args.model,
+                args.requests, args.concurrency, args.server_pid
+            ))
+        except Exception as e:
+            print(f"❌ {transport}: {e}")
+            continue
+        line = (f"📊 {transport:<10} {results['req_s']:7.1f} req/s  "
+                f"p50 {results['p50_ms']:7.1f} ms  p95 {results['p95_ms']:7.1f} ms  "
+                f"CPU client {results['client_cpu_ms']:5.2f} ms/req")
+        if 'server_cpu_ms' in results:
+            line += f"  CPU serveur {results['server_cpu_ms']:6.2f} ms/req"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,520 @@
+#!/usr/bin/env python3
+"""
+Client Python de l'API de suppression de background (sync et asyncio)
+
+Une connexion keep-alive est réutilisée entre les requêtes (pool httpx),
+les envois concurrents sont bornés, et les réponses 429/503 sont réessayées
+avec un backoff exponentiel qui respecte l'en-tête Retry-After. Les fichiers
+sont envoyés en flux depuis le disque, sans être chargés en mémoire.
+
+Usage :
+    with BackgroundRemovalClient("http://localhost:8000") as client:
+        result = client.remove_background("photo.jpg", model="auto")
+        result.save("photo.png")
+        for path, outcome in client.map("photos/", "detoure/"):
+            ...
+
+    async with AsyncBackgroundRemovalClient("http://localhost:8000") as client:
+        result = await client.remove_background("photo.jpg")
+
+    # Trafic interne : trames binaires sur une connexion WebSocket (paquet websockets)
+    async with StreamingBackgroundRemovalClient("http://localhost:8000") as client:
+        results = await asyncio.gather(*(client.remove_background(path) for path in paths))
+
+    python client.py http://localhost:8000 photos/ detoure/ --model auto
+"""
+
+import asyncio
+import email.utils
+import itertools
+import json
+import mimetypes
+import os
+import random
+import struct
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple, Union
+
+import httpx
+
+# Statuts réessayés : surcharge (429) ou service pas encore prêt (503)
+RETRY_STATUSES = (429, 503)
+DEFAULT_TIMEOUT = httpx.Timeout(120.0, connect=10.0)
+# Images soumises à la fois par map(), par envoi simultané : la mémoire ne
+# dépend pas de la taille du répertoire
+IN_FLIGHT_PER_WORKER = 2
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.gif', '.bmp', '.tiff')
+OUTPUT_EXTENSIONS = {
+    'image/png': '.png',
+    'image/apng': '.png',
+    'image/jpeg': '.jpg',
+    'image/webp': '.webp',
+}
+
+Source = Union[str, os.PathLike, bytes]
+
+
+class RemovalError(Exception):
+    """Erreur renvoyée par l'API (ou retries épuisés)"""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(f"{status_code}: {detail}")
+        self.status_code = status_code
+        self.detail = detail
+
+
+class RemovalResult:
+    """Image détourée et métadonnées de la réponse"""
+
+    def __init__(self, content: bytes, media_type: str, model: Optional[str],
+                 bbox: Optional[Tuple[int, int, int, int]] = None,
+                 mask_id: Optional[str] = None):
+        self.content = content
+        self.media_type = media_type
+        self.model = model
+        # Boîte du sujet (left, top, right, bottom) dans l'image d'origine, avec trim
+        self.bbox = bbox
+        # Masque conservé par le service, pour un nouveau rendu via /composite
+        self.mask_id = mask_id
+
+    @property
+    def extension(self) -> str:
+        return OUTPUT_EXTENSIONS.get(self.media_type, '.png')
+
+    def save(self, path: Union[str, os.PathLike]):
+        with open(path, "wb") as handle:
+            handle.write(self.content)
+
+
+def retry_delay(response: Optional[httpx.Response], attempt: int,
+                backoff: float, max_backoff: float) -> float:
+    """
+    Délai avant la tentative suivante
+
+    Retry-After (secondes ou date HTTP) prime sur le backoff exponentiel,
+    auquel on ajoute un aléa pour ne pas synchroniser les clients.
+    """
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after:
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            try:
+                parsed = email.utils.parsedate_to_datetime(retry_after)
+            except (TypeError, ValueError):
+                # En-tête illisible : backoff exponentiel
+                parsed = None
+            if parsed is not None:
+                return max(0.0, parsed.timestamp() - time.time())
+    delay = min(max_backoff, backoff * (2 ** attempt))
+    return delay * (0.5 + random.random() / 2)
+
+
+def _params(model: str, white_bg: bool, format: str, roi: bool,
+            latency_budget_ms: Optional[float], trim: bool, padding: int) -> dict:
+    params = {'model': model, 'white_bg': str(white_bg).lower(), 'format': format, 'roi': str(roi).lower()}
+    if latency_budget_ms is not None:
+        params['latency_budget_ms'] = latency_budget_ms
+    if trim:
+        params.update(trim='true', padding=padding)
+    return params
+
+
+def sniff_content_type(head: bytes) -> str:
+    """Type MIME d'après les premiers octets (image/png si non reconnu : l'API n'accepte que image/* et video/*)"""
+    if head[:3] == b'\xff\xd8\xff':
+        return 'image/jpeg'
+    if head[:6] in (b'GIF87a', b'GIF89a'):
+        return 'image/gif'
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    if head[:4] == b'RIFF' and head[8:12] == b'AVI ':
+        return 'video/x-msvideo'
+    if head[:2] == b'BM':
+        return 'image/bmp'
+    if head[:4] in (b'II*\x00', b'MM\x00*'):
+        return 'image/tiff'
+    if head[4:8] == b'ftyp':
+        return 'video/quicktime' if head[8:10] == b'qt' else 'video/mp4'
+    if head[:4] == b'\x1a\x45\xdf\xa3':
+        return 'video/webm'
+    return 'image/png'
+
+
+def _content_type(path: str) -> str:
+    """Type MIME d'un fichier : extension, sinon premiers octets"""
+    content_type = mimetypes.guess_type(path)[0]
+    if content_type and content_type.startswith(('image/', 'video/')):
+        return content_type
+    with open(path, "rb") as handle:
+        return sniff_content_type(handle.read(16))
+
+
+def _upload(source: Source):
+    """Champ multipart : fichier ouvert (envoyé en flux) ou bytes"""
+    if isinstance(source, bytes):
+        return ('image', source, sniff_content_type(source[:16])), None
+    path = os.fspath(source)
+    content_type = _content_type(path)
+    handle = open(path, "rb")
+    return (os.path.basename(path), handle, content_type), handle
+
+
+def _result(response: httpx.Response) -> RemovalResult:
+    if response.status_code != 200:
+        try:
+            detail = response.json().get('detail', response.text)
+        except ValueError:
+            detail = response.text
+        raise RemovalError(response.status_code, str(detail))
+    bbox = response.headers.get('x-subject-bbox')
+    return RemovalResult(
+        response.content,
+        response.headers.get('content-type', 'image/png').split(';')[0],
+        response.headers.get('x-processing-model'),
+        tuple(int(value) for value in bbox.split(',')) if bbox else None,
+        response.headers.get('x-mask-id')
+    )
+
+
+def list_images(input_dir: Union[str, os.PathLike], pattern: str = '**/*') -> List[Path]:
+    """Images d'un répertoire (récursif par défaut), triées"""
+    return sorted(
+        path for path in Path(input_dir).glob(pattern)
+        if path.is_file() and path.suffix.lower() in IMAGE_EXTENSIONS
+    )
+
+
+def _output_path(path: Path, input_dir, output_dir, result: RemovalResult) -> Path:
+    target = Path(output_dir) / path.relative_to(input_dir)
+    target = target.with_suffix(result.extension)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    return target
+
+
+class BackgroundRemovalClient:
+    """Client synchrone, utilisable depuis plusieurs threads"""
+
+    def __init__(self, base_url: str = "http://localhost:8000", max_concurrency: int = 4,
+                 max_retries: int = 5, backoff: float = 0.5, max_backoff: float = 30.0,
+                 timeout: httpx.Timeout = DEFAULT_TIMEOUT, transport: Optional[httpx.BaseTransport] = None):
+        """
+        Args:
+            base_url: URL de l'API
+            max_concurrency: Requêtes simultanées (et taille du pool de connexions)
+            max_retries: Nouvelles tentatives sur 429/503 ou erreur réseau
+            backoff: Délai initial (s) du backoff exponentiel
+            max_backoff: Délai maximal (s) entre deux tentatives
+            timeout: Timeouts httpx
+            transport: Transport httpx (ex: httpx.WSGITransport pour les tests)
+        """
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.http = httpx.Client(
+            base_url=base_url, timeout=timeout, transport=transport,
+            limits=httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency)
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.http.close()
+
+    def remove_background(self, source: Source, model: str = 'u2net', white_bg: bool = False,
+                          format: str = 'png', roi: bool = False,
+                          latency_budget_ms: Optional[float] = None,
+                          trim: bool = False, padding: int = 0) -> RemovalResult:
+        """
+        Détoure une image (chemin, envoyé en flux, ou bytes)
+
+        Raises:
+            RemovalError: Erreur de l'API, ou 429/503 après max_retries tentatives
+        """
+        params = _params(model, white_bg, format, roi, latency_budget_ms, trim, padding)
+        for attempt in range(self.max_retries + 1):
+            field, handle = _upload(source)
+            response = None
+            try:
+                response = self.http.post("/remove-background", params=params, files={'image': field})
+                if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                    return _result(response)
+            except httpx.TransportError:
+                if attempt == self.max_retries:
+                    raise
+            finally:
+                if handle is not None:
+                    handle.close()
+            time.sleep(retry_delay(response, attempt, self.backoff, self.max_backoff))
+
+    def map(self, input_dir: Union[str, os.PathLike], output_dir: Union[str, os.PathLike],
+            pattern: str = '**/*', **options) -> Iterator[Tuple[Path, Union[Path, Exception]]]:
+        """
+        Détoure toutes les images d'un répertoire, max_concurrency à la fois
+
+        Les résultats arrivent dans l'ordre de fin de traitement ; une erreur
+        sur une image n'interrompt pas les autres. Au plus
+        max_concurrency * IN_FLIGHT_PER_WORKER images sont soumises à la fois,
+        chaque résultat est écrit par le thread qui l'a reçu.
+
+        Returns:
+            Iterator de (image source, fichier écrit ou exception)
+        """
+
+        def process(path: Path) -> Path:
+            result = self.remove_background(path, **options)
+            target = _output_path(path, input_dir, output_dir, result)
+            result.save(target)
+            return target
+
+        paths = iter(list_images(input_dir, pattern))
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            futures = {
+                executor.submit(process, path): path
+                for path in itertools.islice(paths, self.max_concurrency * IN_FLIGHT_PER_WORKER)
+            }
+            try:
+                while futures:
+                    done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        path = futures.pop(future)
+                        following = next(paths, None)
+                        if following is not None:
+                            futures[executor.submit(process, following)] = following
+                        try:
+                            outcome = future.result()
+                        except Exception as e:
+                            outcome = e
+                        yield path, outcome
+            finally:
+                # Itération abandonnée : les images pas encore commencées ne partent pas
+                for future in futures:
+                    future.cancel()
+
+
+class AsyncBackgroundRemovalClient:
+    """Client asyncio, envois concurrents bornés par un sémaphore"""
+
+    def __init__(self, base_url: str = "http://localhost:8000", max_concurrency: int = 4,
+                 max_retries: int = 5, backoff: float = 0.5, max_backoff: float = 30.0,
+                 timeout: httpx.Timeout = DEFAULT_TIMEOUT, transport: Optional[httpx.AsyncBaseTransport] = None):
+        """Mêmes arguments que BackgroundRemovalClient (transport: ex. httpx.ASGITransport(app))"""
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.http = httpx.AsyncClient(
+            base_url=base_url, timeout=timeout, transport=transport,
+            limits=httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency)
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        await self.http.aclose()
+
+    async def remove_background(self, source: Source, model: str = 'u2net', white_bg: bool = False,
+                                format: str = 'png', roi: bool = False,
+                                latency_budget_ms: Optional[float] = None,
+                                trim: bool = False, padding: int = 0) -> RemovalResult:
+        """Voir BackgroundRemovalClient.remove_background"""
+        params = _params(model, white_bg, format, roi, latency_budget_ms, trim, padding)
+        for attempt in range(self.max_retries + 1):
+            response = None
+            async with self._semaphore:
+                field, handle = _upload(source)
+                try:
+                    response = await self.http.post("/remove-background", params=params, files={'image': field})
+                    if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                        return _result(response)
+                except httpx.TransportError:
+                    if attempt == self.max_retries:
+                        raise
+                finally:
+                    if handle is not None:
+                        handle.close()
+            # Attente hors du sémaphore : les autres envois continuent
+            await asyncio.sleep(retry_delay(response, attempt, self.backoff, self.max_backoff))
+
+    async def map(self, input_dir: Union[str, os.PathLike], output_dir: Union[str, os.PathLike],
+                  pattern: str = '**/*', **options) -> AsyncIterator[Tuple[Path, Union[Path, Exception]]]:
+        """Voir BackgroundRemovalClient.map"""
+
+        async def process(path: Path):
+            try:
+                result = await self.remove_background(path, **options)
+                target = _output_path(path, input_dir, output_dir, result)
+                result.save(target)
+                return path, target
+            except Exception as e:
+                return path, e
+
+        paths = iter(list_images(input_dir, pattern))
+        tasks = {
+            asyncio.ensure_future(process(path))
+            for path in itertools.islice(paths, self.max_concurrency * IN_FLIGHT_PER_WORKER)
+        }
+        try:
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    following = next(paths, None)
+                    if following is not None:
+                        tasks.add(asyncio.ensure_future(process(following)))
+                    yield task.result()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
+# Trame du transport WebSocket : longueur de l'en-tête, en-tête JSON, données (voir engine/framing.py)
+_FRAME_LENGTH = struct.Struct("!I")
+
+
+def _pack_frame(header: dict, payload: bytes) -> bytes:
+    encoded = json.dumps(header).encode()
+    return b"".join((_FRAME_LENGTH.pack(len(encoded)), encoded, payload))
+
+
+def _unpack_frame(frame: bytes) -> Tuple[dict, bytes]:
+    (length,) = _FRAME_LENGTH.unpack_from(frame)
+    end = _FRAME_LENGTH.size + length
+    return json.loads(frame[_FRAME_LENGTH.size:end]), frame[end:]
+
+
+class StreamingBackgroundRemovalClient:
+    """
+    Client asyncio du transport binaire WebSocket (/ws/remove-background)
+
+    Une seule connexion porte toutes les requêtes, envoyées sans attendre
+    les réponses précédentes (au plus max_in_flight) : ni multipart ni base64.
+    """
+
+    def __init__(self, base_url: str = "http://localhost:8000", max_in_flight: int = 4,
+                 max_retries: int = 5, backoff: float = 0.5, max_backoff: float = 30.0):
+        """Mêmes arguments que AsyncBackgroundRemovalClient (max_in_flight: requêtes en cours)"""
+        self.url = base_url.replace("http", "ws", 1).rstrip("/") + "/ws/remove-background"
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        self._ids = itertools.count(1)
+        self._pending: Dict[int, asyncio.Future] = {}
+        self.connection = None
+        self._reader = None
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def connect(self):
+        import websockets
+
+        self.connection = await websockets.connect(self.url, max_size=None)
+        self._reader = asyncio.ensure_future(self._read())
+
+    async def close(self):
+        if self.connection is not None:
+            await self.connection.close()
+        if self._reader is not None:
+            await self._reader
+
+    async def _read(self):
+        """Associe chaque réponse à sa requête ; connexion perdue : toutes échouent"""
+        error = ConnectionError("Connexion WebSocket fermée")
+        try:
+            async for frame in self.connection:
+                header, payload = _unpack_frame(frame)
+                future = self._pending.pop(header.get('id'), None)
+                if future is not None and not future.done():
+                    future.set_result((header, payload))
+        except Exception as e:
+            error = ConnectionError(f"Connexion WebSocket perdue: {e}")
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(error)
+        self._pending.clear()
+
+    async def remove_background(self, source: Source, model: str = 'u2net', white_bg: bool = False,
+                                format: str = 'png', roi: bool = False,
+                                latency_budget_ms: Optional[float] = None,
+                                trim: bool = False, padding: int = 0) -> RemovalResult:
+        """Voir BackgroundRemovalClient.remove_background"""
+        if isinstance(source, bytes):
+            data, content_type = source, sniff_content_type(source[:16])
+        else:
+            # Lecture hors de la boucle d'événements
+            data = await asyncio.to_thread(Path(source).read_bytes)
+            content_type = _content_type(os.fspath(source))
+        options = {
+            'model': model, 'white_bg': white_bg, 'format': format, 'roi': roi,
+            'latency_budget_ms': latency_budget_ms, 'trim': trim, 'padding': padding
+        }
+        if content_type.startswith('video/'):
+            options['content_type'] = content_type
+        for attempt in range(self.max_retries + 1):
+            async with self._semaphore:
+                request_id = next(self._ids)
+                future = self._pending[request_id] = asyncio.get_running_loop().create_future()
+                await self.connection.send(_pack_frame(dict(options, id=request_id), data))
+                header, payload = await future
+            status = header.get('status')
+            if status == 200:
+                bbox = header.get('bbox')
+                return RemovalResult(
+                    payload, header.get('content_type', 'image/png'), header.get('model_used'),
+                    tuple(bbox) if bbox else None, header.get('mask_id')
+                )
+            if status not in RETRY_STATUSES or attempt == self.max_retries:
+                raise RemovalError(status, str(header.get('error')))
+            retry_after = header.get('retry_after')
+            if retry_after is not None:
+                delay = float(retry_after)
+            else:
+                delay = retry_delay(None, attempt, self.backoff, self.max_backoff)
+            await asyncio.sleep(delay)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Détoure un répertoire d'images via l'API")
+    parser.add_argument("api_url")
+    parser.add_argument("input_dir")
+    parser.add_argument("output_dir")
+    parser.add_argument("--model", default="u2net")
+    parser.add_argument("--format", default="png")
+    parser.add_argument("--white-bg", action="store_true")
+    parser.add_argument("--trim", action="store_true", help="Recadrer sur le sujet")
+    parser.add_argument("--padding", type=int, default=0, help="Marge (pixels) avec --trim")
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    started = time.time()
+    done = failed = 0
+    with BackgroundRemovalClient(args.api_url, max_concurrency=args.concurrency) as client:
+        for path, outcome in client.map(args.input_dir, args.output_dir, model=args.model,
+                                        format=args.format, white_bg=args.white_bg,
+                                        trim=args.trim, padding=args.padding):
+            if isinstance(outcome, Exception):
+                failed += 1
+                print(f"❌ {path}: {outcome}")
+            else:
+                done += 1
+                print(f"✅ {path} -> {outcome}")
+    print(f"📊 {done} image(s) traitée(s), {failed} erreur(s) en {time.time() - started:.1f}s")
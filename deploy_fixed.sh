@@ -39,6 +39,8 @@ fi
 # 3. Déploiement
 echo ""
 echo "🚀 3. Déploiement sur Cloud Run..."
+# Plusieurs requêtes par instance : le limiteur adaptatif du service ajuste
+# le nombre d'inférences simultanées et répond 503 au-delà
 gcloud run deploy $SERVICE_NAME \
   --image $IMAGE_NAME \
   --platform managed \
@@ -46,7 +48,7 @@ gcloud run deploy $SERVICE_NAME \
   --memory 4Gi \
   --cpu 2 \
   --timeout 300 \
-  --concurrency 1 \
+  --concurrency 8 \
   --max-instances 10 \
   --allow-unauthenticated \
   --port 8080
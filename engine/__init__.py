@@ -0,0 +1,28 @@
+"""
+Moteur de suppression de background commun à tous les points d'entrée
+
+Chaque point d'entrée se limite à une EngineConfig :
+
+    config = EngineConfig.from_env(startup_mode='lazy', max_image_bytes=10 * 1024 * 1024)
+    app = create_app(config)
+"""
+
+import os
+
+# rembg importe pymatting, dont les noyaux numba parallèles démarrent un pool
+# TBB à l'import ; après une inférence hors du thread principal, ce pool bloque
+# la fin de l'interpréteur. OpenMP (thread-safe) est préféré, TBB en dernier recours.
+os.environ.setdefault("NUMBA_THREADING_LAYER_PRIORITY", "omp workqueue tbb")
+
+from .config import MODELS, EngineConfig  # noqa: E402
+
+__all__ = ['EngineConfig', 'MODELS', 'create_app', 'run']
+
+
+def __getattr__(name):
+    # create_app et run importés à la demande : python -m engine.bulk (processus
+    # principal) ne charge ni FastAPI, ni rembg, ni onnxruntime
+    if name in ('create_app', 'run'):
+        from . import app
+        return getattr(app, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,283 @@
+"""
+Traitement image par image des GIF/WebP/APNG animés et des clips MP4 courts
+
+Les images clés passent par le modèle ; les images voisines quasi identiques
+réutilisent le masque précédent, recalé par corrélation de phase. Les images
+sont décodées et encodées au fil de l'eau : seul le flux compressé de sortie
+est conservé en mémoire.
+"""
+
+import io
+import logging
+import os
+import struct
+import tempfile
+import zlib
+from contextlib import contextmanager
+from typing import Callable, Iterator, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image, ImageSequence, features
+
+logger = logging.getLogger(__name__)
+
+# Taille des vignettes de comparaison entre images
+SIGNATURE_SIZE = 64
+# Différence moyenne (0-1) en dessous de laquelle le masque est réutilisé
+REUSE_DIFF_THRESHOLD = 0.02
+# Nombre maximal d'images consécutives sans nouvelle inférence
+MAX_REUSED_FRAMES = 12
+# Limite des clips vidéo acceptés
+MAX_VIDEO_FRAMES = int(os.environ.get("MAX_VIDEO_FRAMES", 300))
+
+Frame = Tuple[Image.Image, int]
+
+
+def is_animated(image: Image.Image) -> bool:
+    """Vrai pour un GIF/WebP/APNG de plusieurs images"""
+    return getattr(image, "is_animated", False) and getattr(image, "n_frames", 1) > 1
+
+
+def iter_image_frames(image: Image.Image) -> Iterator[Frame]:
+    """Décode les images d'une animation une par une, avec leur durée (ms)"""
+    default_duration = image.info.get("duration", 100)
+    for frame in ImageSequence.Iterator(image):
+        yield frame.convert("RGBA"), int(frame.info.get("duration", default_duration) or 100)
+
+
+@contextmanager
+def open_video_frames(video_data: bytes) -> Iterator[Tuple[int, Iterator[Frame]]]:
+    """
+    Décode un clip vidéo localement via OpenCV
+
+    Le fichier temporaire et le décodeur sont libérés à la sortie du bloc,
+    que les images aient été lues ou non (requête annulée, erreur).
+
+    Yields:
+        Tuple (nombre d'images annoncé, itérateur d'images RGBA avec durée)
+    """
+    handle = tempfile.NamedTemporaryFile(suffix=".mp4", delete=False)
+    try:
+        with handle:
+            handle.write(video_data)
+        capture = cv2.VideoCapture(handle.name)
+        try:
+            if not capture.isOpened():
+                raise ValueError("Vidéo illisible")
+
+            frame_count = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+            if frame_count > MAX_VIDEO_FRAMES:
+                raise ValueError(f"Vidéo trop longue ({frame_count} images). Maximum: {MAX_VIDEO_FRAMES}")
+
+            fps = capture.get(cv2.CAP_PROP_FPS) or 25.0
+            duration = int(round(1000 / fps))
+
+            def frames() -> Iterator[Frame]:
+                for _ in range(MAX_VIDEO_FRAMES):
+                    ok, bgr = capture.read()
+                    if not ok:
+                        break
+                    yield Image.fromarray(cv2.cvtColor(bgr, cv2.COLOR_BGR2RGBA)), duration
+
+            yield frame_count, frames()
+        finally:
+            capture.release()
+    finally:
+        os.unlink(handle.name)
+
+
+class AnimatedWebPWriter:
+    """
+    Encodeur WebP animé alimenté image par image
+
+    L'encodeur interne de Pillow (PIL._webp, API privée) ne garde que le flux
+    compressé. S'il est absent ou si sa signature a changé, les images sont
+    conservées puis encodées à la fin par Image.save (API publique).
+    """
+
+    def __init__(self, size: Tuple[int, int], loop: int = 0, quality: int = 80):
+        if not features.check("webp_anim"):
+            raise ValueError("Pillow compilé sans support WebP animé")
+        self.loop = loop
+        self.quality = quality
+        self.timestamp = 0
+        self.frames = []
+        try:
+            from PIL import _webp
+            self.encoder = _webp.WebPAnimEncoder(size[0], size[1], 0, loop, False, 3, 5, False, False)
+        except (ImportError, AttributeError, TypeError) as e:
+            logger.warning(f"⚠️ Encodeur WebP animé en flux indisponible ({e}), images gardées en mémoire")
+            self.encoder = None
+
+    def add(self, frame: Image.Image, duration: int):
+        if self.encoder is not None:
+            try:
+                self.encoder.add(
+                    frame.tobytes("raw", "RGBA"), self.timestamp,
+                    frame.size[0], frame.size[1], "RGBA", False, self.quality, 0
+                )
+            except TypeError as e:
+                if self.timestamp:
+                    raise
+                logger.warning(f"⚠️ Encodeur WebP animé en flux incompatible ({e}), images gardées en mémoire")
+                self.encoder = None
+        if self.encoder is None:
+            self.frames.append((frame, duration))
+        self.timestamp += duration
+
+    def finish(self) -> bytes:
+        if self.encoder is None:
+            buffer = io.BytesIO()
+            first, _ = self.frames[0]
+            first.save(
+                buffer, "WEBP", save_all=True, append_images=[frame for frame, _ in self.frames[1:]],
+                duration=[duration for _, duration in self.frames], loop=self.loop, quality=self.quality
+            )
+            return buffer.getvalue()
+        self.encoder.add(None, self.timestamp, 0, 0, "", False, self.quality, 0)
+        data = self.encoder.assemble("", "", "")
+        if data is None:
+            raise ValueError("L'encodeur WebP n'a rien produit")
+        return data
+
+
+class APNGWriter:
+    """
+    Écriture APNG en flux : chaque image est compressée dès son ajout
+
+    Le nombre d'images de l'en-tête acTL est corrigé à la fin, le nombre
+    annoncé par un conteneur vidéo n'étant pas toujours exact.
+    """
+
+    def __init__(self, size: Tuple[int, int], loop: int = 0):
+        self.size = size
+        self.loop = loop
+        self.buffer = io.BytesIO()
+        self.sequence = 0
+        self.frames = 0
+        self.actl_offset = None
+
+    def _chunk(self, chunk_type: bytes, data: bytes):
+        self.buffer.write(struct.pack(">I", len(data)))
+        self.buffer.write(chunk_type + data)
+        self.buffer.write(struct.pack(">I", zlib.crc32(chunk_type + data) & 0xFFFFFFFF))
+
+    def add(self, frame: Image.Image, duration: int):
+        encoded = io.BytesIO()
+        frame.save(encoded, "PNG", compress_level=6)
+        chunks = _read_png_chunks(encoded.getvalue())
+
+        if self.frames == 0:
+            self.buffer.write(b"\x89PNG\r\n\x1a\n")
+            self._chunk(b"IHDR", chunks[0][1])
+            self.actl_offset = self.buffer.tell()
+            self._chunk(b"acTL", struct.pack(">II", 0, self.loop))
+
+        width, height = frame.size
+        self._chunk(b"fcTL", struct.pack(
+            ">IIIIIHHBB", self.sequence, width, height, 0, 0, duration, 1000, 0, 0
+        ))
+        self.sequence += 1
+
+        for chunk_type, data in chunks:
+            if chunk_type != b"IDAT":
+                continue
+            if self.frames == 0:
+                self._chunk(b"IDAT", data)
+            else:
+                self._chunk(b"fdAT", struct.pack(">I", self.sequence) + data)
+                self.sequence += 1
+        self.frames += 1
+
+    def finish(self) -> bytes:
+        self._chunk(b"IEND", b"")
+        end = self.buffer.tell()
+        self.buffer.seek(self.actl_offset)
+        self._chunk(b"acTL", struct.pack(">II", self.frames, self.loop))
+        self.buffer.seek(end)
+        return self.buffer.getvalue()
+
+
+def _read_png_chunks(data: bytes):
+    """Liste (type, données) des chunks d'un PNG"""
+    chunks = []
+    offset = 8
+    while offset < len(data):
+        length, = struct.unpack(">I", data[offset:offset + 4])
+        chunk_type = data[offset + 4:offset + 8]
+        chunks.append((chunk_type, data[offset + 8:offset + 8 + length]))
+        offset += length + 12
+    return chunks
+
+
+def _signature(frame: Image.Image) -> np.ndarray:
+    """Vignette en niveaux de gris normalisée pour comparer les images"""
+    small = frame.convert("L").resize((SIGNATURE_SIZE, SIGNATURE_SIZE), Image.BILINEAR)
+    return np.asarray(small, dtype=np.float32) / 255.0
+
+
+def _shift_mask(mask: Image.Image, dx: int, dy: int) -> Image.Image:
+    """Translate un masque en complétant par du fond"""
+    shifted = Image.new("L", mask.size, 0)
+    shifted.paste(mask, (dx, dy))
+    return shifted
+
+
+def remove_background_frames(frames: Iterator[Frame], predict: Callable[[Image.Image], Image.Image],
+                             output_format: str = "webp", loop: int = 0) -> Tuple[bytes, dict]:
+    """
+    Détoure une séquence d'images avec réutilisation temporelle des masques
+
+    Args:
+        frames: Itérateur (image RGBA, durée ms)
+        predict: Fonction image -> masque "L" (inférence du modèle)
+        output_format: 'webp' ou 'apng'
+        loop: Nombre de boucles (0 = infini)
+
+    Returns:
+        Tuple (animation encodée, statistiques images clés / réutilisées)
+    """
+    writer = None
+    previous_signature = None
+    previous_mask = None
+    reused_in_row = 0
+    stats = {"frames": 0, "keyframes": 0, "reused": 0}
+
+    for frame, duration in frames:
+        if writer is None:
+            if output_format == "apng":
+                writer = APNGWriter(frame.size, loop)
+            else:
+                writer = AnimatedWebPWriter(frame.size, loop)
+
+        signature = _signature(frame)
+        mask = None
+        if previous_mask is not None and reused_in_row < MAX_REUSED_FRAMES:
+            (shift_x, shift_y), _ = cv2.phaseCorrelate(previous_signature, signature)
+            shift_x, shift_y = int(round(shift_x)), int(round(shift_y))
+            aligned = np.roll(previous_signature, (shift_y, shift_x), axis=(0, 1))
+            if float(np.abs(aligned - signature).mean()) < REUSE_DIFF_THRESHOLD:
+                scale_x = frame.size[0] / SIGNATURE_SIZE
+                scale_y = frame.size[1] / SIGNATURE_SIZE
+                mask = _shift_mask(previous_mask, int(shift_x * scale_x), int(shift_y * scale_y))
+                reused_in_row += 1
+                stats["reused"] += 1
+
+        if mask is None:
+            mask = predict(frame)
+            reused_in_row = 0
+            stats["keyframes"] += 1
+            previous_signature = signature
+            previous_mask = mask
+
+        cutout = Image.new("RGBA", frame.size, 0)
+        cutout.paste(frame, mask=mask)
+        writer.add(cutout, duration)
+        stats["frames"] += 1
+
+    if writer is None:
+        raise ValueError("Aucune image décodée")
+
+    logger.info(f"Animation traitée: {stats}")
+    return writer.finish(), stats
@@ -0,0 +1,843 @@
+"""
+Application FastAPI commune : mêmes endpoints pour tous les points d'entrée
+
+Le moteur (engine.core, imports lourds compris) est créé selon
+config.startup_mode : à la création de l'application (eager), à la première
+requête (lazy) ou dans un thread lancé au démarrage du serveur (background).
+"""
+
+import asyncio
+import base64
+import logging
+import threading
+import time
+from typing import Optional
+
+from fastapi import FastAPI, File, HTTPException, Query, Request, UploadFile, WebSocket, WebSocketDisconnect
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+
+from .compose import WHITE, parse_color
+from .config import MODELS, EngineConfig
+from .deadline import Cancellation, ClientDisconnected, RequestCancelled, watch_disconnect
+from .framing import WS_MAX_IN_FLIGHT, pack_frame, unpack_frame
+from .limiter import limiter_from_env
+from .renditions import RENDITION_CONTAINERS, parse_renditions
+from .scheduler import FairScheduler, Overloaded
+from .storage import ObjectStorage, StorageError
+from .streaming import EncodedStream, iter_base64_json
+
+logger = logging.getLogger(__name__)
+
+# Résultats possibles (paramètre return) : image détourée ou masque seul
+RESULT_KINDS = ('image', 'mask')
+
+# Options des corps JSON et des en-têtes de trame WebSocket : type attendu et
+# valeur par défaut, comme les paramètres typés de /remove-background
+JSON_OPTIONS = {
+    'model': (str, 'u2net'),
+    'white_bg': (bool, False),
+    'format': (str, 'png'),
+    'roi': (bool, False),
+    'latency_budget_ms': (float, None),
+    'trim': (bool, False),
+    'padding': (int, 0),
+    'return': (str, 'image'),
+}
+TYPE_NAMES = {str: 'une chaîne', bool: 'un booléen', int: 'un entier', float: 'un nombre'}
+
+
+class EngineHolder:
+    """Moteur créé une seule fois, au moment choisi par la politique de démarrage"""
+
+    def __init__(self, config: EngineConfig):
+        self.config = config
+        self.engine = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        """Moteur, créé au besoin (import de rembg compris)"""
+        if self.engine is not None:
+            return self.engine
+        with self._lock:
+            if self.engine is None:
+                logger.info("Initialisation du moteur...")
+                from .core import BackgroundRemovalEngine
+                self.engine = BackgroundRemovalEngine(self.config)
+                logger.info("✅ Moteur initialisé")
+        return self.engine
+
+    def warm(self):
+        """Création du moteur puis chargement des modèles configurés"""
+        try:
+            self.get().preload()
+        except Exception as e:
+            logger.error(f"❌ Erreur warmup: {e}")
+
+    def startup_report(self) -> dict:
+        """État de préparation, sans forcer la création du moteur"""
+        if self.engine is None:
+            return {
+                'mode': self.config.startup_mode,
+                'ready': self.config.startup_mode == 'lazy',
+                'models': {name: 'pending' for name in self.config.preload_models}
+            }
+        return self.engine.startup.report()
+
+
+def create_app(config: EngineConfig) -> FastAPI:
+    """
+    Crée l'application et son moteur selon la configuration
+
+    Args:
+        config: Politiques du point d'entrée
+
+    Returns:
+        FastAPI: Application, moteur accessible via app.state.engine
+    """
+    app = FastAPI(title=config.title, description=config.description, version=config.version)
+    holder = EngineHolder(config)
+    app.state.engine = holder
+    scheduler = FairScheduler(limiter=limiter_from_env())
+    app.state.scheduler = scheduler
+    # Clients du stockage objet (boto3 importé au premier usage)
+    storage = ObjectStorage()
+    app.state.storage = storage
+
+    def admit(request: Request, engine, model: str, deadline_headers=None):
+        """
+        Ticket d'ordonnancement de la requête, coûté par la latence estimée du modèle
+
+        deadline_headers remplace les en-têtes pour l'échéance (message WebSocket).
+        model=auto est résolu ensuite par route(), avant l'attente d'un créneau.
+        """
+        try:
+            return scheduler.ticket(
+                request.headers,
+                request.client.host if request.client else None,
+                model,
+                cost=engine.router.estimate(model, 1.0) / 1000,
+                cancellation=Cancellation.from_headers(
+                    request.headers if deadline_headers is None else deadline_headers,
+                    config.request_timeout_ms
+                )
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    async def route(ticket, engine, data, model: str, latency_budget_ms, video: bool = False) -> str:
+        """
+        Résout model=auto avant l'attente d'un créneau : le ticket est coûté et
+        limité (MODEL_CONCURRENCY) selon le modèle réellement utilisé
+
+        Returns:
+            str: Modèle à passer au moteur
+        """
+        resolved = await run_in_threadpool(engine.resolve_model, data, model, latency_budget_ms, video)
+        if resolved != model:
+            ticket.model = resolved
+            ticket.cost = engine.router.estimate(resolved, 1.0) / 1000
+        return resolved
+
+    def cancelled_error(error: Exception) -> HTTPException:
+        """504 si l'échéance est dépassée, 499 (convention nginx) si le client est parti"""
+        if isinstance(error, ClientDisconnected):
+            return HTTPException(status_code=499, detail=str(error))
+        return HTTPException(status_code=504, detail=str(error))
+
+    if config.log_requests:
+        # Middleware de logging pour débugger
+        @app.middleware("http")
+        async def log_requests(request, call_next):
+            start_time = time.time()
+
+            # Log de la requête entrante
+            client_ip = request.client.host if request.client else 'unknown'
+            logger.info(f"🌐 {request.method} {request.url.path} - Client: {client_ip}")
+
+            # Log de la taille du body pour les POST
+            if request.method == "POST":
+                body = await request.body()
+                logger.info(f"📦 Body size: {len(body)} bytes")
+                # Rejouer le corps une fois pour FastAPI, puis rendre la main au
+                # serveur : la déconnexion du client reste visible (watch_disconnect)
+                server_receive = request.receive
+                replayed = False
+
+                async def receive():
+                    nonlocal replayed
+                    if replayed:
+                        return await server_receive()
+                    replayed = True
+                    return {"type": "http.request", "body": body, "more_body": False}
+                request._receive = receive
+
+            try:
+                response = await call_next(request)
+                process_time = time.time() - start_time
+                logger.info(f"⚡ Réponse {response.status_code} en {process_time:.2f}s")
+                return response
+            except Exception as e:
+                process_time = time.time() - start_time
+                logger.error(f"💥 Erreur après {process_time:.2f}s: {str(e)}")
+                raise
+
+    # Configuration CORS pour permettre les appels depuis votre NestJS
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],  # En production, spécifiez vos domaines
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+    if config.startup_mode == 'eager':
+        holder.get()
+
+    @app.on_event("startup")
+    async def start_background_loading():
+        """En mode background, charge les modèles une fois le serveur lancé"""
+        if config.startup_mode == 'background':
+            threading.Thread(target=holder.warm, name="model-warmup", daemon=True).start()
+
+    @app.get("/")
+    async def root():
+        """Point de santé de l'API"""
+        return {
+            "message": config.title,
+            "status": "running",
+            "models": list(MODELS.keys()),
+            **config.root_info
+        }
+
+    @app.get("/health")
+    async def health():
+        """Health check pour Google Cloud Run, avec les durées de démarrage"""
+        return {
+            "status": "healthy",
+            **config.health_info,
+            "startup": holder.startup_report(),
+            # Saturation réelle du worker, pour l'autoscaler
+            "concurrency": {
+                "limit": scheduler.limit,
+                "running": scheduler.running,
+                "queued": scheduler.queued
+            }
+        }
+
+    @app.get("/ready")
+    async def ready():
+        """Sonde de préparation : 503 tant que les modèles configurés ne sont pas chauds"""
+        if not holder.startup_report()['ready']:
+            return Response(status_code=503, content="loading")
+        return {"status": "ready"}
+
+    @app.get("/metrics")
+    async def metrics():
+        """Compteurs de traitement du service"""
+        engine = await run_in_threadpool(holder.get)
+        counters = dict(engine.metrics)
+        attempts = counters['fast_path_attempts']
+        counters['fast_path_rate'] = counters['fast_path_hits'] / attempts if attempts else 0.0
+        counters['model_latency'] = engine.router.stats()
+        counters['tensor_buffers'] = engine.tensor_stats()
+        counters['coalescing'] = engine.in_flight.stats()
+        counters['masks'] = engine.masks.stats()
+        counters['cache'] = engine.cache.stats()
+        counters['storage'] = storage.stats()
+        counters['scheduler'] = scheduler.stats()
+        return counters
+
+    @app.get("/models")
+    async def list_models():
+        """Liste les modèles disponibles"""
+        return {"models": MODELS}
+
+    @app.get("/warmup")
+    async def warmup(model: str = Query('u2net', description="Modèle à pré-charger")):
+        """Pré-charge un modèle (attend un chargement déjà en cours)"""
+        if model not in MODELS or model == 'auto':
+            raise HTTPException(status_code=400, detail=f"Modèle '{model}' non supporté")
+        try:
+            engine = await run_in_threadpool(holder.get)
+            # Chargement hors de la boucle d'événements
+            await run_in_threadpool(engine.get_session, model)
+        except Exception as e:
+            logger.error(f"Erreur warmup: {e}")
+            raise HTTPException(status_code=500, detail=f"Erreur warmup: {str(e)}")
+        return {"status": "warmed_up", "model_loaded": model}
+
+    @app.post("/remove-background")
+    async def remove_background_endpoint(
+        http_request: Request,
+        image: UploadFile = File(..., description="Image à traiter"),
+        model: str = Query('u2net', description="Modèle à utiliser"),
+        white_bg: bool = Query(False, description="Ajouter un fond blanc"),
+        format: str = Query('png', description="Format de sortie (png/jpeg, webp/apng pour les animations)"),
+        roi: bool = Query(False, description="Recadrer sur le sujet avant l'inférence"),
+        latency_budget_ms: Optional[float] = Query(None, description="Budget de latence pour model=auto"),
+        trim: bool = Query(False, description="Recadrer le résultat sur le sujet (en-tête X-Subject-BBox)"),
+        padding: int = Query(0, ge=0, description="Marge en pixels autour du sujet avec trim"),
+        renditions: Optional[str] = Query(None, description="Plusieurs tailles, ex. thumb:150,listing:600,zoom:1600x1200"),
+        renditions_format: str = Query('zip', description="Conteneur des déclinaisons (zip/multipart)"),
+        output: str = Query('image', alias='return', description="Résultat : image détourée ou masque seul (mask)")
+    ):
+        """
+        Supprime le background d'une image uploadée
+
+        Le masque calculé est conservé : son identifiant (en-tête X-Mask-Id)
+        permet un nouveau rendu sans inférence via /composite.
+        """
+        # Vérifier le type de fichier
+        content_type = image.content_type or ''
+        if not content_type.startswith(('image/', 'video/')):
+            raise HTTPException(status_code=400, detail="Le fichier doit être une image ou une vidéo")
+        check_result_kind(output)
+        if output == 'mask' and content_type.startswith('video/'):
+            raise HTTPException(status_code=400, detail="Masque seul non disponible pour les vidéos")
+
+        # Vérifier le modèle
+        if model not in MODELS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Modèle '{model}' non supporté. Modèles disponibles: {list(MODELS.keys())}"
+            )
+
+        rendition_list = None
+        if renditions:
+            if renditions_format not in RENDITION_CONTAINERS:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"renditions_format '{renditions_format}' non supporté. Valeurs possibles: {list(RENDITION_CONTAINERS)}"
+                )
+            if content_type.startswith('video/'):
+                raise HTTPException(status_code=400, detail="Déclinaisons non disponibles pour les vidéos")
+            try:
+                rendition_list = parse_renditions(renditions)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+
+        try:
+            # Le fichier reçu (SpooledTemporaryFile) est lu en place par le moteur
+            image_data = image.file
+            logger.info(f"Traitement d'une image de {image.size} bytes avec le modèle {model}")
+            engine = await run_in_threadpool(holder.get)
+            ticket = admit(http_request, engine, model)
+            cancellation = ticket.cancellation
+
+            # Traiter l'image (ou la vidéo) ; format=jpeg implique un fond blanc
+            animation_format = 'apng' if format.lower() == 'apng' else 'webp'
+            async with watch_disconnect(http_request, cancellation, lambda: scheduler.abandon(ticket)):
+                model = await route(
+                    ticket, engine, image_data, model, latency_budget_ms, content_type.startswith('video/')
+                )
+                async with scheduler.slot(ticket):
+                    if content_type.startswith('video/'):
+                        result_data, model_used = await run_in_threadpool(
+                            engine.remove_background_video,
+                            image_data,
+                            model_name=model,
+                            output_format=animation_format,
+                            latency_budget_ms=latency_budget_ms,
+                            cancellation=cancellation
+                        )
+                        stream = EncodedStream.from_bytes(result_data)
+                    elif rendition_list:
+                        # Une inférence, plusieurs tailles encodées au fil de l'envoi
+                        stream, model_used = await run_in_threadpool(
+                            engine.remove_background_renditions,
+                            image_data,
+                            rendition_list,
+                            container=renditions_format,
+                            model_name=model,
+                            white_background=white_bg or format.lower() == 'jpeg',
+                            roi_crop=roi,
+                            latency_budget_ms=latency_budget_ms,
+                            cancellation=cancellation,
+                            trim=trim,
+                            padding=padding,
+                            mask_only=output == 'mask'
+                        )
+                    else:
+                        stream, model_used = await run_in_threadpool(
+                            engine.remove_background_stream,
+                            image_data,
+                            model_name=model,
+                            white_background=white_bg or format.lower() == 'jpeg',
+                            roi_crop=roi,
+                            latency_budget_ms=latency_budget_ms,
+                            animation_format=animation_format,
+                            cancellation=cancellation,
+                            trim=trim,
+                            padding=padding,
+                            mask_only=output == 'mask'
+                        )
+
+            headers = result_headers(stream)
+            headers["X-Processing-Model"] = model_used
+
+            # L'encodage se poursuit pendant l'envoi des premiers morceaux
+            return StreamingResponse(stream, media_type=stream.media_type, headers=headers)
+
+        except HTTPException:
+            raise
+        except RequestCancelled as e:
+            raise cancelled_error(e)
+        except Overloaded as e:
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+        except Exception as e:
+            logger.error(f"Erreur lors du traitement: {e}")
+            raise HTTPException(status_code=500, detail=str(e))
+
+    @app.post("/remove-background-base64")
+    async def remove_background_base64(request: dict, http_request: Request):
+        """
+        Supprime le background d'une image encodée en base64
+
+        Body: {
+            "image": "base64_string",
+            "model": "u2net",
+            "white_bg": false,
+            "roi": false,
+            "latency_budget_ms": null,
+            "trim": false,
+            "padding": 0,
+            "return": "image"
+        }
+
+        Avec trim, la réponse contient "bbox": [left, top, right, bottom] ;
+        "mask_id" identifie le masque conservé (voir /composite).
+        """
+        logger.info(f"🔄 Nouvelle requête reçue: {len(str(request))} chars")
+
+        # Extraire les paramètres
+        image_b64 = request.get('image')
+        options = read_options(request)
+        model = options['model']
+        white_bg = options['white_bg']
+        roi = options['roi']
+        latency_budget_ms = options['latency_budget_ms']
+        trim = options['trim']
+        padding = options['padding']
+        output = options['return']
+
+        if not image_b64 or not isinstance(image_b64, str):
+            logger.error("❌ Image base64 manquante")
+            raise HTTPException(status_code=400, detail="Image base64 manquante")
+
+        logger.info(f"📋 Paramètres: model={model}, white_bg={white_bg}, roi={roi}, image_size={len(image_b64)}")
+
+        if model not in MODELS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Modèle '{model}' non supporté. Modèles disponibles: {list(MODELS.keys())}"
+            )
+
+        # Décoder l'image
+        try:
+            image_data = base64.b64decode(image_b64)
+            logger.info(f"✅ Image décodée: {len(image_data)} bytes")
+        except Exception as e:
+            logger.error(f"❌ Erreur décodage base64: {e}")
+            raise HTTPException(status_code=400, detail="Format base64 invalide")
+
+        try:
+            engine = await run_in_threadpool(holder.get)
+            ticket = admit(http_request, engine, model)
+            async with watch_disconnect(http_request, ticket.cancellation, lambda: scheduler.abandon(ticket)):
+                model = await route(ticket, engine, image_data, model, latency_budget_ms)
+                async with scheduler.slot(ticket):
+                    stream, model_used = await run_in_threadpool(
+                        engine.remove_background_stream,
+                        image_data,
+                        model_name=model,
+                        white_background=white_bg,
+                        roi_crop=roi,
+                        latency_budget_ms=latency_budget_ms,
+                        cancellation=ticket.cancellation,
+                        trim=trim,
+                        padding=padding,
+                        mask_only=output == 'mask'
+                    )
+
+            # Résultat encodé en base64 au fil de l'eau dans le document JSON
+            fields = {"success": True, "model_used": model_used, "white_background": white_bg}
+            if trim:
+                fields["bbox"] = list(stream.bbox) if stream.bbox is not None else None
+            if stream.mask_id:
+                fields["mask_id"] = stream.mask_id
+            return StreamingResponse(iter_base64_json(fields, stream), media_type="application/json")
+
+        except HTTPException:
+            raise
+        except RequestCancelled as e:
+            raise cancelled_error(e)
+        except Overloaded as e:
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+        except Exception as e:
+            logger.error(f"❌ Erreur lors du traitement base64: {e}")
+            raise HTTPException(status_code=500, detail=str(e))
+
+    @app.post("/remove-background-uri")
+    async def remove_background_uri(request: dict, http_request: Request):
+        """
+        Détoure un objet d'un bucket et écrit le résultat dans un bucket
+
+        Body: {
+            "source": "s3://bucket/photo.jpg",
+            "destination": "gs://bucket/photo.png",
+            "model": "u2net",
+            "white_bg": false,
+            "format": "png",
+            "roi": false,
+            "latency_budget_ms": null,
+            "trim": false,
+            "padding": 0,
+            "return": "image"
+        }
+
+        Ni l'image ni le résultat ne transitent par le client (voir engine.storage).
+        """
+        source = request.get('source')
+        destination = request.get('destination')
+        options = read_options(request)
+        model = options['model']
+        white_bg = options['white_bg']
+        format = options['format']
+        roi = options['roi']
+        latency_budget_ms = options['latency_budget_ms']
+        trim = options['trim']
+        padding = options['padding']
+        output = options['return']
+
+        logger.info(f"🔄 Requête stockage objet: {source} -> {destination} (model={model})")
+
+        if model not in MODELS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Modèle '{model}' non supporté. Modèles disponibles: {list(MODELS.keys())}"
+            )
+        try:
+            storage.authorize(source if isinstance(source, str) else '')
+            storage.authorize(destination if isinstance(destination, str) else '')
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except StorageError as e:
+            raise HTTPException(status_code=e.status_code, detail=str(e))
+
+        try:
+            engine = await run_in_threadpool(holder.get)
+            ticket = admit(http_request, engine, model)
+            cancellation = ticket.cancellation
+            animation_format = 'apng' if format.lower() == 'apng' else 'webp'
+            async with watch_disconnect(http_request, cancellation, lambda: scheduler.abandon(ticket)):
+                # Téléchargement avant le créneau d'inférence : il n'occupe pas le CPU
+                source_file, content_type = await run_in_threadpool(
+                    storage.download, source, engine.config.max_image_bytes
+                )
+                try:
+                    if not content_type.startswith(('image/', 'video/')):
+                        raise ValueError(f"L'objet source doit être une image ou une vidéo ({content_type or 'type inconnu'})")
+                    if output == 'mask' and content_type.startswith('video/'):
+                        raise ValueError("Masque seul non disponible pour les vidéos")
+                    model = await route(
+                        ticket, engine, source_file, model, latency_budget_ms, content_type.startswith('video/')
+                    )
+                    async with scheduler.slot(ticket):
+                        if content_type.startswith('video/'):
+                            result_data, model_used = await run_in_threadpool(
+                                engine.remove_background_video,
+                                source_file,
+                                model_name=model,
+                                output_format=animation_format,
+                                latency_budget_ms=latency_budget_ms,
+                                cancellation=cancellation
+                            )
+                            stream = EncodedStream.from_bytes(result_data)
+                        else:
+                            stream, model_used = await run_in_threadpool(
+                                engine.remove_background_stream,
+                                source_file,
+                                model_name=model,
+                                white_background=white_bg or format.lower() == 'jpeg',
+                                roi_crop=roi,
+                                latency_budget_ms=latency_budget_ms,
+                                animation_format=animation_format,
+                                cancellation=cancellation,
+                                trim=trim,
+                                padding=padding,
+                                mask_only=output == 'mask'
+                            )
+                    # L'encodage se poursuit pendant l'envoi des premières parties
+                    size = await run_in_threadpool(storage.upload, destination, stream, stream.media_type)
+                finally:
+                    source_file.close()
+
+        except HTTPException:
+            raise
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except StorageError as e:
+            raise HTTPException(status_code=e.status_code, detail=str(e))
+        except RequestCancelled as e:
+            raise cancelled_error(e)
+        except Overloaded as e:
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+        except Exception as e:
+            logger.error(f"❌ Erreur lors du traitement stockage objet: {e}")
+            raise HTTPException(status_code=500, detail=str(e))
+
+        fields = {
+            "success": True,
+            "destination": destination,
+            "content_type": stream.media_type,
+            "bytes": size,
+            "model_used": model_used
+        }
+        if trim:
+            fields["bbox"] = list(stream.bbox) if stream.bbox is not None else None
+        if stream.mask_id:
+            fields["mask_id"] = stream.mask_id
+        return fields
+
+    @app.websocket("/ws/remove-background")
+    async def remove_background_ws(websocket: WebSocket):
+        """
+        Transport binaire pour le trafic interne (voir engine.framing)
+
+        Une trame par requête et par réponse, sans multipart ni base64 ;
+        plusieurs requêtes peuvent être en cours sur la même connexion.
+        """
+        await websocket.accept()
+        engine = await run_in_threadpool(holder.get)
+        in_flight = asyncio.Semaphore(WS_MAX_IN_FLIGHT)
+        send_lock = asyncio.Lock()
+        tickets = set()
+        tasks = set()
+
+        async def process(header: dict, payload: memoryview) -> bytes:
+            """Réponse à une requête : résultat, ou erreur avec son statut HTTP"""
+            request_id = header.get('id')
+            video = str(header.get('content_type', '')).startswith('video/')
+            ticket = None
+            try:
+                options = read_options(header)
+                model = options['model']
+                output = options['return']
+                if model not in MODELS:
+                    raise HTTPException(
+                        status_code=400,
+                        detail=f"Modèle '{model}' non supporté. Modèles disponibles: {list(MODELS.keys())}"
+                    )
+                if output == 'mask' and video:
+                    raise HTTPException(status_code=400, detail="Masque seul non disponible pour les vidéos")
+                deadline_ms = header.get('deadline_ms')
+                ticket = admit(
+                    websocket, engine, model,
+                    {'x-deadline-ms': str(deadline_ms)} if deadline_ms is not None else None
+                )
+                tickets.add(ticket)
+                animation_format = 'apng' if options['format'].lower() == 'apng' else 'webp'
+                model = await route(ticket, engine, payload, model, options['latency_budget_ms'], video)
+                async with scheduler.slot(ticket):
+                    if video:
+                        result_data, model_used = await run_in_threadpool(
+                            engine.remove_background_video,
+                            payload,
+                            model_name=model,
+                            output_format=animation_format,
+                            latency_budget_ms=options['latency_budget_ms'],
+                            cancellation=ticket.cancellation
+                        )
+                        stream = EncodedStream.from_bytes(result_data)
+                    else:
+                        stream, model_used = await run_in_threadpool(
+                            engine.remove_background_stream,
+                            payload,
+                            model_name=model,
+                            white_background=options['white_bg'] or options['format'].lower() == 'jpeg',
+                            roi_crop=options['roi'],
+                            latency_budget_ms=options['latency_budget_ms'],
+                            animation_format=animation_format,
+                            cancellation=ticket.cancellation,
+                            trim=options['trim'],
+                            padding=options['padding'],
+                            mask_only=output == 'mask'
+                        )
+                result = await run_in_threadpool(b"".join, stream)
+                fields = {
+                    "id": request_id, "status": 200, "model_used": model_used,
+                    "content_type": stream.media_type
+                }
+                if stream.bbox is not None:
+                    fields["bbox"] = list(stream.bbox)
+                if stream.mask_id:
+                    fields["mask_id"] = stream.mask_id
+                return pack_frame(fields, result)
+            except HTTPException as e:
+                error = e
+            except RequestCancelled as e:
+                error = cancelled_error(e)
+            except Overloaded as e:
+                error = HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+            except Exception as e:
+                logger.error(f"❌ Erreur lors du traitement WebSocket: {e}")
+                error = HTTPException(status_code=500, detail=str(e))
+            finally:
+                tickets.discard(ticket)
+            fields = {"id": request_id, "status": error.status_code, "error": error.detail}
+            if error.headers and "Retry-After" in error.headers:
+                fields["retry_after"] = int(error.headers["Retry-After"])
+            return pack_frame(fields)
+
+        async def respond(frame: bytes):
+            try:
+                try:
+                    header, payload = unpack_frame(frame)
+                except ValueError as e:
+                    response = pack_frame({"id": None, "status": 400, "error": str(e)})
+                else:
+                    response = await process(header, payload)
+                async with send_lock:
+                    await websocket.send_bytes(response)
+            except (WebSocketDisconnect, RuntimeError):
+                # Connexion fermée pendant le traitement : plus personne à qui répondre
+                pass
+            finally:
+                in_flight.release()
+
+        try:
+            while True:
+                # Contrôle de flux : pas de nouvelle lecture au-delà de WS_MAX_IN_FLIGHT requêtes
+                await in_flight.acquire()
+                message = await websocket.receive()
+                if message['type'] == 'websocket.disconnect':
+                    break
+                if message.get('bytes') is None:
+                    in_flight.release()
+                    await websocket.close(code=1003, reason="Trames binaires attendues")
+                    break
+                task = asyncio.create_task(respond(message['bytes']))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except WebSocketDisconnect:
+            pass
+        finally:
+            # Client parti : les requêtes en attente ou en cours sont abandonnées
+            for ticket in list(tickets):
+                ticket.cancellation.disconnected.set()
+                scheduler.abandon(ticket)
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+    @app.post("/composite")
+    async def composite_endpoint(
+        image: UploadFile = File(..., description="Image d'origine"),
+        mask: Optional[UploadFile] = File(None, description="Masque (niveaux de gris, ou résultat détouré)"),
+        mask_id: Optional[str] = Query(None, description="Masque conservé (en-tête X-Mask-Id), à défaut de fichier"),
+        background: Optional[str] = Query(None, description="Couleur de fond (nom ou #rrggbb), transparent sinon"),
+        white_bg: bool = Query(False, description="Ajouter un fond blanc"),
+        format: str = Query('png', description="Format de sortie (png/jpeg)"),
+        trim: bool = Query(False, description="Recadrer le résultat sur le sujet (en-tête X-Subject-BBox)"),
+        padding: int = Query(0, ge=0, description="Marge en pixels autour du sujet avec trim"),
+        renditions: Optional[str] = Query(None, description="Plusieurs tailles, ex. thumb:150,listing:600,zoom:1600x1200"),
+        renditions_format: str = Query('zip', description="Conteneur des déclinaisons (zip/multipart)"),
+        output: str = Query('image', alias='return', description="Résultat : image composée ou masque seul (mask)")
+    ):
+        """
+        Nouveau rendu (fond, taille, format) d'une image déjà détourée
+
+        Le masque vient du client (fichier) ou des masques conservés après
+        /remove-background (mask_id) : ni inférence ni file d'attente.
+        """
+        if not (image.content_type or '').startswith('image/'):
+            raise HTTPException(status_code=400, detail="Le fichier doit être une image")
+        check_result_kind(output)
+        try:
+            color = parse_color(background) if background else None
+            rendition_list = None
+            if renditions:
+                if renditions_format not in RENDITION_CONTAINERS:
+                    raise ValueError(
+                        f"renditions_format '{renditions_format}' non supporté. Valeurs possibles: {list(RENDITION_CONTAINERS)}"
+                    )
+                rendition_list = parse_renditions(renditions)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if color is None and (white_bg or format.lower() == 'jpeg'):
+            color = WHITE
+
+        engine = await run_in_threadpool(holder.get)
+        stream = await run_in_threadpool(
+            engine.composite,
+            image.file,
+            mask_data=mask.file if mask is not None else None,
+            mask_id=mask_id,
+            background=color,
+            trim=trim,
+            padding=padding,
+            mask_only=output == 'mask',
+            renditions=rendition_list,
+            container=renditions_format
+        )
+        return StreamingResponse(stream, media_type=stream.media_type, headers=result_headers(stream))
+
+    return app
+
+
+def check_result_kind(output: str):
+    if output not in RESULT_KINDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"return '{output}' non supporté. Valeurs possibles: {list(RESULT_KINDS)}"
+        )
+
+
+def read_options(body: dict) -> dict:
+    """
+    Options d'un corps JSON ou d'un en-tête de trame (voir JSON_OPTIONS)
+
+    Une valeur absente ou null prend la valeur par défaut ; un type invalide
+    donne un 400, comme les paramètres typés de /remove-background.
+    """
+    options = {}
+    for name, (kind, default) in JSON_OPTIONS.items():
+        value = body.get(name)
+        if value is None:
+            value = default
+        elif kind is float and type(value) in (int, float):
+            value = float(value)
+        elif type(value) is not kind:  # True n'est pas un entier ici
+            raise HTTPException(status_code=400, detail=f"{name} doit être {TYPE_NAMES[kind]}")
+        options[name] = value
+    if options['padding'] < 0:
+        raise HTTPException(status_code=400, detail="padding doit être un entier positif")
+    check_result_kind(options['return'])
+    return options
+
+
+def result_headers(stream: EncodedStream) -> dict:
+    """En-têtes communs d'un résultat : nom de fichier, boîte du sujet, masque conservé"""
+    headers = {"Content-Disposition": f"attachment; filename={stream.filename}"}
+    if stream.bbox is not None:
+        # left,top,right,bottom dans l'image d'origine
+        headers["X-Subject-BBox"] = ",".join(str(value) for value in stream.bbox)
+    if stream.mask_id:
+        headers["X-Mask-Id"] = stream.mask_id
+    return headers
+
+
+def run(app: FastAPI, config: EngineConfig):
+    """Lance le serveur : gunicorn pré-fork si SERVING_MODE=prefork, uvicorn sinon"""
+    import uvicorn
+    from .serving import SERVING_MODE, run_prefork
+
+    logger.info(f"Démarrage serveur sur port {config.port}")
+    if SERVING_MODE == 'prefork':
+        holder = app.state.engine
+        # En eager, chaque worker recharge les modèles que le parent n'a pas pu partager
+        on_worker_start = (lambda: holder.get().preload()) if config.startup_mode == 'eager' else (lambda: None)
+        run_prefork(app, config.port, on_worker_start=on_worker_start)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=config.port, log_level="info", access_log=True)
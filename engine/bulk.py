@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+"""
+Traitement en masse hors HTTP : répertoire, glob ou archive tar/zip
+
+Le moteur tourne dans un pool de processus (un moteur et ses sessions par
+worker). Un manifeste JSON Lines dans le répertoire de sortie associe
+l'empreinte du contenu et les options à chaque résultat : une relance
+ignore les fichiers déjà traités, même renommés ou déplacés.
+
+Usage :
+    python -m engine.bulk catalogue/ sortie/ --model auto --workers 4
+    python -m engine.bulk "photos/**/*.jpg" sortie/ --white-bg
+    python -m engine.bulk export.zip sortie/ --format apng
+"""
+
+import argparse
+import glob
+import hashlib
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import posixpath
+import queue
+import shutil
+import sys
+import tarfile
+import time
+import zipfile
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+from .config import MODELS, EngineConfig
+from .formats import media_type
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.gif', '.bmp', '.tiff')
+VIDEO_EXTENSIONS = ('.mp4', '.mov', '.webm', '.avi')
+MANIFEST_NAME = "bulk_manifest.jsonl"
+# Fichiers envoyés ensemble à un worker : leurs masques sont lus en une requête au cache
+BATCH_SIZE = 8
+# Lots en attente par worker : borne la mémoire quand les fichiers viennent d'une archive
+BATCHES_PER_WORKER = 2
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# (nom relatif, chemin sur disque ou None, contenu si lu depuis une archive)
+Item = Tuple[str, Optional[str], Optional[bytes]]
+
+_engine = None
+_options = None
+
+
+def _supported(name: str) -> bool:
+    return name.lower().endswith(IMAGE_EXTENSIONS + VIDEO_EXTENSIONS)
+
+
+def safe_name(name: str) -> Optional[str]:
+    """
+    Nom relatif normalisé d'un membre d'archive
+
+    Returns:
+        str: Nom sans '.', ou None s'il est absolu ou remonte hors du répertoire (../)
+    """
+    name = name.replace("\\", "/")
+    if name.startswith("/") or (len(name) > 1 and name[1] == ":"):
+        return None
+    parts = [part for part in name.split("/") if part not in ("", ".")]
+    if not parts or ".." in parts:
+        return None
+    return posixpath.join(*parts)
+
+
+def _archive_member(name: str) -> Optional[str]:
+    """Nom d'un membre d'archive à traiter, ou None (dossier, type non supporté, chemin dangereux)"""
+    if not _supported(name):
+        return None
+    safe = safe_name(name)
+    if safe is None:
+        logger.warning(f"⚠️ Membre d'archive ignoré (chemin hors du répertoire): {name}")
+    return safe
+
+
+def iter_inputs(source: str) -> Iterator[Item]:
+    """Fichiers à traiter d'un répertoire, d'un glob ou d'une archive tar/zip"""
+    if os.path.isdir(source):
+        for path in sorted(Path(source).rglob("*")):
+            if path.is_file() and _supported(path.name):
+                yield str(path.relative_to(source)), str(path), None
+    elif zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as archive:
+            for info in archive.infolist():
+                name = None if info.is_dir() else _archive_member(info.filename)
+                if name is not None:
+                    yield name, None, archive.read(info)
+    elif os.path.isfile(source) and tarfile.is_tarfile(source):
+        with tarfile.open(source) as archive:
+            for member in archive:
+                name = _archive_member(member.name) if member.isfile() else None
+                if name is not None:
+                    yield name, None, archive.extractfile(member).read()
+    else:
+        # Glob : noms relatifs à la partie du motif sans caractère générique
+        base = source.split("*", 1)[0].split("?", 1)[0].split("[", 1)[0]
+        base = base if base.endswith(os.sep) or not base else os.path.dirname(base)
+        for path in sorted(glob.glob(source, recursive=True)):
+            if os.path.isfile(path) and _supported(path):
+                yield os.path.relpath(path, base or "."), path, None
+
+
+def content_hash(item: Item) -> str:
+    name, path, data = item
+    if data is not None:
+        return hashlib.sha256(data).hexdigest()
+    # hashlib seul : le processus principal n'importe ni rembg ni onnxruntime
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for chunk in iter(lambda: handle.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def output_name(target: Path, suffix: str) -> Path:
+    """Fichier de sortie : l'extension d'origine est gardée (a.jpg et a.png ne se remplacent pas)"""
+    return target.with_name(target.name + suffix)
+
+
+def _init_worker(config: EngineConfig, options: dict):
+    """Un moteur par processus, créé une fois (sessions réutilisées entre fichiers)"""
+    global _engine, _options
+    logging.basicConfig(level=logging.WARNING)
+    from .core import BackgroundRemovalEngine
+    _engine = BackgroundRemovalEngine(config)
+    _options = options
+
+
+def _process(task: Tuple[Item, str, str]) -> dict:
+    """Détoure un fichier dans un worker ; les erreurs sont renvoyées, pas levées"""
+    (name, path, data), digest, target = task
+    start_time = time.time()
+    try:
+        # Fichier sur disque : lu via mmap par le moteur, sans copie
+        with open(path, "rb") if data is None else nullcontext(data) as source:
+            result, model_used = _remove(name, source)
+        output = output_name(Path(target), os.path.splitext(media_type(result)[1])[1])
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_bytes(result)
+        return {
+            'name': name, 'hash': digest, 'output': str(output), 'model': model_used,
+            'bytes_in': len(data) if data is not None else os.path.getsize(path),
+            'ms': round((time.time() - start_time) * 1000, 1)
+        }
+    except Exception as e:
+        return {'name': name, 'hash': digest, 'error': str(getattr(e, 'detail', e))}
+
+
+def _process_batch(tasks: List[Tuple[Item, str, str]]) -> List[dict]:
+    """Lot de fichiers : masques déjà calculés (autre run, autre instance) lus d'un coup"""
+    if _options['model'] != 'auto':
+        from .masks import mask_id
+        found = _engine.masks.prefetch([
+            mask_id(digest, _options['model'], _options['roi']) for _, digest, _ in tasks
+        ])
+        if found:
+            logger.info(f"💾 {found}/{len(tasks)} masques déjà dans le cache")
+    return [_process(task) for task in tasks]
+
+
+def _batches(tasks: Iterator, size: int) -> Iterator[list]:
+    while True:
+        batch = list(itertools.islice(tasks, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _remove(name: str, data):
+    """Appel du moteur selon le type de fichier"""
+    if name.lower().endswith(VIDEO_EXTENSIONS):
+        return _engine.remove_background_video(
+            data, model_name=_options['model'], output_format=_options['animation_format'],
+            latency_budget_ms=_options['latency_budget_ms']
+        )
+    return _engine.remove_background_with_model(
+        data, model_name=_options['model'], white_background=_options['white_bg'],
+        roi_crop=_options['roi'], latency_budget_ms=_options['latency_budget_ms'],
+        animation_format=_options['animation_format']
+    )
+
+
+class Manifest:
+    """Résultats déjà produits, indexés par empreinte du contenu + options"""
+
+    def __init__(self, path: Path, options_key: str):
+        self.path = path
+        self.options_key = options_key
+        self.entries = {}
+        if path.exists():
+            with open(path) as handle:
+                for line in handle:
+                    entry = json.loads(line)
+                    if entry.get('options') == options_key and 'output' in entry:
+                        self.entries[entry['hash']] = entry
+        self._handle = open(path, "a")
+
+    def done(self, digest: str) -> Optional[dict]:
+        """Entrée existante dont le fichier de sortie est toujours présent"""
+        entry = self.entries.get(digest)
+        if entry is not None and os.path.exists(entry['output']):
+            return entry
+        return None
+
+    def add(self, entry: dict):
+        entry = dict(entry, options=self.options_key)
+        self.entries[entry['hash']] = entry
+        self._handle.write(json.dumps(entry) + "\n")
+        self._handle.flush()
+
+    def close(self):
+        self._handle.close()
+
+
+def run_bulk(source: str, output_dir: str, config: EngineConfig, options: dict,
+             workers: int) -> dict:
+    """
+    Traite toutes les entrées de source dans output_dir
+
+    Returns:
+        dict: Compteurs (processed, skipped, failed, seconds)
+    """
+    output_path = Path(output_dir)
+    output_path.mkdir(parents=True, exist_ok=True)
+    root = output_path.resolve()
+    options_key = ",".join(f"{key}={options[key]}" for key in sorted(options))
+    manifest = Manifest(output_path / MANIFEST_NAME, options_key)
+    stats = {'processed': 0, 'skipped': 0, 'failed': 0, 'bytes_in': 0}
+    started = time.time()
+
+    # Contenus déjà vus sous un autre nom : copiés depuis le résultat existant,
+    # comptés à la fin (en erreur si la première copie a échoué)
+    duplicates = []
+
+    def tasks():
+        pending = set()
+        for item in iter_inputs(source):
+            target = output_path / item[0]
+            if root not in target.resolve().parents:
+                stats['failed'] += 1
+                print(f"❌ {item[0]}: chemin hors du répertoire de sortie")
+                continue
+            digest = content_hash(item)
+            if manifest.done(digest) is not None or digest in pending:
+                duplicates.append((item[0], digest, target))
+                continue
+            pending.add(digest)
+            yield item, digest, str(target)
+
+    # spawn : onnxruntime ne supporte pas d'être forké avec ses threads démarrés
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(workers, initializer=_init_worker, initargs=(config, options)) as pool:
+        # Fenêtre de lots soumis : les suivants ne sont lus (et copiés vers
+        # les workers) qu'au retour des précédents
+        finished = queue.Queue()
+
+        def submit(batch):
+            pool.apply_async(
+                _process_batch, (batch,), callback=finished.put,
+                error_callback=lambda e: finished.put([
+                    {'name': item[0], 'hash': digest, 'error': str(e)} for item, digest, _ in batch
+                ])
+            )
+
+        batches = _batches(tasks(), BATCH_SIZE)
+        in_flight = 0
+        for batch in itertools.islice(batches, workers * BATCHES_PER_WORKER):
+            submit(batch)
+            in_flight += 1
+        while in_flight:
+            results = finished.get()
+            in_flight -= 1
+            batch = next(batches, None)
+            if batch is not None:
+                submit(batch)
+                in_flight += 1
+            for result in results:
+                if 'error' in result:
+                    stats['failed'] += 1
+                    print(f"❌ {result['name']}: {result['error']}")
+                else:
+                    stats['processed'] += 1
+                    stats['bytes_in'] += result['bytes_in']
+                    manifest.add(result)
+                elapsed = time.time() - started
+                print(
+                    f"📊 {stats['processed']} traités, {stats['skipped']} ignorés, "
+                    f"{stats['failed']} erreurs - {stats['processed'] / elapsed:.2f} img/s, "
+                    f"{stats['bytes_in'] / elapsed / 1e6:.1f} MB/s",
+                    flush=True
+                )
+    for name, digest, target in duplicates:
+        previous = manifest.done(digest)
+        if previous is None:
+            stats['failed'] += 1
+            print(f"❌ {name}: échec du traitement du même contenu sous un autre nom")
+            continue
+        stats['skipped'] += 1
+        copy = output_name(target, Path(previous['output']).suffix)
+        if not copy.exists():
+            copy.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(previous['output'], copy)
+    manifest.close()
+    stats['seconds'] = round(time.time() - started, 1)
+    return stats
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Suppression de background en masse, sans passer par l'API")
+    parser.add_argument("source", help="Répertoire, motif glob, archive .zip ou .tar(.gz)")
+    parser.add_argument("output_dir")
+    parser.add_argument("--model", default="u2net", choices=list(MODELS))
+    parser.add_argument("--white-bg", action="store_true", help="Fond blanc (JPEG)")
+    parser.add_argument("--format", default="png", choices=["png", "jpeg", "webp", "apng"],
+                        help="jpeg : fond blanc, comme --white-bg ; webp/apng : format des animations")
+    parser.add_argument("--roi", action="store_true", help="Recadrer sur le sujet avant l'inférence")
+    parser.add_argument("--latency-budget-ms", type=float, default=None)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args(argv)
+
+    # Les threads d'inférence sont répartis entre les workers
+    os.environ.setdefault("INFERENCE_THREADS", str(max(1, (os.cpu_count() or 1) // args.workers)))
+    logging.basicConfig(level=logging.INFO)
+
+    options = {
+        'model': args.model,
+        # Comme l'API : format=jpeg implique le fond blanc
+        'white_bg': args.white_bg or args.format == 'jpeg',
+        'roi': args.roi,
+        'latency_budget_ms': args.latency_budget_ms,
+        'animation_format': 'apng' if args.format == 'apng' else 'webp',
+    }
+    config = EngineConfig.from_env(startup_mode='lazy')
+    stats = run_bulk(args.source, args.output_dir, config, options, args.workers)
+    print(f"✅ Terminé: {stats}")
+    return 1 if stats['failed'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,311 @@
+"""
+Cache des masques et résultats : interface commune et implémentations
+
+Le même masque est recalculé par chaque instance qui reçoit l'image. Les
+backends partagent une interface (get, get_many, put, stats) :
+
+    memory  LRU en mémoire du processus
+    disk    segments sur disque lus par mmap, partagés par les workers (voir diskcache)
+    redis   serveur compatible Redis partagé par toutes les instances
+
+Avec redis, un LRU en mémoire sert de premier niveau ; pas avec disk, dont
+les lectures sont déjà servies en place depuis le cache de pages (mmap) et
+qu'une copie en mémoire annulerait. Les valeurs
+envoyées à Redis sont compressées (zlib) quand cela réduit leur taille, et
+marquées de l'instance qui les a écrites : /metrics distingue les accès
+servis par une autre instance (remote_hits).
+
+Variables d'environnement :
+    CACHE_BACKEND            memory, disk, redis ou none (défaut: disk si DISK_CACHE_DIR, sinon memory)
+    CACHE_MEMORY_BYTES       taille du LRU en mémoire, seul ou devant Redis (défaut: 64 Mo, 0 = pas de premier niveau)
+    REDIS_URL                serveur Redis (défaut: redis://localhost:6379/0)
+    REDIS_MAX_CONNECTIONS    connexions du pool partagé par les threads (défaut: 16)
+    CACHE_TTL_S              durée de vie des entrées Redis (défaut: 7 jours)
+    CACHE_COMPRESSION_LEVEL  niveau zlib des valeurs Redis (défaut: 1, 0 = sans compression)
+"""
+
+import hashlib
+import logging
+import os
+import socket
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+CACHE_BACKENDS = ('memory', 'disk', 'redis', 'none')
+
+CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "")
+CACHE_MEMORY_BYTES = int(os.environ.get("CACHE_MEMORY_BYTES", 64 * 1024 * 1024))
+REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
+REDIS_MAX_CONNECTIONS = int(os.environ.get("REDIS_MAX_CONNECTIONS", 16))
+CACHE_TTL_S = int(os.environ.get("CACHE_TTL_S", 7 * 24 * 3600))
+CACHE_COMPRESSION_LEVEL = int(os.environ.get("CACHE_COMPRESSION_LEVEL", 1))
+
+# Attente maximale de Redis : au-delà, le cache est ignoré pour cette requête
+REDIS_TIMEOUT_S = 0.5
+# Gain minimal pour garder la version compressée d'une valeur
+MIN_COMPRESSION_GAIN = 0.9
+# Préfixe des clés dans Redis
+KEY_PREFIX = "rembg:"
+
+# Instance (conteneur) qui a écrit une valeur
+INSTANCE_ID = hashlib.sha1(socket.gethostname().encode()).digest()[:8]
+
+
+class CacheBackend:
+    """Interface des caches clé -> octets ; un cache ne fait jamais échouer une requête"""
+
+    name = 'none'
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Valeur (bytes ou memoryview), ou None si absente"""
+        return None
+
+    def get_many(self, keys: List[str]) -> Dict[str, bytes]:
+        """Valeurs présentes parmi keys"""
+        values = {}
+        for key in keys:
+            value = self.get(key)
+            if value is not None:
+                values[key] = value
+        return values
+
+    def put(self, key: str, value: bytes):
+        pass
+
+    def stats(self) -> dict:
+        return {'backend': self.name}
+
+
+class MemoryCache(CacheBackend):
+    """LRU en mémoire du processus, borné en octets"""
+
+    name = 'memory'
+
+    def __init__(self, max_bytes: int = CACHE_MEMORY_BYTES):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: str, value: bytes):
+        if len(value) > self.max_bytes:
+            return
+        value = bytes(value)
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = value
+            self.bytes += len(value)
+            while self.bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.bytes -= len(evicted)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'backend': self.name,
+                'entries': len(self._entries),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+
+class TieredCache(CacheBackend):
+    """LRU en mémoire devant un cache partagé distant (Redis)"""
+
+    def __init__(self, front: MemoryCache, back: CacheBackend):
+        self.front = front
+        self.back = back
+        self.name = back.name
+
+    def get(self, key: str) -> Optional[bytes]:
+        value = self.front.get(key)
+        if value is None:
+            value = self.back.get(key)
+            if value is not None:
+                self.front.put(key, value)
+        return value
+
+    def get_many(self, keys: List[str]) -> Dict[str, bytes]:
+        values = self.front.get_many(keys)
+        missing = [key for key in keys if key not in values]
+        if missing:
+            for key, value in self.back.get_many(missing).items():
+                self.front.put(key, value)
+                values[key] = value
+        return values
+
+    def put(self, key: str, value: bytes):
+        self.front.put(key, value)
+        self.back.put(key, value)
+
+    def stats(self) -> dict:
+        return dict(self.back.stats(), memory=self.front.stats())
+
+
+_VALUE_HEADER = struct.Struct("<B8s")
+_COMPRESSED = 1
+
+
+class RedisCache(CacheBackend):
+    """Serveur compatible Redis partagé par les instances (paquet redis requis)"""
+
+    name = 'redis'
+
+    def __init__(self, url: str = REDIS_URL, max_connections: int = REDIS_MAX_CONNECTIONS,
+                 ttl_s: int = CACHE_TTL_S, compression_level: int = CACHE_COMPRESSION_LEVEL,
+                 connection_pool=None):
+        """
+        Args:
+            url: Adresse du serveur (redis://, rediss://, unix://)
+            max_connections: Taille du pool ; au-delà, les threads attendent une connexion
+            ttl_s: Durée de vie des entrées
+            compression_level: Niveau zlib (0 = sans compression)
+            connection_pool: Pool déjà construit (serveur embarqué, tests)
+        """
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("CACHE_BACKEND=redis nécessite le paquet redis (pip install redis)")
+        self._errors = (redis.RedisError, OSError)
+        if connection_pool is None:
+            connection_pool = redis.BlockingConnectionPool.from_url(
+                url, max_connections=max_connections, timeout=REDIS_TIMEOUT_S,
+                socket_timeout=REDIS_TIMEOUT_S, socket_connect_timeout=REDIS_TIMEOUT_S
+            )
+        self.client = redis.Redis(connection_pool=connection_pool)
+        self.ttl_s = ttl_s
+        self.compression_level = compression_level
+        self.hits = 0
+        self.remote_hits = 0
+        self.misses = 0
+        self.errors = 0
+        self.bytes_sent = 0
+        self.bytes_saved = 0
+        self._lock = threading.Lock()
+
+    def _encode(self, value: bytes) -> bytes:
+        """En-tête (compression, instance) puis valeur, compressée si c'est rentable"""
+        flags = 0
+        if self.compression_level:
+            compressed = zlib.compress(value, self.compression_level)
+            if len(compressed) < len(value) * MIN_COMPRESSION_GAIN:
+                with self._lock:
+                    self.bytes_saved += len(value) - len(compressed)
+                flags, value = _COMPRESSED, compressed
+        return _VALUE_HEADER.pack(flags, INSTANCE_ID) + bytes(value)
+
+    def _decode(self, data: Optional[bytes]) -> Optional[bytes]:
+        """Valeur sans en-tête ; absente ou illisible (valeur corrompue, autre format) : None"""
+        if data is not None:
+            try:
+                flags, writer = _VALUE_HEADER.unpack_from(data)
+                value = data[_VALUE_HEADER.size:]
+                if flags & _COMPRESSED:
+                    value = zlib.decompress(value)
+            except (struct.error, zlib.error) as e:
+                self._failed('decode', e)
+                data = None
+        with self._lock:
+            if data is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            if writer != INSTANCE_ID:
+                self.remote_hits += 1
+        return value
+
+    def _failed(self, operation: str, error: Exception):
+        with self._lock:
+            self.errors += 1
+        logger.warning(f"⚠️ Cache Redis indisponible ({operation}): {error}")
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            data = self.client.get(KEY_PREFIX + key)
+        except self._errors as e:
+            self._failed('get', e)
+            return None
+        return self._decode(data)
+
+    def get_many(self, keys: List[str]) -> Dict[str, bytes]:
+        """Une seule requête MGET pour toutes les clés"""
+        if not keys:
+            return {}
+        try:
+            data = self.client.mget([KEY_PREFIX + key for key in keys])
+        except self._errors as e:
+            self._failed('mget', e)
+            return {}
+        values = {}
+        for key, item in zip(keys, data):
+            value = self._decode(item)
+            if value is not None:
+                values[key] = value
+        return values
+
+    def put(self, key: str, value: bytes):
+        data = self._encode(value)
+        try:
+            self.client.set(KEY_PREFIX + key, data, ex=self.ttl_s, nx=True)
+        except self._errors as e:
+            self._failed('set', e)
+            return
+        with self._lock:
+            self.bytes_sent += len(data)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'backend': self.name,
+                'hits': self.hits,
+                'remote_hits': self.remote_hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'remote_hit_rate': round(self.remote_hits / lookups, 3) if lookups else 0.0,
+                'errors': self.errors,
+                'bytes_sent': self.bytes_sent,
+                'compression_saved_bytes': self.bytes_saved,
+            }
+
+
+def cache_from_env() -> CacheBackend:
+    """Cache selon CACHE_BACKEND (avec premier niveau en mémoire pour redis)"""
+    from .diskcache import DISK_CACHE_DIR, DiskCache
+
+    backend = CACHE_BACKEND or ('disk' if DISK_CACHE_DIR else 'memory')
+    if backend not in CACHE_BACKENDS:
+        raise ValueError(f"CACHE_BACKEND invalide: {backend}. Valeurs possibles: {list(CACHE_BACKENDS)}")
+    if backend == 'none':
+        return CacheBackend()
+    if backend == 'memory':
+        return MemoryCache()
+    if backend == 'disk':
+        if not DISK_CACHE_DIR:
+            raise ValueError("CACHE_BACKEND=disk nécessite DISK_CACHE_DIR")
+        logger.info(f"💾 Cache partagé: {backend}")
+        # Accès en place (memoryview sur le mmap) : pas de copie en mémoire du processus
+        return DiskCache(DISK_CACHE_DIR)
+    shared = RedisCache()
+    logger.info(f"💾 Cache partagé: {backend}")
+    return TieredCache(MemoryCache(), shared) if CACHE_MEMORY_BYTES else shared
@@ -0,0 +1,118 @@
+"""
+Regroupement des requêtes identiques en cours de traitement
+
+Les relances et événements dupliqués envoient parfois la même image
+plusieurs fois dans la même seconde. Une requête dont la clé (empreinte du
+contenu, modèle, options) est déjà en cours attend le calcul existant et
+reçoit le même résultat, au lieu de relancer une inférence complète.
+Pendant l'attente, elle reste soumise à sa propre échéance et à la
+déconnexion de son client.
+"""
+
+import hashlib
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple, Type
+
+from .deadline import Cancellation
+
+# Intervalle de vérification de la déconnexion pendant l'attente d'un calcul partagé
+WAIT_CHECK_S = 0.1
+
+
+def content_digest(data: memoryview) -> str:
+    """Empreinte SHA-256 du contenu envoyé"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def request_key(digest: str, *options) -> str:
+    """Clé d'une requête : empreinte du contenu (voir content_digest) et options de traitement"""
+    return "|".join([digest, *(str(option) for option in options)])
+
+
+class _Call:
+    """Calcul en cours, partagé par toutes les requêtes de même clé"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class InFlightRequests:
+    """Calculs en cours indexés par clé de requête"""
+
+    def __init__(self, retry_on: Tuple[Type[Exception], ...] = ()):
+        """
+        Args:
+            retry_on: Erreurs propres à la requête qui a lancé le calcul (client
+                parti...) : les requêtes en attente relancent alors le calcul
+        """
+        self.retry_on = retry_on
+        self.coalesced = 0
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+
+    def run(self, key: str, compute: Callable[[], Any],
+            cancellation: Optional[Cancellation] = None) -> Tuple[Any, bool]:
+        """
+        Exécute compute, ou attend le calcul déjà lancé pour la même clé
+
+        Args:
+            key: Clé de la requête (voir request_key)
+            compute: Calcul à effectuer si aucun n'est en cours
+            cancellation: Échéance et déconnexion de cette requête, vérifiées pendant l'attente
+
+        Returns:
+            Tuple[Any, bool]: Résultat, et True s'il provient d'un calcul partagé
+
+        Raises:
+            RequestCancelled: Client parti ou échéance dépassée pendant l'attente
+        """
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = self._calls[key] = _Call()
+                else:
+                    self.coalesced += 1
+            if leader:
+                break
+
+            self._wait(call, cancellation)
+            if isinstance(call.error, self.retry_on):
+                continue
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = compute()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            # Les requêtes suivantes relancent un calcul (pas de cache des résultats)
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    @staticmethod
+    def _wait(call: _Call, cancellation: Optional[Cancellation]):
+        """Attend la fin du calcul partagé, sans dépasser l'échéance de la requête"""
+        if cancellation is None:
+            call.done.wait()
+            return
+        while True:
+            timeout = WAIT_CHECK_S
+            if cancellation.deadline is not None:
+                timeout = min(timeout, max(0.0, cancellation.deadline - time.monotonic()))
+            if call.done.wait(timeout):
+                return
+            cancellation.check("en attente d'une requête identique")
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'in_flight': len(self._calls), 'coalesced': self.coalesced}
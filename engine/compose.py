@@ -0,0 +1,82 @@
+"""
+Post-traitement du détourage avant encodage : recadrage sur le sujet, fond coloré
+
+Ces étapes ne dépendent que de l'image détourée (RGBA) : elles sont
+appliquées par requête, après le calcul partagé du masque.
+"""
+
+from typing import Optional, Tuple
+
+import numpy as np
+from PIL import Image, ImageColor
+
+from .roi import BBox
+
+# Opacité minimale (0-255) d'un pixel du sujet : ignore le bruit des masques doux
+ALPHA_THRESHOLD = 8
+
+WHITE = (255, 255, 255)
+
+Color = Tuple[int, int, int]
+
+
+def alpha_bbox(image: Image.Image, padding: int = 0,
+               threshold: int = ALPHA_THRESHOLD) -> Optional[BBox]:
+    """
+    Boîte englobante des pixels opaques d'une image RGBA
+
+    Args:
+        image: Image détourée
+        padding: Marge ajoutée autour du sujet (pixels), bornée à l'image
+        threshold: Opacité minimale d'un pixel du sujet
+
+    Returns:
+        (left, top, right, bottom), ou None si l'image est entièrement transparente
+    """
+    alpha = np.asarray(image.getchannel("A"))
+    opaque = alpha > threshold
+    rows = np.flatnonzero(opaque.any(axis=1))
+    if rows.size == 0:
+        return None
+    cols = np.flatnonzero(opaque[rows[0]:rows[-1] + 1].any(axis=0))
+
+    width, height = image.size
+    return (
+        max(0, int(cols[0]) - padding),
+        max(0, int(rows[0]) - padding),
+        min(width, int(cols[-1]) + 1 + padding),
+        min(height, int(rows[-1]) + 1 + padding),
+    )
+
+
+def trim_to_subject(image: Image.Image, padding: int = 0) -> Tuple[Image.Image, Optional[BBox]]:
+    """
+    Recadre l'image détourée sur son sujet
+
+    Returns:
+        Tuple: Image recadrée (inchangée si rien n'est opaque) et boîte utilisée
+    """
+    image = image.convert("RGBA")
+    bbox = alpha_bbox(image, padding)
+    if bbox is None or bbox == (0, 0) + image.size:
+        return image, bbox
+    return image.crop(bbox), bbox
+
+
+def parse_color(value: str) -> Color:
+    """Couleur de fond : nom CSS ("white"), "#rrggbb" ou "rrggbb" """
+    value = value.strip()
+    if len(value) in (3, 6) and all(c in "0123456789abcdefABCDEF" for c in value):
+        value = "#" + value
+    try:
+        return ImageColor.getrgb(value)[:3]
+    except ValueError:
+        raise ValueError(f"Couleur de fond invalide: '{value}'")
+
+
+def on_color(image: Image.Image, color: Color = WHITE) -> Image.Image:
+    """Image détourée composée sur un fond uni (RGB)"""
+    image = image.convert("RGBA")
+    background = Image.new("RGB", image.size, color)
+    background.paste(image, mask=image.getchannel("A"))
+    return background
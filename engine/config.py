@@ -0,0 +1,96 @@
+"""
+Configuration d'un point d'entrée : politiques de chargement, limites et GC
+
+Chaque point d'entrée (main.py, index.py, main_cloudrun*.py) ne fait que
+choisir ses valeurs par défaut ; les variables d'environnement ont priorité.
+
+Variables d'environnement :
+    STARTUP_MODE     eager, lazy ou background (voir startup.py)
+    PRELOAD_MODELS   modèles chargés au démarrage, par ordre de priorité
+    MAX_IMAGE_BYTES  taille maximale d'une image ou vidéo reçue (0 = sans limite)
+    GC_COLLECT       1/true : gc.collect() autour de chaque traitement
+    REQUEST_TIMEOUT_MS  échéance des requêtes sans en-tête X-Deadline-Ms (0 = aucune)
+    PORT             port d'écoute
+"""
+
+import os
+from typing import Dict, List, Optional
+
+STARTUP_MODES = ('eager', 'lazy', 'background')
+
+# Modèles exposés par l'API, avec leur description
+MODELS = {
+    'u2net': 'Général - Bon équilibre qualité/vitesse',
+    'u2net_human_seg': 'Optimisé pour les personnes',
+    'u2net_cloth_seg': 'Optimisé pour les vêtements',
+    'isnet-general-use': 'Général - Haute qualité',
+    'birefnet-general': 'Général - Très haute qualité (plus lent)',
+    'silueta': 'Personnes - Rapide',
+    'auto': 'Automatique - Détourage classique si fond uni, sinon meilleur modèle dans le budget'
+}
+
+
+def _env_flag(name: str, default: bool) -> bool:
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.lower() in ("1", "true", "yes")
+
+
+class EngineConfig:
+    """Politiques d'un point d'entrée du service"""
+
+    def __init__(self, title: str = "Background Removal API",
+                 description: str = "API pour supprimer le background des images avec rembg",
+                 version: str = "1.0.0", startup_mode: str = 'eager',
+                 preload_models: Optional[List[str]] = None, max_image_bytes: int = 0,
+                 gc_collect: bool = False, log_requests: bool = False, port: int = 8000,
+                 request_timeout_ms: float = 0,
+                 root_info: Optional[Dict] = None, health_info: Optional[Dict] = None):
+        """
+        Args:
+            title, description, version: Métadonnées de l'application FastAPI
+            startup_mode: 'eager' (modèles chargés à l'import), 'lazy' (à la
+                première requête) ou 'background' (thread lancé au démarrage)
+            preload_models: Modèles chargés au démarrage (défaut: u2net)
+            max_image_bytes: Taille maximale des données reçues (0 = sans limite)
+            gc_collect: Forcer un gc.collect() avant/après chaque traitement
+            log_requests: Journaliser chaque requête (middleware de débogage)
+            port: Port d'écoute
+            request_timeout_ms: Échéance par défaut d'une requête (0 = aucune),
+                au-delà de laquelle elle est abandonnée entre deux étapes
+            root_info: Champs ajoutés à la réponse de /
+            health_info: Champs ajoutés à la réponse de /health
+        """
+        if startup_mode not in STARTUP_MODES:
+            raise ValueError(f"STARTUP_MODE invalide: {startup_mode}. Valeurs possibles: {STARTUP_MODES}")
+        self.title = title
+        self.description = description
+        self.version = version
+        self.startup_mode = startup_mode
+        self.preload_models = list(preload_models) if preload_models is not None else ['u2net']
+        self.max_image_bytes = max_image_bytes
+        self.gc_collect = gc_collect
+        self.log_requests = log_requests
+        self.port = port
+        self.request_timeout_ms = request_timeout_ms
+        self.root_info = root_info or {}
+        self.health_info = health_info or {}
+
+    @classmethod
+    def from_env(cls, **defaults) -> 'EngineConfig':
+        """Valeurs par défaut du point d'entrée, surchargées par l'environnement"""
+        if "STARTUP_MODE" in os.environ:
+            defaults['startup_mode'] = os.environ["STARTUP_MODE"]
+        if "PRELOAD_MODELS" in os.environ:
+            defaults['preload_models'] = [
+                name for name in os.environ["PRELOAD_MODELS"].split(",") if name
+            ]
+        if "MAX_IMAGE_BYTES" in os.environ:
+            defaults['max_image_bytes'] = int(os.environ["MAX_IMAGE_BYTES"])
+        defaults['gc_collect'] = _env_flag("GC_COLLECT", defaults.get('gc_collect', False))
+        if "PORT" in os.environ:
+            defaults['port'] = int(os.environ["PORT"])
+        if "REQUEST_TIMEOUT_MS" in os.environ:
+            defaults['request_timeout_ms'] = float(os.environ["REQUEST_TIMEOUT_MS"])
+        return cls(**defaults)
@@ -0,0 +1,685 @@
+"""
+Moteur de suppression de background partagé par tous les points d'entrée
+
+Les imports lourds (rembg, onnxruntime, OpenCV) sont faits ici et chronométrés :
+app.py n'importe ce module qu'au moment de créer le moteur, ce qui permet un
+démarrage lazy sans dupliquer le service.
+"""
+
+import gc
+import io
+import itertools
+import logging
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from typing import List, Optional, Tuple, Union
+
+from fastapi import HTTPException
+
+from .config import MODELS, EngineConfig
+
+_import_started = time.time()
+try:
+    from rembg import remove as bg
+    from rembg.bg import fix_image_orientation, get_concat_v_multi, naive_cutout
+    from rembg.sessions import sessions_names
+    from PIL import Image
+    from .animation import is_animated, iter_image_frames, open_video_frames, remove_background_frames
+    from .fastpath import CONFIDENCE_THRESHOLD, segment_uniform_background
+    from .roi import BBox, find_subject_bbox, paste_mask
+    from .router import ModelRouter
+    from .serving import sessions_shared_across_workers
+    from .startup import ModelLoader, StartupTracker
+    from .inputs import InputData, input_buffer, open_image
+    from .coalesce import InFlightRequests, content_digest, request_key
+    from .deadline import Cancellation, RequestCancelled
+    from .streaming import EncodedStream
+    from .compose import WHITE, Color, on_color, trim_to_subject
+    from .masks import MaskStore, mask_id
+    from .cache import cache_from_env
+    from .renditions import Rendition, iter_multipart, iter_zip, new_boundary, resize_pyramid
+except ImportError as e:
+    print(f"❌ Erreur d'import: {e}")
+    raise
+IMPORT_MS = (time.time() - _import_started) * 1000
+
+logger = logging.getLogger(__name__)
+
+# Masques du fast path calculés au routage (resolve_model), en attente de leur traitement
+PENDING_PROBES = 16
+
+
+class BackgroundRemovalEngine:
+    """Service pour gérer la suppression de background"""
+
+    MODELS = MODELS
+
+    AUTO_MODEL = 'auto'
+    FAST_PATH_MODEL = 'fast-path'
+
+    def __init__(self, config: EngineConfig):
+        self.config = config
+        self.startup = StartupTracker(config.startup_mode, config.preload_models)
+        self.startup.record('import', IMPORT_MS)
+        self.loader = ModelLoader(self.startup)
+        # Hors ligne : échec immédiat si un modèle configuré manque ou est corrompu
+        if self.loader.store.offline:
+            with self.startup.phase('store.verify'):
+                self.loader.store.verify_all(config.preload_models)
+        self.router = ModelRouter(sessions_names)
+        # Un calcul abandonné par son client est relancé pour les requêtes identiques
+        self.in_flight = InFlightRequests(retry_on=(RequestCancelled,))
+        # Masques et animations déjà calculés (mémoire, disque ou Redis selon CACHE_BACKEND)
+        self.cache = cache_from_env()
+        self.masks = MaskStore(self.cache)
+        # Empreinte du contenu -> masque du fast path, repris par le traitement
+        self._probes: "OrderedDict[str, Image.Image]" = OrderedDict()
+        self._probes_lock = threading.Lock()
+        self.metrics = {
+            'requests': 0,
+            'fast_path_attempts': 0,
+            'fast_path_hits': 0,
+            'animated_frames': 0,
+            'animated_keyframes': 0,
+            'composites': 0
+        }
+        # En mode eager, pré-charger les modèles configurés (dans le parent
+        # en pré-fork, sinon dans chaque worker après le fork)
+        if config.startup_mode == 'eager' and sessions_shared_across_workers():
+            self.preload()
+
+    def preload(self):
+        """Charge et chauffe les modèles configurés, par ordre de priorité"""
+        self.loader.warm(self.config.preload_models)
+
+    def _collect(self):
+        """Libération mémoire explicite, si la politique GC du point d'entrée le demande"""
+        if self.config.gc_collect:
+            gc.collect()
+
+    def _check_size(self, data: memoryview):
+        max_bytes = self.config.max_image_bytes
+        if max_bytes and len(data) > max_bytes:
+            raise ValueError(f"Image trop grande ({len(data)} bytes). Maximum: {max_bytes} bytes")
+
+    def _coalesce(self, digest: str, compute, cancellation: Cancellation, *options):
+        """Exécute compute, ou partage le calcul en cours pour le même contenu et les mêmes options"""
+        result, shared = self.in_flight.run(request_key(digest, *options), compute, cancellation)
+        if shared:
+            logger.info("Requête identique déjà en cours, résultat partagé")
+        return result
+
+    def _cached_result(self, key: str, compute) -> Union[bytes, memoryview]:
+        """Résultat encodé (animation) lu dans le cache (en place sur disque), ou calculé puis écrit"""
+        cached = self.cache.get(f"result:{key}")
+        if cached is not None:
+            logger.info(f"💾 Résultat servi depuis le cache ({self.cache.name})")
+            return cached
+        result = compute()
+        self.cache.put(f"result:{key}", result)
+        return result
+
+    def get_session(self, model_name: str = 'u2net'):
+        """Récupère ou crée une session pour un modèle"""
+        try:
+            if model_name not in self.loader.sessions:
+                self._collect()
+            return self.loader.get(model_name)
+        except Exception as e:
+            logger.error(f"Erreur lors de l'initialisation du modèle {model_name}: {e}")
+            # Fallback vers u2net, mémorisé pour ne pas retenter à chaque requête
+            if model_name == 'u2net':
+                raise
+            self.loader.sessions[model_name] = self.loader.get('u2net')
+            return self.loader.sessions[model_name]
+
+    def tensor_stats(self) -> dict:
+        """Allocations et réutilisations des tampons d'inférence, toutes sessions confondues"""
+        totals = {'allocations': 0, 'reuses': 0}
+        sessions = {id(session): session for session in list(self.loader.sessions.values())}
+        for session in sessions.values():
+            buffers = getattr(session, 'tensor_buffers', None)
+            if buffers is not None:
+                for key, value in buffers.stats().items():
+                    totals[key] += value
+        return totals
+
+    def _remove_with_roi(self, image: Image.Image, session) -> Optional[Image.Image]:
+        """
+        Inférence limitée à la région d'intérêt, masque replacé en pleine taille
+
+        Returns:
+            Image: Image détourée, ou None si aucune région pertinente n'est trouvée
+        """
+        bbox = find_subject_bbox(image)
+        if bbox is None:
+            return None
+
+        logger.info(f"ROI détectée: {bbox} sur {image.size}")
+        crop = image.crop(bbox)
+        cutouts = [
+            naive_cutout(image, paste_mask(mask, bbox, image.size))
+            for mask in session.predict(crop)
+        ]
+
+        return get_concat_v_multi(cutouts)
+
+    def _probe_fast_path(self, image: Image.Image) -> Optional[Image.Image]:
+        """
+        Segmentation classique sans réseau de neurones pour les fonds unis
+
+        Returns:
+            Image: Masque, ou None si la confiance est insuffisante
+        """
+        self.metrics['fast_path_attempts'] += 1
+        mask, confidence = segment_uniform_background(image)
+        if mask is None or confidence < CONFIDENCE_THRESHOLD:
+            logger.info(f"Fast path refusé (confiance {confidence:.2f}), passage au modèle")
+            return None
+
+        self.metrics['fast_path_hits'] += 1
+        return mask
+
+    def _try_fast_path(self, image: Image.Image, digest: str) -> Optional[Image.Image]:
+        """
+        Détourage classique pour les fonds unis, avec le masque du routage s'il existe
+
+        Returns:
+            Image: Image détourée, ou None si la confiance est insuffisante
+        """
+        with self._probes_lock:
+            mask = self._probes.pop(digest, None)
+        if mask is None or mask.size != image.size:
+            mask = self._probe_fast_path(image)
+        return naive_cutout(image, mask) if mask is not None else None
+
+    def resolve_model(self, image_data: InputData, model_name: str,
+                      latency_budget_ms: Optional[float] = None, video: bool = False) -> str:
+        """
+        Modèle que retiendra le routage 'auto', résolu avant l'admission
+
+        L'ordonnanceur coûte et limite (MODEL_CONCURRENCY) la requête selon ce
+        modèle ; il est ensuite passé tel quel au traitement.
+
+        Args:
+            image_data: Données de l'image ou de la vidéo
+            model_name: Modèle demandé
+            latency_budget_ms: Budget de latence pour le routage 'auto'
+            video: Données vidéo (routage sur la première image)
+
+        Returns:
+            str: model_name hors 'auto', FAST_PATH_MODEL si le fond est uni
+                (masque gardé pour le traitement), sinon le choix du routeur
+                ('auto' si l'entrée est illisible : le traitement rapporte l'erreur)
+        """
+        if model_name != self.AUTO_MODEL:
+            return model_name
+        try:
+            with input_buffer(image_data) as data:
+                self._check_size(data)
+                if video:
+                    with open_video_frames(data) as (_, frames):
+                        first = next(frames, None)
+                    if first is None:
+                        return model_name
+                    return self.router.choose(first[0], latency_budget_ms)
+                if is_animated(open_image(data)):
+                    return self.router.choose(open_image(data), latency_budget_ms)
+                image = fix_image_orientation(open_image(data))
+                mask = self._probe_fast_path(image)
+                if mask is None:
+                    return self.router.choose(image, latency_budget_ms)
+                with self._probes_lock:
+                    self._probes[content_digest(data)] = mask
+                    while len(self._probes) > PENDING_PROBES:
+                        self._probes.popitem(last=False)
+                return self.FAST_PATH_MODEL
+        except Exception as e:
+            logger.warning(f"Routage auto impossible avant l'admission: {e}")
+            return model_name
+
+    def _remove_frames(self, frames, model_name: str, output_format: str,
+                       cancellation: Cancellation) -> bytes:
+        """Détoure une séquence d'images ; seules les images clés passent par le modèle"""
+        session = self.get_session(model_name)
+
+        def predict(frame):
+            cancellation.check("avant l'inférence d'une image clé")
+            return session.predict(frame)[0]
+
+        result, stats = remove_background_frames(frames, predict, output_format)
+        self.metrics['animated_frames'] += stats['frames']
+        self.metrics['animated_keyframes'] += stats['keyframes']
+        return result
+
+    def remove_background_video(self, video_data: InputData, model_name: str = 'u2net',
+                                output_format: str = 'webp',
+                                latency_budget_ms: Optional[float] = None,
+                                cancellation: Optional[Cancellation] = None) -> Tuple[Union[bytes, memoryview], str]:
+        """
+        Supprime le background d'un clip vidéo court (MP4...)
+
+        Args:
+            video_data: Données de la vidéo (bytes, memoryview ou fichier ouvert)
+            model_name: Modèle à utiliser ('auto' pour le routage automatique)
+            output_format: Animation de sortie ('webp' ou 'apng')
+            latency_budget_ms: Budget de latence par image pour le routage 'auto'
+            cancellation: Échéance et déconnexion du client, vérifiées entre les étapes
+
+        Returns:
+            Tuple: Animation avec transparence (memoryview si lue dans le cache
+                disque) et modèle utilisé
+        """
+        cancellation = cancellation or Cancellation()
+        try:
+            self.metrics['requests'] += 1
+
+            with input_buffer(video_data) as data:
+                if not data:
+                    raise ValueError("Video data is empty")
+                self._check_size(data)
+                digest = content_digest(data)
+                return self._coalesce(
+                    digest,
+                    lambda: self._process_video(
+                        data, digest, model_name, output_format, latency_budget_ms, cancellation
+                    ),
+                    cancellation,
+                    'video', model_name, output_format, latency_budget_ms
+                )
+
+        except RequestCancelled:
+            raise
+        except ValueError as e:
+            logger.error(f"Erreur de validation: {e}")
+            raise HTTPException(status_code=400, detail=str(e))
+        except Exception as e:
+            logger.error(f"Erreur lors du traitement vidéo: {e}")
+            logger.error(f"Stack trace: {traceback.format_exc()}")
+            raise HTTPException(status_code=500, detail=f"Erreur de traitement: {str(e)}")
+        finally:
+            self._collect()
+
+    def _process_video(self, data: memoryview, digest: str, model_name: str, output_format: str,
+                       latency_budget_ms: Optional[float],
+                       cancellation: Cancellation) -> Tuple[Union[bytes, memoryview], str]:
+        """Décodage puis détourage d'une vidéo déjà validée"""
+        # Fichier temporaire supprimé même si la requête s'arrête avant la fin
+        with open_video_frames(data) as (frame_count, frames):
+            first = next(frames, None)
+            if first is None:
+                raise ValueError("Aucune image décodée dans la vidéo")
+            logger.info(f"Vidéo valide: {frame_count} images {first[0].size}")
+            cancellation.check("après décodage")
+
+            if model_name in (self.AUTO_MODEL, self.FAST_PATH_MODEL):
+                model_name = self.router.choose(first[0], latency_budget_ms)
+
+            result = self._cached_result(
+                request_key(digest, 'video', model_name, output_format),
+                lambda: self._remove_frames(
+                    itertools.chain([first], frames), model_name, output_format, cancellation
+                )
+            )
+        return result, model_name
+
+    def remove_background(self, image_data: InputData, model_name: str = 'u2net',
+                          white_background: bool = False, roi_crop: bool = False) -> bytes:
+        """Supprime le background d'une image (voir remove_background_with_model)"""
+        return self.remove_background_with_model(
+            image_data, model_name, white_background, roi_crop
+        )[0]
+
+    def remove_background_with_model(self, image_data: InputData, model_name: str = 'u2net',
+                                     white_background: bool = False, roi_crop: bool = False,
+                                     latency_budget_ms: Optional[float] = None,
+                                     animation_format: str = 'webp',
+                                     cancellation: Optional[Cancellation] = None,
+                                     trim: bool = False, padding: int = 0) -> Tuple[bytes, str]:
+        """
+        Supprime le background d'une image
+
+        Args:
+            image_data: Données de l'image : bytes, memoryview (tout objet
+                buffer) ou fichier ouvert, lus sans copie
+            model_name: Modèle à utiliser ('auto' pour le routage automatique)
+            white_background: Ajouter un fond blanc (JPEG) au lieu de transparent
+            roi_crop: Limiter l'inférence à la boîte englobante du sujet
+            latency_budget_ms: Budget de latence pour le routage 'auto'
+            animation_format: Sortie des images animées ('webp' ou 'apng'),
+                toujours transparente
+            cancellation: Échéance et déconnexion du client, vérifiées entre
+                les étapes (RequestCancelled)
+            trim: Recadrer le résultat sur la boîte englobante du sujet
+            padding: Marge (pixels) conservée autour du sujet avec trim
+
+        Returns:
+            Tuple[bytes, str]: Image processée et modèle effectivement utilisé
+        """
+        cancellation = cancellation or Cancellation()
+        result, model_name, _ = self._process(
+            image_data, model_name, roi_crop, latency_budget_ms, animation_format, cancellation
+        )
+        if not isinstance(result, Image.Image):
+            return bytes(result), model_name
+        result, _ = self._finish(result, WHITE if white_background else None, trim, padding)
+        cancellation.check("avant encodage")
+        output_buffer = io.BytesIO()
+        if white_background:
+            result.save(output_buffer, format='JPEG', quality=95)
+        else:
+            result.save(output_buffer, format='PNG')
+        logger.info(f"Background supprimé, taille résultat: {output_buffer.tell()} bytes")
+        return output_buffer.getvalue(), model_name
+
+    def remove_background_stream(self, image_data: InputData, model_name: str = 'u2net',
+                                 white_background: bool = False, roi_crop: bool = False,
+                                 latency_budget_ms: Optional[float] = None,
+                                 animation_format: str = 'webp',
+                                 cancellation: Optional[Cancellation] = None,
+                                 trim: bool = False, padding: int = 0,
+                                 mask_only: bool = False) -> Tuple[EncodedStream, str]:
+        """
+        Comme remove_background_with_model, mais l'encodage final (PNG/JPEG)
+        se fait au fil de l'envoi au lieu de produire les bytes complets
+
+        Args:
+            mask_only: Renvoyer le masque seul (PNG niveaux de gris)
+            autres: Voir remove_background_with_model
+
+        Returns:
+            Tuple[EncodedStream, str]: Flux encodé (avec la boîte du sujet dans
+                stream.bbox si trim, et l'identifiant du masque conservé dans
+                stream.mask_id) et modèle effectivement utilisé
+        """
+        cancellation = cancellation or Cancellation()
+        result, model_name, key = self._process(
+            image_data, model_name, roi_crop, latency_budget_ms, animation_format, cancellation
+        )
+        if not isinstance(result, Image.Image):
+            if mask_only:
+                raise HTTPException(status_code=400, detail="Masque seul non disponible pour les images animées")
+            return EncodedStream.from_bytes(result), model_name
+        stream = self._render(
+            result, WHITE if white_background else None, trim, padding, mask_only,
+            cancellation=cancellation
+        )
+        stream.mask_id = key
+        return stream, model_name
+
+    def remove_background_renditions(self, image_data: InputData, renditions: List[Rendition],
+                                     container: str = 'zip', model_name: str = 'u2net',
+                                     white_background: bool = False, roi_crop: bool = False,
+                                     latency_budget_ms: Optional[float] = None,
+                                     cancellation: Optional[Cancellation] = None,
+                                     trim: bool = False, padding: int = 0,
+                                     mask_only: bool = False) -> Tuple[EncodedStream, str]:
+        """
+        Plusieurs tailles du même détourage, pour une seule inférence
+
+        Args:
+            renditions: Déclinaisons (voir renditions.parse_renditions)
+            container: 'zip' ou 'multipart' (multipart/mixed)
+            autres: Voir remove_background_stream
+
+        Returns:
+            Tuple[EncodedStream, str]: Archive ou corps multipart encodé en
+                flux, et modèle effectivement utilisé
+        """
+        cancellation = cancellation or Cancellation()
+        result, model_name, key = self._process(
+            image_data, model_name, roi_crop, latency_budget_ms, 'webp', cancellation
+        )
+        if not isinstance(result, Image.Image):
+            raise HTTPException(status_code=400, detail="Déclinaisons non disponibles pour les images animées")
+        stream = self._render(
+            result, WHITE if white_background else None, trim, padding, mask_only,
+            renditions, container, cancellation
+        )
+        stream.mask_id = key
+        return stream, model_name
+
+    def composite(self, image_data: InputData, mask_data: Optional[InputData] = None,
+                  mask_id: Optional[str] = None, background: Optional[Color] = None,
+                  trim: bool = False, padding: int = 0, mask_only: bool = False,
+                  renditions: Optional[List[Rendition]] = None,
+                  container: str = 'zip') -> EncodedStream:
+        """
+        Nouveau rendu d'une image déjà détourée, sans inférence
+
+        Args:
+            image_data: Image d'origine
+            mask_data: Masque fourni par le client (niveaux de gris, ou
+                canal alpha d'un résultat détouré)
+            mask_id: Identifiant d'un masque conservé (en-tête X-Mask-Id),
+                si mask_data n'est pas fourni
+            background: Couleur de fond (JPEG), transparent (PNG) si None
+            renditions: Déclinaisons, archive ou multipart selon container
+            autres: Voir remove_background_stream
+
+        Returns:
+            EncodedStream: Résultat encodé en flux
+        """
+        try:
+            self.metrics['composites'] += 1
+            with input_buffer(image_data) as data:
+                if not data:
+                    raise ValueError("Image data is empty")
+                self._check_size(data)
+                try:
+                    image = fix_image_orientation(open_image(data))
+                    image.load()
+                except Exception as e:
+                    raise ValueError(f"Image d'entrée corrompue: {str(e)}")
+
+            if mask_data is not None:
+                mask = self._read_mask(mask_data)
+            elif mask_id:
+                mask = self.masks.get(mask_id)
+                if mask is None:
+                    raise HTTPException(status_code=404, detail=f"Masque inconnu ou expiré: {mask_id}")
+            else:
+                raise ValueError("Masque manquant : envoyer un masque ou un identifiant de masque")
+            if mask.size != image.size:
+                raise ValueError(f"Taille du masque {mask.size} différente de celle de l'image {image.size}")
+
+            return self._render(
+                naive_cutout(image, mask), background, trim, padding, mask_only,
+                renditions, container, Cancellation()
+            )
+
+        except HTTPException:
+            raise
+        except ValueError as e:
+            logger.error(f"Erreur de validation: {e}")
+            raise HTTPException(status_code=400, detail=str(e))
+        except Exception as e:
+            logger.error(f"Erreur lors de la composition: {e}")
+            logger.error(f"Stack trace: {traceback.format_exc()}")
+            raise HTTPException(status_code=500, detail=f"Erreur de traitement: {str(e)}")
+
+    def _read_mask(self, mask_data: InputData) -> Image.Image:
+        """Masque envoyé par le client : canal alpha s'il existe, sinon niveaux de gris"""
+        with input_buffer(mask_data) as data:
+            if not data:
+                raise ValueError("Mask data is empty")
+            self._check_size(data)
+            try:
+                mask = open_image(data)
+                mask.load()
+            except Exception as e:
+                raise ValueError(f"Masque corrompu: {str(e)}")
+        if 'A' in mask.getbands() or mask.mode == 'P' and 'transparency' in mask.info:
+            return mask.convert('RGBA').getchannel('A')
+        return mask.convert('L')
+
+    def _render(self, cutout: Image.Image, background: Optional[Color], trim: bool, padding: int,
+                mask_only: bool, renditions: Optional[List[Rendition]] = None,
+                container: str = 'zip', cancellation: Optional[Cancellation] = None) -> EncodedStream:
+        """
+        Post-traitement et encodage en flux, communs au détourage et à /composite
+
+        Returns:
+            EncodedStream: Image (ou déclinaisons) encodée, avec la boîte du sujet si trim
+        """
+        image, bbox = self._finish(cutout, background, trim, padding, mask_only)
+        (cancellation or Cancellation()).check("avant encodage")
+        jpeg = background is not None and not mask_only
+
+        if renditions:
+            parts = resize_pyramid(image, renditions)
+            if jpeg:
+                format, extension, media_type, params = 'JPEG', '.jpg', 'image/jpeg', {'quality': 95}
+            else:
+                format, extension, media_type, params = 'PNG', '.png', 'image/png', {}
+            if container == 'multipart':
+                boundary = new_boundary()
+                stream = EncodedStream(
+                    iter_multipart(parts, format, extension, media_type, boundary, **params),
+                    f"multipart/mixed; boundary={boundary}", "renditions"
+                )
+            else:
+                stream = EncodedStream(
+                    iter_zip(parts, format, extension, **params), "application/zip", "renditions.zip"
+                )
+        else:
+            stream = EncodedStream.from_image(image, jpeg=jpeg)
+            if mask_only:
+                stream.filename = "mask.png"
+        stream.bbox = bbox
+        return stream
+
+    def _finish(self, cutout: Image.Image, background: Optional[Color], trim: bool,
+                padding: int, mask_only: bool = False) -> Tuple[Image.Image, Optional[BBox]]:
+        """
+        Post-traitement propre à la requête, sur le détourage partagé
+
+        Returns:
+            Tuple: Image à encoder (masque seul en niveaux de gris si mask_only),
+                et boîte du sujet dans l'image d'origine si trim
+        """
+        bbox = None
+        if trim:
+            cutout, bbox = trim_to_subject(cutout, padding)
+            logger.info(f"Résultat recadré sur le sujet: {bbox}")
+        if mask_only:
+            return cutout.getchannel('A'), bbox
+        if background is not None:
+            cutout = on_color(cutout, background)
+        return cutout, bbox
+
+    def _process(self, image_data: InputData, model_name: str, roi_crop: bool,
+                 latency_budget_ms: Optional[float], animation_format: str,
+                 cancellation: Cancellation) -> Tuple[Union[Image.Image, bytes], str, Optional[str]]:
+        """
+        Détourage sans post-traitement ni encodage final
+
+        Returns:
+            Tuple: Image détourée (RGBA), ou animation déjà encodée, modèle
+                effectivement utilisé et identifiant du masque conservé
+        """
+        try:
+            self.metrics['requests'] += 1
+
+            with input_buffer(image_data) as data:
+                # Validation de l'image d'entrée
+                if not data:
+                    raise ValueError("Image data is empty")
+                self._check_size(data)
+
+                digest = content_digest(data)
+                return self._coalesce(
+                    digest,
+                    lambda: self._process_image(
+                        data, digest, model_name, roi_crop, latency_budget_ms,
+                        animation_format, cancellation
+                    ),
+                    cancellation,
+                    model_name, roi_crop, latency_budget_ms, animation_format
+                )
+
+        except RequestCancelled:
+            raise
+        except ValueError as e:
+            logger.error(f"Erreur de validation: {e}")
+            raise HTTPException(status_code=400, detail=str(e))
+        except Exception as e:
+            logger.error(f"Erreur lors du traitement: {e}")
+            # Log plus détaillé pour débugger
+            logger.error(f"Stack trace: {traceback.format_exc()}")
+            raise HTTPException(status_code=500, detail=f"Erreur de traitement: {str(e)}")
+        finally:
+            # Libération mémoire après traitement (y compris en cas d'erreur)
+            self._collect()
+
+    def _process_image(self, data: memoryview, digest: str, model_name: str, roi_crop: bool,
+                       latency_budget_ms: Optional[float], animation_format: str,
+                       cancellation: Cancellation) -> Tuple[Union[Image.Image, bytes], str, Optional[str]]:
+        """Détourage d'une image dont la taille a été validée (voir _process)"""
+        # Test de validité de l'image d'entrée
+        try:
+            test_image = open_image(data)
+            test_image.verify()  # Vérifier que l'image est valide
+            logger.info(f"Image d'entrée valide: {test_image.format} {test_image.size}")
+        except Exception as e:
+            logger.error(f"Image d'entrée invalide: {e}")
+            raise ValueError(f"Image d'entrée corrompue: {str(e)}")
+        cancellation.check("après décodage")
+
+        # Animation (GIF/WebP/APNG) : traitement image par image
+        if is_animated(open_image(data)):
+            if model_name in (self.AUTO_MODEL, self.FAST_PATH_MODEL):
+                model_name = self.router.choose(open_image(data), latency_budget_ms)
+            logger.info(f"Image animée, traitement image par image avec {model_name}")
+            result = self._cached_result(
+                request_key(digest, model_name, animation_format),
+                lambda: self._remove_frames(
+                    iter_image_frames(open_image(data)), model_name, animation_format, cancellation
+                )
+            )
+            return result, model_name, None
+
+        # Supprimer le background
+        logger.info("Début suppression background...")
+        image = fix_image_orientation(open_image(data))
+        cutout = None
+        # FAST_PATH_MODEL : 'auto' résolu par resolve_model sur un fond uni
+        if model_name in (self.AUTO_MODEL, self.FAST_PATH_MODEL):
+            cutout = self._try_fast_path(image, digest)
+            if cutout is not None:
+                model_name = self.FAST_PATH_MODEL
+            else:
+                model_name = self.router.choose(image, latency_budget_ms)
+        key = mask_id(digest, model_name, roi_crop)
+        stored = False
+        if cutout is None:
+            # Masque déjà calculé (ici, par un autre worker ou une autre instance) : pas d'inférence
+            mask = self.masks.get(key)
+            if mask is not None and mask.size == image.size:
+                logger.info("💾 Masque déjà calculé, inférence évitée")
+                cutout = naive_cutout(image, mask)
+                stored = True
+        if cutout is None:
+            session = self.get_session(model_name)
+            self._collect()
+            cancellation.check("avant inférence")
+            start_time = time.time()
+            if roi_crop:
+                cutout = self._remove_with_roi(image, session)
+            if cutout is None:
+                cutout = bg(image, session=session)
+            self.router.record(
+                model_name,
+                (time.time() - start_time) * 1000,
+                test_image.size[0] * test_image.size[1] / 1e6
+            )
+
+        # Masque conservé pour les nouveaux rendus (/composite) ; les modèles
+        # à plusieurs masques (images empilées) ne sont pas concernés
+        if cutout.size != image.size or self.cache.name == 'none':
+            return cutout, model_name, None
+        if not stored:
+            self.masks.put(key, cutout.getchannel('A'))
+        return cutout, model_name, key
@@ -0,0 +1,106 @@
+"""
+Échéances et abandon des requêtes
+
+Chaque requête reçoit une échéance (en-tête X-Deadline-Ms, sinon
+REQUEST_TIMEOUT_MS de la configuration) et un indicateur de déconnexion,
+levé par une tâche qui surveille le client pendant le traitement. Le moteur
+vérifie l'un et l'autre entre les étapes (après décodage, avant inférence,
+avant encodage) : un client parti ne coûte plus une inférence ni un encodage.
+"""
+
+import asyncio
+import logging
+import math
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Mapping, Optional
+
+logger = logging.getLogger(__name__)
+
+# Pause entre deux lectures si le serveur renvoie autre chose qu'une déconnexion
+WATCH_INTERVAL_S = 0.1
+
+
+class RequestCancelled(Exception):
+    """Traitement interrompu : le résultat ne sera pas lu"""
+
+
+class DeadlineExceeded(RequestCancelled):
+    """Échéance du client dépassée"""
+
+
+class ClientDisconnected(RequestCancelled):
+    """Le client a fermé la connexion"""
+
+
+class Cancellation:
+    """Échéance et déconnexion d'une requête, consultées par le moteur entre les étapes"""
+
+    def __init__(self, deadline: Optional[float] = None):
+        """
+        Args:
+            deadline: Instant limite (time.monotonic()), None = sans échéance
+        """
+        self.deadline = deadline
+        self.disconnected = threading.Event()
+
+    @classmethod
+    def from_headers(cls, headers: Mapping[str, str], default_timeout_ms: float = 0) -> 'Cancellation':
+        """Échéance de l'en-tête X-Deadline-Ms (temps restant), sinon délai par défaut (0 = aucun)"""
+        timeout_ms = default_timeout_ms
+        if headers.get('x-deadline-ms'):
+            try:
+                timeout_ms = float(headers['x-deadline-ms'])
+            except ValueError:
+                timeout_ms = math.nan
+            # nan ne serait jamais dépassé, inf et les valeurs négatives n'ont pas de sens
+            if not math.isfinite(timeout_ms) or timeout_ms <= 0:
+                raise ValueError("En-tête X-Deadline-Ms invalide (millisecondes attendues)")
+        elif not timeout_ms:
+            return cls()
+        return cls(time.monotonic() + timeout_ms / 1000)
+
+    def expired(self, now: Optional[float] = None) -> bool:
+        if now is None:
+            now = time.monotonic()
+        return self.deadline is not None and now >= self.deadline
+
+    def check(self, stage: str):
+        """Lève RequestCancelled si le client est parti ou l'échéance dépassée"""
+        if self.disconnected.is_set():
+            logger.info(f"🔌 Client déconnecté, arrêt {stage}")
+            raise ClientDisconnected(f"Client déconnecté, arrêt {stage}")
+        if self.expired():
+            logger.info(f"⏱️ Échéance dépassée, arrêt {stage}")
+            raise DeadlineExceeded(f"Échéance dépassée, arrêt {stage}")
+
+
+@asynccontextmanager
+async def watch_disconnect(request, cancellation: Cancellation,
+                           on_disconnect: Callable[[], None] = lambda: None) -> AsyncIterator[None]:
+    """
+    Surveille la connexion pendant le bloc
+
+    Le corps est déjà lu quand le traitement commence : le prochain message
+    du serveur ASGI est http.disconnect si le client ferme la connexion.
+
+    Args:
+        request: Requête Starlette
+        cancellation: Marquée déconnectée si le client part
+        on_disconnect: Appelé à la déconnexion (retrait de la file d'attente...)
+    """
+    async def watch():
+        while True:
+            message = await request.receive()
+            if message['type'] == 'http.disconnect':
+                cancellation.disconnected.set()
+                on_disconnect()
+                return
+            await asyncio.sleep(WATCH_INTERVAL_S)
+
+    task = asyncio.create_task(watch())
+    try:
+        yield
+    finally:
+        task.cancel()
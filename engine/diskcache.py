@@ -0,0 +1,474 @@
+"""
+Cache disque persistant des masques et résultats, partagé par les workers
+
+Le cache en mémoire disparaît à chaque redémarrage ou nouvelle instance.
+Celui-ci écrit dans des segments en ajout seul (NNNNNNNN.seg), chaque
+enregistrement étant autodécrit :
+
+    en-tête (signature, longueurs, CRC32, dernier accès, accès) | clé | valeur
+
+L'index (clé -> segment, position, longueur) est reconstruit au démarrage en
+ne lisant que les en-têtes. Les lectures passent par mmap : la valeur est
+une memoryview sur le fichier, sans copie ni appel système.
+
+Plusieurs processus (workers gunicorn) partagent le répertoire : les
+écritures se font sous verrou fcntl.flock, et un processus rattrape les
+ajouts des autres (fin des segments connus, nouveaux segments) quand une
+clé lui manque et que le compteur de génération (dans le fichier de verrou,
+incrémenté à chaque écriture) a changé depuis. Une écriture qui
+trouve le verrou pris est abandonnée : le cache n'est jamais sur le chemin
+critique.
+
+Les accès (dernier accès, nombre d'accès) sont reportés dans l'en-tête de
+chaque enregistrement, au plus une fois par ACCESS_FLUSH_S et par processus :
+l'éviction voit les accès de tous les workers et survit aux redémarrages
+(les accès de la dernière seconde d'un processus arrêté sont perdus).
+
+Au-delà de la taille maximale, un thread compacte le cache : les
+enregistrements conservés (LRU ou LFU) sont recopiés dans de nouveaux
+segments pendant que les lectures continuent sur les anciens, puis l'index
+bascule et les anciens segments sont supprimés. Une lecture en cours garde
+son mmap valide après la suppression du fichier.
+
+Sur Cloud Run, /tmp est en mémoire : pointer DISK_CACHE_DIR vers un volume
+pour que le cache survive aux redémarrages.
+
+Variables d'environnement (voir aussi cache.CACHE_BACKEND) :
+    DISK_CACHE_DIR     répertoire du cache (défaut: aucun, cache en mémoire)
+    DISK_CACHE_BYTES   taille maximale sur disque (défaut: 1 Go)
+    DISK_CACHE_POLICY  éviction lru (défaut) ou lfu
+"""
+
+import fcntl
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .cache import CacheBackend
+
+logger = logging.getLogger(__name__)
+
+DISK_CACHE_DIR = os.environ.get("DISK_CACHE_DIR", "")
+DISK_CACHE_BYTES = int(os.environ.get("DISK_CACHE_BYTES", 1024 * 1024 * 1024))
+DISK_CACHE_POLICY = os.environ.get("DISK_CACHE_POLICY", "lru")
+
+EVICTION_POLICIES = ('lru', 'lfu')
+
+# Taille à partir de laquelle un nouveau segment est commencé
+SEGMENT_BYTES = 64 * 1024 * 1024
+# Taille visée après compaction (fraction de la taille maximale)
+LOW_WATERMARK = 0.8
+# Intervalle minimal (s) entre deux reports des accès dans les en-têtes
+ACCESS_FLUSH_S = 1.0
+
+_MAGIC = b"RBC1"
+# signature, longueur de clé, longueur de valeur, CRC32 de la valeur,
+# dernier accès (epoch), nombre d'accès
+_HEADER = struct.Struct("<4sHIIdI")
+# Dernier accès et nombre d'accès, réécrits en place dans l'en-tête
+_ACCESS = struct.Struct("<dI")
+_ACCESS_OFFSET = _HEADER.size - _ACCESS.size
+# Génération du répertoire, en tête du fichier de verrou
+_GENERATION = struct.Struct("<Q")
+_SUFFIX = ".seg"
+# Segments en cours d'écriture par la compaction (ignorés par les autres processus)
+_PARTIAL = ".tmp"
+
+
+class _Entry:
+    """Position d'une valeur dans les segments, et statistiques d'accès"""
+
+    __slots__ = ('segment', 'offset', 'length', 'crc', 'atime', 'hits', 'pending')
+
+    def __init__(self, segment: int, offset: int, length: int, crc: int, atime: float, hits: int):
+        self.segment = segment
+        self.offset = offset
+        self.length = length
+        self.crc = crc
+        self.atime = atime
+        self.hits = hits
+        # Accès de ce processus pas encore reportés dans l'en-tête
+        self.pending = 0
+
+
+class DiskCache(CacheBackend):
+    """Cache clé -> octets en segments sur disque, lu par mmap"""
+
+    name = 'disk'
+
+    def __init__(self, directory: str, max_bytes: int = DISK_CACHE_BYTES,
+                 policy: str = DISK_CACHE_POLICY, segment_bytes: int = SEGMENT_BYTES):
+        """
+        Args:
+            directory: Répertoire des segments (créé au besoin)
+            max_bytes: Taille maximale des segments, au-delà la compaction évince
+            policy: Éviction 'lru' (accès le plus ancien) ou 'lfu' (moins d'accès)
+            segment_bytes: Taille à partir de laquelle un segment est fermé
+        """
+        if policy not in EVICTION_POLICIES:
+            raise ValueError(f"DISK_CACHE_POLICY invalide: {policy}. Valeurs possibles: {list(EVICTION_POLICIES)}")
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.segment_bytes = segment_bytes
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.skipped_writes = 0
+        self.evictions = 0
+        self.compactions = 0
+        self._index: Dict[str, _Entry] = {}
+        # Octets déjà indexés par segment (= taille du segment une fois rattrapé)
+        self._scanned: Dict[int, int] = {}
+        self._maps: Dict[int, mmap.mmap] = {}
+        self._lock = threading.RLock()
+        self._compacting = False
+        # Clés lues depuis le dernier report des accès
+        self._dirty = set()
+        self._flushed = time.monotonic()
+        self._compactor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="disk-cache")
+        self._lock_path = os.path.join(directory, "lock")
+        self._generation_fd = os.open(self._lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        self._seen_generation = -1
+        started = time.time()
+        self._refresh()
+        logger.info(
+            f"💾 Cache disque {directory}: {len(self._index)} entrées, "
+            f"{self.size / 1024 / 1024:.1f} Mo indexés en {(time.time() - started) * 1000:.0f}ms"
+        )
+
+    @property
+    def size(self) -> int:
+        """Taille totale des segments"""
+        return sum(self._scanned.values())
+
+    def _path(self, segment: int) -> str:
+        return os.path.join(self.directory, f"{segment:08d}{_SUFFIX}")
+
+    def _segments(self) -> List[int]:
+        return sorted(
+            int(name[:-len(_SUFFIX)]) for name in os.listdir(self.directory)
+            if name.endswith(_SUFFIX) and name[:-len(_SUFFIX)].isdigit()
+        )
+
+    @contextmanager
+    def _file_lock(self, blocking: bool = True) -> Iterator[bool]:
+        """Verrou d'écriture partagé entre processus ; False s'il est pris (non bloquant)"""
+        fd = os.open(self._lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+        finally:
+            os.close(fd)
+
+    def _generation(self) -> int:
+        """Compteur incrémenté par chaque écriture ou compaction, tous processus confondus"""
+        data = os.pread(self._generation_fd, _GENERATION.size, 0)
+        return _GENERATION.unpack(data)[0] if len(data) == _GENERATION.size else 0
+
+    def _bump_generation(self):
+        """Signale une écriture aux autres processus (verrou fichier tenu)"""
+        generation = self._generation() + 1
+        os.pwrite(self._generation_fd, _GENERATION.pack(generation), 0)
+        self._seen_generation = generation
+
+    def _refresh(self):
+        """Rattrape les segments supprimés (compaction) et les ajouts des autres processus"""
+        with self._lock:
+            self._seen_generation = self._generation()
+            segments = self._segments()
+            removed = set(self._scanned) - set(segments)
+            if removed:
+                for key in [key for key, entry in self._index.items() if entry.segment in removed]:
+                    del self._index[key]
+                for segment in removed:
+                    self._scanned.pop(segment, None)
+                    # Les lectures en cours gardent leur mmap (fichier supprimé mais encore ouvert)
+                    self._maps.pop(segment, None)
+            for segment in segments:
+                self._scan(segment)
+
+    def _scan(self, segment: int):
+        """Indexe les enregistrements d'un segment à partir de la dernière position lue"""
+        offset = self._scanned.get(segment, 0)
+        try:
+            with open(self._path(segment), "rb") as handle:
+                end = os.fstat(handle.fileno()).st_size
+                handle.seek(offset)
+                while offset + _HEADER.size <= end:
+                    magic, key_length, length, crc, atime, hits = _HEADER.unpack(handle.read(_HEADER.size))
+                    record_end = offset + _HEADER.size + key_length + length
+                    if magic != _MAGIC or record_end > end:
+                        # Écriture interrompue : la fin du segment est ignorée
+                        break
+                    key = handle.read(key_length).decode()
+                    current = self._index.get(key)
+                    entry = _Entry(segment, offset + _HEADER.size + key_length, length, crc, atime, hits)
+                    if current is not None:
+                        entry.atime = max(entry.atime, current.atime)
+                        entry.hits = max(entry.hits, current.hits)
+                    self._index[key] = entry
+                    handle.seek(length, os.SEEK_CUR)
+                    offset = record_end
+        except FileNotFoundError:
+            return
+        self._scanned[segment] = offset
+
+    def _view(self, entry: _Entry) -> memoryview:
+        """Valeur lue en place dans le segment (mmap agrandi si le segment a grandi)"""
+        end = entry.offset + entry.length
+        mapped = self._maps.get(entry.segment)
+        if mapped is None or len(mapped) < end:
+            with open(self._path(entry.segment), "rb") as handle:
+                mapped = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[entry.segment] = mapped
+        return memoryview(mapped)[entry.offset:end]
+
+    def get(self, key: str) -> Optional[memoryview]:
+        """
+        Valeur en cache, sans copie
+
+        Returns:
+            memoryview sur le segment, ou None si la clé est absente (ou corrompue)
+        """
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is None and self._generation() != self._seen_generation:
+                self._refresh()
+                entry = self._index.get(key)
+            view = None
+            if entry is not None:
+                try:
+                    view = self._view(entry)
+                except (FileNotFoundError, ValueError):
+                    # Segment compacté par un autre processus
+                    self._refresh()
+                    entry = self._index.get(key)
+                    view = self._view(entry) if entry is not None else None
+            if view is not None and zlib.crc32(view) != entry.crc:
+                logger.error(f"❌ Entrée corrompue dans le cache disque: {key}")
+                del self._index[key]
+                view = None
+            if view is None:
+                self.misses += 1
+                return None
+            entry.atime = time.time()
+            entry.hits += 1
+            entry.pending += 1
+            self._dirty.add(key)
+            self.hits += 1
+            if time.monotonic() - self._flushed >= ACCESS_FLUSH_S:
+                # Sans attendre : le report est retenté à la lecture suivante
+                with self._file_lock(blocking=False) as locked:
+                    if locked:
+                        self._sync_access(list(self._dirty))
+            return view
+
+    def _sync_access(self, keys: List[str]):
+        """
+        Fusionne les accès de l'index avec ceux des en-têtes et reporte ceux de
+        ce processus (verrou fichier et verrou du processus tenus)
+        """
+        by_segment: Dict[int, List[Tuple[str, _Entry]]] = {}
+        for key in keys:
+            entry = self._index.get(key)
+            if entry is not None:
+                by_segment.setdefault(entry.segment, []).append((key, entry))
+        for segment, items in by_segment.items():
+            try:
+                fd = os.open(self._path(segment), os.O_RDWR)
+            except FileNotFoundError:
+                continue
+            try:
+                for key, entry in items:
+                    position = entry.offset - len(key.encode()) - _HEADER.size + _ACCESS_OFFSET
+                    atime, hits = _ACCESS.unpack(os.pread(fd, _ACCESS.size, position))
+                    stored = (atime, hits)
+                    entry.atime = max(entry.atime, atime)
+                    entry.hits = max(entry.hits, hits + entry.pending)
+                    entry.pending = 0
+                    if (entry.atime, entry.hits) != stored:
+                        os.pwrite(fd, _ACCESS.pack(entry.atime, entry.hits), position)
+            finally:
+                os.close(fd)
+        self._dirty.difference_update(keys)
+        self._flushed = time.monotonic()
+
+    def put(self, key: str, value: bytes):
+        """Ajoute une valeur ; abandonnée si un autre processus écrit ou compacte"""
+        record = _HEADER.size + len(key.encode()) + len(value)
+        if record > self.max_bytes:
+            return
+        with self._file_lock(blocking=False) as locked:
+            if not locked:
+                self.skipped_writes += 1
+                return
+            with self._lock:
+                self._refresh()
+                if key in self._index:
+                    return
+                self._append(key, value, time.time(), 0)
+                self._bump_generation()
+                self.writes += 1
+                over = self.size > self.max_bytes and not self._compacting
+                if over:
+                    self._compacting = True
+        if over:
+            self._compactor.submit(self._compact)
+
+    @staticmethod
+    def _write_record(path: str, end: int, key: str, value, crc: int,
+                      atime: float, hits: int) -> Tuple[_Entry, int]:
+        """
+        Ajoute un enregistrement à un fichier de segment
+
+        Returns:
+            Tuple: Entrée (segment à renseigner), et nouvelle fin du fichier
+        """
+        encoded_key = key.encode()
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        try:
+            os.write(fd, _HEADER.pack(_MAGIC, len(encoded_key), len(value), crc, atime, hits) + encoded_key)
+            os.write(fd, value)
+        finally:
+            os.close(fd)
+        offset = end + _HEADER.size + len(encoded_key)
+        return _Entry(0, offset, len(value), crc, atime, hits), offset + len(value)
+
+    def _append(self, key: str, value, atime: float, hits: int):
+        """Écrit un enregistrement à la fin du dernier segment (verrou fichier tenu, index à jour)"""
+        segments = sorted(self._scanned)
+        segment = segments[-1] if segments else 1
+        end = self._scanned.get(segment, 0)
+        if end >= self.segment_bytes or self._size_on_disk(segment) != end:
+            # Segment plein, ou fin interrompue qui masquerait les enregistrements suivants
+            segment += 1
+            end = 0
+        entry, self._scanned[segment] = self._write_record(
+            self._path(segment), end, key, value, zlib.crc32(value), atime, hits
+        )
+        entry.segment = segment
+        self._index[key] = entry
+
+    def _size_on_disk(self, segment: int) -> int:
+        try:
+            return os.path.getsize(self._path(segment))
+        except FileNotFoundError:
+            return 0
+
+    def _ranked(self) -> List[Tuple[str, _Entry]]:
+        """Entrées de la plus à la moins utile selon la politique d'éviction"""
+        if self.policy == 'lfu':
+            rank = lambda item: (item[1].hits, item[1].atime)
+        else:
+            rank = lambda item: item[1].atime
+        return sorted(self._index.items(), key=rank, reverse=True)
+
+    def _compact(self):
+        """
+        Recopie les entrées conservées dans de nouveaux segments et supprime les anciens
+
+        Le verrou fichier (tenu tout du long) écarte les écritures ; le verrou
+        du processus n'est pris que pour choisir les entrées puis basculer
+        l'index : les lectures continuent sur les anciens segments pendant la copie.
+        """
+        try:
+            with self._file_lock():
+                with self._lock:
+                    self._refresh()
+                    if self.size <= self.max_bytes:
+                        return
+                    started = time.time()
+                    # Éviction selon les accès de tous les processus
+                    self._sync_access(list(self._index))
+                    old_segments = sorted(self._scanned)
+                    budget = self.max_bytes * LOW_WATERMARK
+                    kept, total = [], 0
+                    for key, entry in self._ranked():
+                        record = _HEADER.size + len(key.encode()) + entry.length
+                        if total + record > budget:
+                            continue
+                        kept.append((key, entry, self._view(entry)))
+                        total += record
+                    evicted = len(self._index) - len(kept)
+
+                # Restes d'une compaction interrompue
+                for name in os.listdir(self.directory):
+                    if name.endswith(_SUFFIX + _PARTIAL):
+                        os.remove(os.path.join(self.directory, name))
+
+                # Copie hors verrou, dans des segments au-delà des anciens
+                # (numérotation croissante : jamais réutilisée par un autre processus)
+                segment, end = old_segments[-1] + 1, 0
+                entries, written = {}, {segment: 0}
+                for key, entry, view in kept:
+                    if end >= self.segment_bytes:
+                        segment, end = segment + 1, 0
+                    entries[key], end = self._write_record(
+                        self._path(segment) + _PARTIAL, end, key, view, entry.crc, entry.atime, entry.hits
+                    )
+                    entries[key].segment = segment
+                    written[segment] = end
+                for segment in written:
+                    open(self._path(segment) + _PARTIAL, "ab").close()
+
+                with self._lock:
+                    for segment in written:
+                        os.replace(self._path(segment) + _PARTIAL, self._path(segment))
+                    for key, entry in entries.items():
+                        # Accès enregistrés pendant la copie
+                        current = self._index.get(key)
+                        if current is not None:
+                            entry.atime = max(entry.atime, current.atime)
+                            entry.hits = max(entry.hits, current.hits)
+                            entry.pending = current.pending
+                    self._index = entries
+                    self._scanned = written
+                    for segment in old_segments:
+                        self._maps.pop(segment, None)
+                        os.remove(self._path(segment))
+                    self._bump_generation()
+
+                self.evictions += evicted
+                self.compactions += 1
+                logger.info(
+                    f"🧹 Cache disque compacté en {(time.time() - started) * 1000:.0f}ms: "
+                    f"{len(kept)} entrées conservées, {evicted} évincées ({self.policy})"
+                )
+        except Exception as e:
+            logger.error(f"❌ Erreur de compaction du cache disque: {e}")
+        finally:
+            self._compacting = False
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'backend': self.name,
+                'entries': len(self._index),
+                'bytes': self.size,
+                'max_bytes': self.max_bytes,
+                'segments': len(self._scanned),
+                'policy': self.policy,
+                'hits': self.hits,
+                'misses': self.misses,
+                'writes': self.writes,
+                'skipped_writes': self.skipped_writes,
+                'evictions': self.evictions,
+                'compactions': self.compactions,
+            }
+
@@ -0,0 +1,85 @@
+"""
+Segmentation classique pour les fonds unis (blanc studio, fond vert...)
+
+Utilisée en premier avec model=auto : si le score de confiance est suffisant,
+le masque est renvoyé sans passer par la session onnxruntime.
+"""
+
+import logging
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from .roi import estimate_background_color
+
+logger = logging.getLogger(__name__)
+
+# Côté maximal de l'image sur laquelle le masque est calculé
+ANALYSIS_SIZE = 1024
+# Distance couleur minimale (0-255) entre le sujet et le fond
+MIN_COLOR_DISTANCE = 30.0
+# Écart-type de bordure au-delà duquel le fond n'est plus considéré comme uni
+MAX_BORDER_SPREAD = 12.0
+# Part de l'image que le sujet doit occuper pour être plausible
+MIN_FOREGROUND = 0.01
+MAX_FOREGROUND = 0.9
+# Score minimal pour accepter le masque classique
+CONFIDENCE_THRESHOLD = 0.8
+
+
+# Élément structurant des opérations morphologiques
+_KERNEL = np.ones((3, 3), np.uint8)
+
+
+def clean_mask(mask: np.ndarray) -> np.ndarray:
+    """Ouverture puis fermeture morphologique (3x3) pour retirer bruit et trous"""
+    binary = mask.astype(np.uint8)
+    # Bord par défaut d'OpenCV : sans effet sur l'érosion comme sur la dilatation
+    opened = cv2.morphologyEx(binary, cv2.MORPH_OPEN, _KERNEL)
+    return cv2.morphologyEx(opened, cv2.MORPH_CLOSE, _KERNEL).astype(bool)
+
+
+def segment_uniform_background(image: Image.Image) -> Tuple[Optional[Image.Image], float]:
+    """
+    Détoure une image à fond uni par seuillage de distance couleur
+
+    Args:
+        image: Image source (orientation déjà corrigée)
+
+    Returns:
+        Tuple (masque "L" pleine taille ou None, score de confiance 0-1)
+    """
+    small = image.convert("RGB")
+    small.thumbnail((ANALYSIS_SIZE, ANALYSIS_SIZE), Image.BILINEAR)
+    pixels = np.asarray(small, dtype=np.float32)
+
+    bg_color, spread = estimate_background_color(pixels)
+    uniformity = 1.0 - min(1.0, spread / MAX_BORDER_SPREAD)
+    if uniformity <= 0.0:
+        return None, 0.0
+
+    threshold = max(MIN_COLOR_DISTANCE, 3.0 * spread)
+    foreground = clean_mask(np.linalg.norm(pixels - bg_color, axis=2) > threshold)
+
+    coverage = float(foreground.mean())
+    if not MIN_FOREGROUND <= coverage <= MAX_FOREGROUND:
+        return None, 0.0
+
+    # Un sujet net forme une composante dominante ; des miettes éparses
+    # signalent un fond texturé ou un sujet proche de la couleur du fond
+    count, _, stats, _ = cv2.connectedComponentsWithStats(foreground.astype(np.uint8), connectivity=8)
+    areas = stats[1:, cv2.CC_STAT_AREA]
+    dominance = float(areas.max()) / float(areas.sum()) if count > 1 else 0.0
+
+    confidence = uniformity * dominance
+    logger.info(
+        f"Fast path: uniformité={uniformity:.2f}, dominance={dominance:.2f}, "
+        f"composantes={count - 1}, confiance={confidence:.2f}"
+    )
+
+    mask = Image.fromarray(foreground.astype(np.uint8) * 255, mode="L")
+    if mask.size != image.size:
+        mask = mask.resize(image.size, Image.BILINEAR)
+    return mask, confidence
@@ -0,0 +1,24 @@
+"""
+Type MIME et extension d'un résultat, d'après sa signature
+"""
+
+from typing import Tuple
+
+
+def media_type(result_data: bytes, jpeg: bool = False) -> Tuple[str, str]:
+    """
+    Args:
+        result_data: Image produite par le moteur (bytes, ou memoryview sur le cache disque)
+        jpeg: Sortie JPEG demandée (fond blanc ou format=jpeg)
+
+    Returns:
+        Tuple (type MIME, nom de fichier)
+    """
+    head = bytes(result_data[:64])
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return "image/webp", "result.webp"
+    if b'acTL' in head:
+        return "image/apng", "result.png"
+    if jpeg or head[:3] == b'\xff\xd8\xff':
+        return "image/jpeg", "result.jpg"
+    return "image/png", "result.png"
@@ -0,0 +1,62 @@
+"""
+Protocole binaire du transport WebSocket (/ws/remove-background)
+
+Pour le trafic interne à fort débit, le multipart (python-multipart) et le
+base64 dans du JSON coûtent du CPU à chaque image. Sur une connexion
+WebSocket, chaque message est une trame binaire :
+
+    longueur de l'en-tête (4 octets, big-endian) | en-tête JSON | données brutes
+
+Requête : en-tête {"id": 1, "model": "u2net", "white_bg": false, ...} (mêmes
+options que /remove-background-base64, plus "deadline_ms" et "content_type"
+pour les vidéos), données = image.
+Réponse : en-tête {"id": 1, "status": 200, "model_used": ..., "content_type": ...}
+(ou {"id": 1, "status": 4xx/5xx, "error": ...} sans données), données = résultat.
+
+Une connexion porte autant de requêtes que voulu : un seul échange en
+mode unaire, ou un flux dans les deux sens où les réponses arrivent dans
+l'ordre de fin de traitement (associées par "id"). Contrôle de flux : le
+serveur ne lit pas de nouvelle requête tant que WS_MAX_IN_FLIGHT sont en
+cours sur la connexion ; TCP ralentit alors l'émetteur.
+
+Variables d'environnement :
+    WS_MAX_IN_FLIGHT  requêtes traitées en même temps par connexion (défaut: 4)
+"""
+
+import json
+import os
+import struct
+from typing import Tuple
+
+WS_MAX_IN_FLIGHT = int(os.environ.get("WS_MAX_IN_FLIGHT", 4))
+
+_LENGTH = struct.Struct("!I")
+
+
+def pack_frame(header: dict, payload: bytes = b"") -> bytes:
+    """Trame binaire : longueur de l'en-tête, en-tête JSON, données"""
+    encoded = json.dumps(header).encode()
+    return b"".join((_LENGTH.pack(len(encoded)), encoded, payload))
+
+
+def unpack_frame(frame: bytes) -> Tuple[dict, memoryview]:
+    """
+    Lit une trame binaire
+
+    Returns:
+        Tuple: En-tête, et données (vue sur la trame, sans copie)
+    """
+    view = memoryview(frame)
+    if len(view) < _LENGTH.size:
+        raise ValueError("Trame trop courte")
+    (length,) = _LENGTH.unpack_from(view)
+    end = _LENGTH.size + length
+    if end > len(view):
+        raise ValueError("Longueur d'en-tête invalide")
+    try:
+        header = json.loads(bytes(view[_LENGTH.size:end]))
+    except ValueError:
+        raise ValueError("En-tête JSON invalide")
+    if not isinstance(header, dict):
+        raise ValueError("L'en-tête doit être un objet JSON")
+    return header, view[end:]
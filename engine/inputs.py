@@ -0,0 +1,92 @@
+"""
+Entrées sans copie : les données reçues sont lues en place par le décodeur
+
+Les fichiers envoyés par multipart arrivent dans un SpooledTemporaryFile
+(en mémoire jusqu'à 1 Mo, sur disque au-delà). Au lieu de `await read()`
+puis de nouvelles copies dans des BytesIO, le moteur travaille sur une
+memoryview : tampon du BytesIO interne, ou mmap du fichier temporaire.
+"""
+
+import io
+import mmap
+from contextlib import contextmanager
+from typing import BinaryIO, Iterator, Union
+
+from PIL import Image
+
+# bytes, bytearray, memoryview, mmap... ou fichier binaire ouvert
+InputData = Union[bytes, bytearray, memoryview, BinaryIO]
+
+
+class BufferReader(io.RawIOBase):
+    """Fichier en lecture seule sur une memoryview (io.BytesIO copierait les données)"""
+
+    def __init__(self, view: memoryview):
+        self.view = view
+        self.position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        size = min(len(buffer), len(self.view) - self.position)
+        if size <= 0:
+            return 0
+        buffer[:size] = self.view[self.position:self.position + size]
+        self.position += size
+        return size
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += len(self.view)
+        self.position = max(0, offset)
+        return self.position
+
+    def tell(self) -> int:
+        return self.position
+
+
+def _file_view(handle: BinaryIO) -> memoryview:
+    """Tampon d'un fichier ouvert : BytesIO (spooled en mémoire) ou mmap (sur disque)"""
+    inner = getattr(handle, "_file", handle)  # SpooledTemporaryFile
+    if isinstance(inner, io.BytesIO):
+        return inner.getbuffer()
+    try:
+        fileno = inner.fileno()
+    except (AttributeError, io.UnsupportedOperation):
+        handle.seek(0)
+        return memoryview(handle.read())
+    inner.flush()
+    if inner.seek(0, io.SEEK_END) == 0:
+        return memoryview(b'')
+    return memoryview(mmap.mmap(fileno, 0, access=mmap.ACCESS_READ))
+
+
+@contextmanager
+def input_buffer(data: InputData) -> Iterator[memoryview]:
+    """
+    Vue en octets des données d'entrée, libérée à la sortie du bloc
+
+    Le tampon d'un SpooledTemporaryFile en mémoire est verrouillé tant
+    qu'une vue existe : la libérer permet à Starlette de fermer le fichier.
+    """
+    if isinstance(data, (bytes, bytearray, memoryview, mmap.mmap)):
+        base = memoryview(data)
+    else:
+        base = _file_view(data)
+    view = base if base.format == 'B' and base.ndim == 1 else base.cast('B')
+    try:
+        yield view
+    finally:
+        view.release()
+        base.release()
+
+
+def open_image(view: memoryview) -> Image.Image:
+    """Image.open directement sur le tampon"""
+    return Image.open(BufferReader(view))
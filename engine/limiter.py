@@ -0,0 +1,128 @@
+"""
+Limite de concurrence adaptative, pilotée par la latence observée
+
+Le bon nombre d'inférences simultanées dépend des images et des modèles :
+trop bas, le CPU reste inoccupé ; trop haut, les inférences se partagent le
+CPU et toutes ralentissent. Sur le principe du limiteur Gradient2 de Netflix
+(concurrency-limits), la limite suit le rapport entre la latence de
+référence et la latence récente :
+
+    gradient = clamp(1.5 * latence de référence / latence récente, 0.5, 1)
+    limite   = limite + sqrt(limite)    si gradient = 1 et le worker est saturé
+               limite * gradient        sinon
+
+Tant que la latence reste proche de son niveau de référence, la limite
+augmente de sqrt(limite) ; dès qu'elle se dégrade, elle baisse
+proportionnellement. Les modèles n'ayant pas le même coût, chaque mesure est rapportée à la
+référence de son modèle : sa latence minimale observée, qui remonte
+lentement pour suivre les changements durables (taille des images...).
+
+Variables d'environnement :
+    CONCURRENCY_LIMIT          adaptive (défaut) ou fixed (MAX_CONCURRENT_INFERENCES créneaux)
+    MIN_CONCURRENT_INFERENCES  limite minimale (défaut: 1)
+"""
+
+import math
+import os
+import threading
+from typing import Dict, Optional
+
+CONCURRENCY_LIMIT = os.environ.get("CONCURRENCY_LIMIT", "adaptive")
+MIN_CONCURRENT_INFERENCES = int(os.environ.get("MIN_CONCURRENT_INFERENCES", 1))
+
+# Poids d'une mesure dans la latence récente
+SHORT_ALPHA = 0.2
+# Remontée de la référence vers les mesures plus lentes qu'elle
+BASELINE_DRIFT = 0.005
+# Lissage des changements de limite
+SMOOTHING = 0.2
+# Baisse maximale par mesure (gradient minimal)
+MIN_GRADIENT = 0.5
+# Tolérance avant de considérer la latence dégradée
+TOLERANCE = 1.5
+
+
+class GradientLimiter:
+    """Limite adaptative du nombre d'inférences simultanées"""
+
+    def __init__(self, initial: int, min_limit: int = MIN_CONCURRENT_INFERENCES,
+                 max_limit: Optional[int] = None):
+        """
+        Args:
+            initial: Limite de départ
+            min_limit: Limite minimale
+            max_limit: Limite maximale (défaut: 4 fois la limite de départ)
+        """
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max_limit or 4 * initial
+        self.estimate = float(min(max(initial, self.min_limit), self.max_limit))
+        # Latence récente, relative à la référence du modèle (1.0 = nominale)
+        self.short_ratio = 1.0
+        # Latence de référence (ms) par modèle
+        self.baseline: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def limit(self) -> int:
+        return int(self.estimate)
+
+    def update(self, model: str, latency_ms: float, in_flight: int, queued: int) -> int:
+        """
+        Prend en compte une inférence terminée
+
+        Args:
+            model: Modèle utilisé (référence de latence)
+            latency_ms: Durée de l'inférence
+            in_flight: Inférences en cours à la fin de celle-ci (elle comprise)
+            queued: Requêtes en attente
+
+        Returns:
+            int: Nouvelle limite
+        """
+        with self._lock:
+            baseline = self.baseline.get(model)
+            if baseline is None or latency_ms < baseline:
+                baseline = latency_ms
+            else:
+                baseline += BASELINE_DRIFT * (latency_ms - baseline)
+            self.baseline[model] = baseline
+
+            ratio = latency_ms / max(baseline, 1e-3)
+            self.short_ratio = (1 - SHORT_ALPHA) * self.short_ratio + SHORT_ALPHA * ratio
+
+            gradient = max(MIN_GRADIENT, min(1.0, TOLERANCE / self.short_ratio))
+            if gradient < 1.0:
+                target = self.estimate * gradient
+            elif queued or in_flight * 2 >= self.estimate:
+                target = self.estimate + math.sqrt(self.estimate)
+            else:
+                # Ni file ni saturation : rien n'indique qu'il faille plus de créneaux
+                target = self.estimate
+            estimate = (1 - SMOOTHING) * self.estimate + SMOOTHING * target
+            self.estimate = min(max(estimate, self.min_limit), self.max_limit)
+            return self.limit
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'mode': 'adaptive',
+                'limit': self.limit,
+                'min_limit': self.min_limit,
+                'max_limit': self.max_limit,
+                'latency_ratio': round(self.short_ratio, 2),
+            }
+
+
+def limiter_from_env() -> Optional[GradientLimiter]:
+    """
+    Limiteur adaptatif selon CONCURRENCY_LIMIT, None en limite fixe
+
+    En mode adaptatif, la limite part du nombre de CPU et
+    MAX_CONCURRENT_INFERENCES, s'il est défini, en est le plafond.
+    """
+    if CONCURRENCY_LIMIT == 'fixed':
+        return None
+    if CONCURRENCY_LIMIT != 'adaptive':
+        raise ValueError(f"CONCURRENCY_LIMIT invalide: {CONCURRENCY_LIMIT}. Valeurs possibles: adaptive, fixed")
+    ceiling = os.environ.get("MAX_CONCURRENT_INFERENCES")
+    return GradientLimiter(os.cpu_count() or 1, max_limit=int(ceiling) if ceiling else None)
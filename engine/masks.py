@@ -0,0 +1,103 @@
+"""
+Masques déjà calculés, pour recomposer un résultat sans nouvelle inférence
+
+Après chaque détourage, le masque (niveaux de gris, taille de l'image) est
+conservé sous un identifiant renvoyé au client (en-tête X-Mask-Id) :
+empreinte SHA-256 de l'image envoyée et modèle utilisé. /composite
+l'applique ensuite à l'image pour un autre fond, une autre taille ou un
+autre format, en quelques millisecondes.
+
+Les masques sont gardés compressés en PNG (quelques dizaines de Ko) dans le
+cache configuré (voir cache.CACHE_BACKEND) : mémoire du processus, disque
+partagé par les workers ou Redis partagé par les instances. La compression
+se fait dans un thread dédié, hors du chemin de la requête.
+"""
+
+import io
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from PIL import Image
+
+from .cache import CacheBackend
+
+logger = logging.getLogger(__name__)
+
+
+def mask_id(digest: str, model_name: str, roi_crop: bool = False) -> str:
+    """Identifiant d'un masque : empreinte du contenu et modèle (le recadrage ROI change le masque)"""
+    return f"{digest}-{model_name}" + ("-roi" if roi_crop else "")
+
+
+def encode_mask(mask: Image.Image) -> bytes:
+    """PNG niveaux de gris, compression rapide (les masques se compressent très bien)"""
+    output = io.BytesIO()
+    mask.save(output, format='PNG', compress_level=1)
+    return output.getvalue()
+
+
+def _cache_key(key: str) -> str:
+    return f"mask:{key}"
+
+
+class MaskStore:
+    """Masques calculés, indexés par identifiant de masque"""
+
+    def __init__(self, cache: CacheBackend):
+        self.cache = cache
+        self.hits = 0
+        self.misses = 0
+        # Masques en cours de compression, déjà lisibles
+        self._pending: Dict[str, Image.Image] = {}
+        self._lock = threading.Lock()
+        self._encoder = ThreadPoolExecutor(max_workers=1, thread_name_prefix="mask-store")
+
+    def put(self, key: str, mask: Image.Image):
+        """Conserve un masque (mode L) ; la compression est faite en arrière-plan"""
+        if self.cache.name == 'none':
+            return
+        with self._lock:
+            if key in self._pending:
+                return
+            self._pending[key] = mask
+        self._encoder.submit(self._store, key, mask)
+
+    def _store(self, key: str, mask: Image.Image):
+        try:
+            self.cache.put(_cache_key(key), encode_mask(mask))
+        except Exception as e:
+            logger.error(f"Erreur de compression du masque {key}: {e}")
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+    def get(self, key: str) -> Optional[Image.Image]:
+        """Masque (mode L), ou None s'il n'est pas (ou plus) conservé"""
+        with self._lock:
+            mask = self._pending.get(key)
+        data = None
+        if mask is None:
+            data = self.cache.get(_cache_key(key))
+        with self._lock:
+            if mask is None and data is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        if mask is not None:
+            return mask
+        return Image.open(io.BytesIO(data))
+
+    def prefetch(self, keys: List[str]) -> int:
+        """
+        Charge plusieurs masques en une requête (lots) dans le premier niveau devant Redis
+
+        Returns:
+            int: Nombre de masques trouvés
+        """
+        return len(self.cache.get_many([_cache_key(key) for key in keys]))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'pending': len(self._pending), 'hits': self.hits, 'misses': self.misses}
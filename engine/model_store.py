@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Stockage local des modèles : manifeste d'empreintes, vérification et mode hors ligne
+
+Les poids sont lus depuis MODEL_STORE_DIR (par défaut le répertoire de rembg,
+~/.u2net, pour réutiliser les modèles pré-chargés par le Dockerfile) et leur
+empreinte est contrôlée contre model_manifest.json. Avec MODEL_OFFLINE=1,
+un modèle absent ou corrompu fait échouer le démarrage au lieu de déclencher
+un téléchargement.
+
+Variables d'environnement :
+    MODEL_STORE_DIR  répertoire des fichiers .onnx
+    MODEL_MANIFEST   chemin du manifeste (défaut: model_manifest.json à côté de ce fichier)
+    MODEL_OFFLINE    1/true : aucun accès réseau, échec immédiat si un modèle manque
+
+Usage :
+    python -m engine.model_store fetch u2net silueta
+    python -m engine.model_store verify u2net
+"""
+
+import hashlib
+import json
+import logging
+import mmap
+import os
+import sys
+import threading
+from typing import Dict, List, Optional
+
+from rembg.sessions.base import BaseSession
+
+logger = logging.getLogger(__name__)
+
+MODEL_STORE_DIR = os.path.expanduser(os.environ.get("MODEL_STORE_DIR") or BaseSession.u2net_home())
+MODEL_MANIFEST = os.environ.get(
+    "MODEL_MANIFEST", os.path.join(os.path.dirname(os.path.abspath(__file__)), "model_manifest.json")
+)
+MODEL_OFFLINE = os.environ.get("MODEL_OFFLINE", "").lower() in ("1", "true", "yes")
+
+
+class ModelStoreError(Exception):
+    """Modèle absent, corrompu ou non téléchargeable"""
+
+
+def file_digest(path: str, algorithm: str) -> str:
+    """Empreinte d'un fichier lu via mmap, sans copie intermédiaire"""
+    digest = hashlib.new(algorithm)
+    with open(path, "rb") as handle:
+        if os.fstat(handle.fileno()).st_size == 0:
+            return digest.hexdigest()
+        with mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            digest.update(mapped)
+    return digest.hexdigest()
+
+
+class ModelStore:
+    """Répertoire de modèles vérifiés contre le manifeste"""
+
+    def __init__(self, directory: str = MODEL_STORE_DIR, manifest_path: str = MODEL_MANIFEST,
+                 offline: bool = MODEL_OFFLINE):
+        self.directory = directory
+        self.offline = offline
+        with open(manifest_path) as handle:
+            self.manifest: Dict[str, dict] = json.load(handle)
+        self._verified = set()
+        self._lock = threading.Lock()
+
+    def path(self, model_name: str) -> str:
+        return os.path.join(self.directory, self.manifest[model_name]["file"])
+
+    def verify(self, model_name: str) -> str:
+        """
+        Contrôle présence et empreinte d'un modèle du manifeste
+
+        Returns:
+            str: Chemin du fichier vérifié
+        """
+        path = self.path(model_name)
+        if model_name in self._verified:
+            return path
+
+        if not os.path.exists(path):
+            raise ModelStoreError(f"Modèle {model_name} absent: {path}")
+
+        algorithm, expected = self.manifest[model_name]["hash"].split(":", 1)
+        actual = file_digest(path, algorithm)
+        if actual != expected:
+            raise ModelStoreError(
+                f"Empreinte invalide pour {model_name}: {algorithm}:{actual} (attendu {expected})"
+            )
+
+        with self._lock:
+            self._verified.add(model_name)
+        logger.info(f"✅ Modèle {model_name} vérifié ({path})")
+        return path
+
+    def fetch(self, model_name: str) -> str:
+        """Télécharge un modèle du manifeste dans le répertoire du store"""
+        if self.offline:
+            raise ModelStoreError(f"Modèle {model_name} absent et mode hors ligne actif")
+
+        import pooch
+
+        entry = self.manifest[model_name]
+        logger.info(f"Téléchargement de {model_name} depuis {entry['url']}")
+        pooch.retrieve(
+            entry["url"], entry["hash"], fname=entry["file"],
+            path=self.directory, progressbar=False
+        )
+        return self.verify(model_name)
+
+    def ensure(self, model_name: str) -> Optional[str]:
+        """
+        Chemin vérifié d'un modèle, téléchargé au besoin (sauf hors ligne)
+
+        Returns:
+            str: Chemin du fichier, ou None pour un modèle hors manifeste
+                (rembg s'en charge alors, uniquement en ligne)
+        """
+        if model_name not in self.manifest:
+            if self.offline:
+                raise ModelStoreError(f"Modèle {model_name} absent du manifeste (mode hors ligne)")
+            return None
+
+        try:
+            return self.verify(model_name)
+        except ModelStoreError as e:
+            if self.offline:
+                raise
+            # En ligne, un fichier absent ou corrompu est re-téléchargé (comme pooch)
+            logger.warning(f"{e} - nouveau téléchargement")
+            return self.fetch(model_name)
+
+    def verify_all(self, models: List[str]):
+        """Vérifie une liste de modèles, en échouant sur le premier problème"""
+        for model_name in models:
+            self.ensure(model_name)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    if len(sys.argv) < 3 or sys.argv[1] not in ("fetch", "verify"):
+        print(__doc__)
+        sys.exit(1)
+
+    store = ModelStore(offline=MODEL_OFFLINE or sys.argv[1] == "verify")
+    try:
+        store.verify_all(sys.argv[2:])
+    except ModelStoreError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    print(f"✅ Modèles prêts dans {store.directory}: {', '.join(sys.argv[2:])}")
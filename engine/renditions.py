@@ -0,0 +1,147 @@
+"""
+Déclinaisons d'un même détourage en plusieurs tailles (vignette, liste, zoom...)
+
+Le masque n'est calculé qu'une fois. Les tailles sont produites en pyramide :
+chaque déclinaison est réduite à partir de la précédente, plus grande, et non
+de l'image complète. Pillow rééchantillonne les images RGBA en alpha
+prémultiplié : les bords du sujet ne bavent pas sur la transparence.
+
+Les déclinaisons sont encodées au fil de l'envoi, dans une archive zip ou
+une réponse multipart/mixed.
+"""
+
+import io
+import re
+import uuid
+import zipfile
+from typing import Iterator, List, Tuple
+
+from PIL import Image
+
+# Nombre maximal de déclinaisons par requête
+MAX_RENDITIONS = 8
+# Côté maximal d'une déclinaison
+MAX_RENDITION_SIDE = 8192
+
+RENDITION_CONTAINERS = ('zip', 'multipart')
+
+_SPEC = re.compile(r"^(?:([\w-]+):)?(\d+)(?:x(\d+))?$")
+
+# (nom, largeur maximale, hauteur maximale)
+Rendition = Tuple[str, int, int]
+
+
+def parse_renditions(spec: str) -> List[Rendition]:
+    """
+    Lit une liste de déclinaisons : "thumb:150,listing:600x400,zoom:1600"
+
+    Une taille seule (N) est une boîte NxN ; sans nom, la déclinaison
+    s'appelle comme sa taille. L'image garde ses proportions et n'est
+    jamais agrandie.
+    """
+    renditions = []
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        match = _SPEC.match(item)
+        if match is None:
+            raise ValueError(f"Déclinaison invalide: '{item}' (attendu nom:taille ou nom:LxH)")
+        name, width, height = match.groups()
+        width = int(width)
+        height = int(height) if height else width
+        if not 0 < width <= MAX_RENDITION_SIDE or not 0 < height <= MAX_RENDITION_SIDE:
+            raise ValueError(f"Taille de déclinaison hors limites: '{item}' (1 à {MAX_RENDITION_SIDE})")
+        renditions.append((name or item, width, height))
+
+    if not renditions:
+        raise ValueError("Aucune déclinaison demandée")
+    if len(renditions) > MAX_RENDITIONS:
+        raise ValueError(f"Trop de déclinaisons ({len(renditions)}). Maximum: {MAX_RENDITIONS}")
+    names = [name for name, _, _ in renditions]
+    if len(set(names)) != len(names):
+        raise ValueError("Noms de déclinaisons en double")
+    return renditions
+
+
+def _fit(size: Tuple[int, int], width: int, height: int) -> Tuple[int, int]:
+    """Taille dans la boîte, proportions conservées, sans agrandissement"""
+    scale = min(1.0, width / size[0], height / size[1])
+    return max(1, round(size[0] * scale)), max(1, round(size[1] * scale))
+
+
+def resize_pyramid(image: Image.Image, renditions: List[Rendition]) -> List[Tuple[str, Image.Image]]:
+    """
+    Déclinaisons de l'image, chacune réduite depuis la précédente plus grande
+
+    Returns:
+        Liste de (nom, image) dans l'ordre demandé
+    """
+    targets = sorted(
+        ((name, _fit(image.size, width, height)) for name, width, height in renditions),
+        key=lambda target: target[1][0] * target[1][1],
+        reverse=True
+    )
+    resized = {}
+    source = image
+    for name, size in targets:
+        if size != source.size:
+            source = source.resize(size, Image.LANCZOS)
+        resized[name] = source
+    return [(name, resized[name]) for name, _, _ in renditions]
+
+
+class _Drain(io.RawIOBase):
+    """Tampon en écriture seule, non positionnable, vidé après chaque déclinaison"""
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.buffer += data
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+
+def iter_zip(parts: List[Tuple[str, Image.Image]], format: str, extension: str,
+             **params) -> Iterator[bytes]:
+    """
+    Archive zip des déclinaisons, produite au fil de l'encodage
+
+    Sur un flux non positionnable, zipfile écrit tailles et CRC après chaque
+    entrée : une déclinaison est envoyée dès qu'elle est encodée. Les PNG et
+    JPEG étant déjà compressés, les entrées sont stockées telles quelles.
+    """
+    output = _Drain()
+    with zipfile.ZipFile(output, "w", compression=zipfile.ZIP_STORED) as archive:
+        for name, image in parts:
+            with archive.open(f"{name}{extension}", "w") as entry:
+                image.save(entry, format, **params)
+            yield output.drain()
+    yield output.drain()
+
+
+def iter_multipart(parts: List[Tuple[str, Image.Image]], format: str, extension: str,
+                   media_type: str, boundary: str, **params) -> Iterator[bytes]:
+    """Corps multipart/mixed, une partie par déclinaison"""
+    for name, image in parts:
+        encoded = io.BytesIO()
+        image.save(encoded, format, **params)
+        yield (
+            f"--{boundary}\r\n"
+            f"Content-Type: {media_type}\r\n"
+            f"Content-Disposition: attachment; name=\"{name}\"; filename=\"{name}{extension}\"\r\n"
+            f"X-Rendition-Size: {image.size[0]}x{image.size[1]}\r\n"
+            f"Content-Length: {encoded.tell()}\r\n\r\n"
+        ).encode()
+        yield encoded.getvalue()
+        yield b"\r\n"
+    yield f"--{boundary}--\r\n".encode()
+
+
+def new_boundary() -> str:
+    return f"rendition-{uuid.uuid4().hex}"
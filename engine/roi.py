@@ -0,0 +1,104 @@
+"""
+Pré-passe "région d'intérêt" : localise le sujet à bas coût avant l'inférence
+"""
+
+import logging
+from typing import Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# Taille maximale (côté le plus long) de l'image d'analyse
+ANALYSIS_SIZE = 128
+# Distance couleur minimale (0-255) pour considérer un pixel comme sujet
+MIN_COLOR_DISTANCE = 24.0
+# Marge ajoutée autour de la boîte, en fraction de sa taille
+PADDING_RATIO = 0.1
+# Au-delà de cette couverture, le recadrage n'apporte rien
+MAX_COVERAGE = 0.7
+
+BBox = Tuple[int, int, int, int]
+
+
+def estimate_background_color(pixels: np.ndarray) -> Tuple[np.ndarray, float]:
+    """
+    Estime la couleur de fond à partir de la bordure de l'image
+
+    Args:
+        pixels: Tableau RGB (H, W, 3) en float32
+
+    Returns:
+        Tuple (couleur médiane de la bordure, écart-type des distances)
+    """
+    border = np.concatenate([
+        pixels[0, :, :],
+        pixels[-1, :, :],
+        pixels[:, 0, :],
+        pixels[:, -1, :],
+    ])
+    color = np.median(border, axis=0)
+    spread = float(np.linalg.norm(border - color, axis=1).std())
+    return color, spread
+
+
+def find_subject_bbox(image: Image.Image, analysis_size: int = ANALYSIS_SIZE,
+                      padding: float = PADDING_RATIO) -> Optional[BBox]:
+    """
+    Trouve la boîte englobante du sujet via la distance à la couleur de fond
+
+    Args:
+        image: Image source (toute taille)
+        analysis_size: Côté maximal de l'image réduite utilisée pour l'analyse
+        padding: Marge relative ajoutée autour de la boîte
+
+    Returns:
+        (left, top, right, bottom) en coordonnées pleine taille, ou None si
+        le recadrage n'est pas pertinent (fond non uniforme, sujet trop grand)
+    """
+    width, height = image.size
+    if width < 2 or height < 2:
+        return None
+
+    small = image.convert("RGB")
+    small.thumbnail((analysis_size, analysis_size), Image.BILINEAR)
+    pixels = np.asarray(small, dtype=np.float32)
+
+    bg_color, spread = estimate_background_color(pixels)
+    threshold = max(MIN_COLOR_DISTANCE, 3.0 * spread)
+    distance = np.linalg.norm(pixels - bg_color, axis=2)
+    foreground = distance > threshold
+
+    rows = np.flatnonzero(foreground.any(axis=1))
+    cols = np.flatnonzero(foreground.any(axis=0))
+    if rows.size == 0 or cols.size == 0:
+        return None
+
+    small_h, small_w = foreground.shape
+    scale_x = width / small_w
+    scale_y = height / small_h
+
+    box_w = (cols[-1] + 1 - cols[0]) * scale_x
+    box_h = (rows[-1] + 1 - rows[0]) * scale_y
+    pad_x = box_w * padding
+    pad_y = box_h * padding
+
+    left = max(0, int(cols[0] * scale_x - pad_x))
+    top = max(0, int(rows[0] * scale_y - pad_y))
+    right = min(width, int(np.ceil((cols[-1] + 1) * scale_x + pad_x)))
+    bottom = min(height, int(np.ceil((rows[-1] + 1) * scale_y + pad_y)))
+
+    coverage = ((right - left) * (bottom - top)) / float(width * height)
+    if coverage > MAX_COVERAGE:
+        logger.info(f"ROI ignorée: couverture {coverage:.0%}")
+        return None
+
+    return left, top, right, bottom
+
+
+def paste_mask(crop_mask: Image.Image, bbox: BBox, size: Tuple[int, int]) -> Image.Image:
+    """Replace le masque calculé sur le recadrage dans un canevas pleine taille"""
+    full_mask = Image.new("L", size, 0)
+    full_mask.paste(crop_mask, bbox[:2])
+    return full_mask
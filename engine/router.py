@@ -0,0 +1,117 @@
+"""
+Routage automatique (model=auto) selon le contenu de l'image et un budget de latence
+"""
+
+import logging
+import os
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# Budget appliqué quand le client n'en fournit pas
+DEFAULT_LATENCY_BUDGET_MS = float(os.environ.get("AUTO_LATENCY_BUDGET_MS", 2000))
+
+# Coût fixe estimé par modèle (ms, 2 vCPU) avant toute mesure
+PRIOR_LATENCY_MS = {
+    'silueta': 300.0,
+    'u2net': 700.0,
+    'u2net_human_seg': 700.0,
+    'isnet-general-use': 1800.0,
+    'birefnet-general': 7000.0,
+    # Détourage classique (fond uni), coût d'admission de model=auto résolu ainsi
+    'fast-path': 50.0,
+}
+# Coût proportionnel à la taille (décodage, redimensionnement, détourage, PNG)
+PIXEL_COST_MS_PER_MP = 60.0
+
+# Candidats par ordre de qualité décroissante. u2net_cloth_seg n'est jamais
+# choisi : il renvoie trois masques empilés, pas un détourage classique.
+GENERAL_CANDIDATES = ['birefnet-general', 'isnet-general-use', 'u2net', 'silueta']
+PERSON_CANDIDATES = ['u2net_human_seg', 'isnet-general-use', 'u2net', 'silueta']
+
+# Part de pixels "peau" à partir de laquelle on suppose une personne
+SKIN_RATIO_THRESHOLD = 0.05
+# Poids des nouvelles mesures dans la moyenne mobile
+EWMA_ALPHA = 0.2
+
+
+def skin_ratio(image: Image.Image, analysis_size: int = 64) -> float:
+    """Proportion de pixels dans la plage de teintes chair (YCbCr)"""
+    small = image.convert("YCbCr")
+    small.thumbnail((analysis_size, analysis_size), Image.NEAREST)
+    ycbcr = np.asarray(small)
+    cb = ycbcr[:, :, 1]
+    cr = ycbcr[:, :, 2]
+    skin = (cr >= 133) & (cr <= 173) & (cb >= 77) & (cb <= 127)
+    return float(skin.mean())
+
+
+class ModelRouter:
+    """Choisit le meilleur modèle tenant dans le budget à partir des latences observées"""
+
+    def __init__(self, available_models: List[str]):
+        self.available_models = set(available_models)
+        self._base_latency: Dict[str, float] = {}
+        self._samples: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def record(self, model_name: str, latency_ms: float, megapixels: float):
+        """Met à jour la moyenne mobile du coût fixe d'un modèle"""
+        base = max(0.0, latency_ms - PIXEL_COST_MS_PER_MP * megapixels)
+        with self._lock:
+            previous = self._base_latency.get(model_name)
+            if previous is None:
+                self._base_latency[model_name] = base
+            else:
+                self._base_latency[model_name] = (1 - EWMA_ALPHA) * previous + EWMA_ALPHA * base
+            self._samples[model_name] = self._samples.get(model_name, 0) + 1
+
+    def estimate(self, model_name: str, megapixels: float) -> float:
+        """Latence estimée (ms) d'un modèle pour une image donnée"""
+        base = self._base_latency.get(model_name, PRIOR_LATENCY_MS.get(model_name, 1000.0))
+        return base + PIXEL_COST_MS_PER_MP * megapixels
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Latences observées par modèle, pour /metrics"""
+        with self._lock:
+            return {
+                name: {'base_ms': round(base, 1), 'samples': self._samples[name]}
+                for name, base in self._base_latency.items()
+            }
+
+    def choose(self, image: Image.Image, latency_budget_ms: Optional[float] = None) -> str:
+        """
+        Sélectionne un modèle pour une image
+
+        Args:
+            image: Image source
+            latency_budget_ms: Budget client, DEFAULT_LATENCY_BUDGET_MS sinon
+
+        Returns:
+            str: Nom du modèle retenu
+        """
+        budget = latency_budget_ms if latency_budget_ms is not None else DEFAULT_LATENCY_BUDGET_MS
+        megapixels = image.size[0] * image.size[1] / 1e6
+        person = skin_ratio(image) >= SKIN_RATIO_THRESHOLD
+
+        candidates = [
+            name for name in (PERSON_CANDIDATES if person else GENERAL_CANDIDATES)
+            if name in self.available_models
+        ]
+        if not candidates:
+            return 'u2net'
+
+        estimates = {name: self.estimate(name, megapixels) for name in candidates}
+        chosen = next(
+            (name for name in candidates if estimates[name] <= budget),
+            min(candidates, key=estimates.get)
+        )
+        logger.info(
+            f"Routage auto: {chosen} (personne={person}, {megapixels:.1f} MP, "
+            f"budget={budget:.0f} ms, estimé={estimates[chosen]:.0f} ms)"
+        )
+        return chosen
@@ -0,0 +1,310 @@
+"""
+Ordonnancement des inférences : classes de priorité, équité entre clients,
+limite de concurrence par modèle et échéances
+
+Sans ordonnancement, un lot de requêtes birefnet-general envoyé par un job
+de masse passe avant les requêtes silueta de l'interface web arrivées
+ensuite. Chaque requête attend ici un créneau d'inférence :
+
+- les clients (clé d'API, sinon adresse IP) ont chacun leur file, servies
+  par file d'attente équitable pondérée (start-time fair queuing) : le poids
+  vient de la classe de priorité, le coût d'une requête de la latence
+  estimée de son modèle ;
+- un modèle ne peut occuper plus de créneaux que sa limite (MODEL_CONCURRENCY) ;
+- une requête dont l'échéance est dépassée, ou dont le client s'est
+  déconnecté, est retirée de la file avant l'inférence (voir deadline.py) ;
+- le nombre de créneaux suit la latence observée (voir limiter.py) et les
+  requêtes au-delà de QUEUE_PER_SLOT par créneau sont refusées (503).
+
+Variables d'environnement :
+    MAX_CONCURRENT_INFERENCES  créneaux d'inférence simultanés en limite fixe (défaut:
+                               nombre de CPU), plafond de la limite adaptative
+    QUEUE_PER_SLOT             requêtes en attente admises par créneau (défaut: 2, 0 = sans limite)
+    MODEL_CONCURRENCY          limites par modèle, ex. "birefnet-general=1,isnet-general-use=2"
+    API_KEY_PRIORITIES         classe associée à des clés d'API, ex. "cle-web=interactive,cle-lot=batch"
+    DEFAULT_PRIORITY           classe des requêtes sans en-tête ni clé connue (défaut: standard)
+
+En-têtes de requête :
+    X-Priority    interactive, standard ou batch (ignoré si la clé d'API a une classe)
+    X-API-Key     identifie le client
+"""
+
+import asyncio
+import itertools
+import logging
+import math
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Mapping, Optional
+
+from .deadline import Cancellation, ClientDisconnected, DeadlineExceeded
+from .limiter import GradientLimiter
+
+logger = logging.getLogger(__name__)
+
+# Part de la capacité de chaque classe, relativement aux autres
+PRIORITY_WEIGHTS = {'interactive': 8.0, 'standard': 2.0, 'batch': 1.0}
+
+# Attentes conservées par classe pour les percentiles de /metrics
+WAIT_SAMPLES = 1000
+# File admise pour les requêtes interactive, relativement aux autres classes
+INTERACTIVE_QUEUE_FACTOR = 2
+# Poids d'une mesure dans la durée moyenne d'inférence (Retry-After)
+LATENCY_ALPHA = 0.2
+
+
+def _parse_mapping(value: str) -> Dict[str, str]:
+    """"a=1,b=2" -> {'a': '1', 'b': '2'}"""
+    pairs = (item.split("=", 1) for item in value.split(",") if "=" in item)
+    return {key.strip(): val.strip() for key, val in pairs}
+
+
+MAX_CONCURRENT_INFERENCES = int(os.environ.get("MAX_CONCURRENT_INFERENCES", os.cpu_count() or 1))
+MODEL_CONCURRENCY = {
+    model: int(limit)
+    for model, limit in _parse_mapping(os.environ.get("MODEL_CONCURRENCY", "birefnet-general=1")).items()
+}
+API_KEY_PRIORITIES = _parse_mapping(os.environ.get("API_KEY_PRIORITIES", ""))
+DEFAULT_PRIORITY = os.environ.get("DEFAULT_PRIORITY", "standard")
+QUEUE_PER_SLOT = float(os.environ.get("QUEUE_PER_SLOT", 2))
+
+
+class Overloaded(Exception):
+    """File d'attente pleine : la requête est refusée (503)"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Ticket:
+    """Requête en attente (ou en cours) d'un créneau d'inférence"""
+
+    def __init__(self, client: str, priority: str, model: str, cost: float,
+                 cancellation: Cancellation):
+        self.client = client
+        self.priority = priority
+        self.model = model
+        self.cost = cost
+        self.cancellation = cancellation
+        self.enqueued = time.monotonic()
+        self.tag = 0.0
+        self.sequence = 0
+        self.future: Optional[asyncio.Future] = None
+
+    def expired(self, now: float) -> bool:
+        return self.cancellation.expired(now)
+
+
+class FairScheduler:
+    """Attribue les créneaux d'inférence d'un worker (boucle asyncio du serveur)"""
+
+    def __init__(self, limit: int = MAX_CONCURRENT_INFERENCES,
+                 model_limits: Optional[Dict[str, int]] = None,
+                 api_key_priorities: Optional[Dict[str, str]] = None,
+                 default_priority: str = DEFAULT_PRIORITY,
+                 limiter: Optional[GradientLimiter] = None,
+                 queue_per_slot: float = QUEUE_PER_SLOT):
+        """
+        Args:
+            limit: Nombre de créneaux, sans limiteur adaptatif
+            model_limits: Créneaux maximum par modèle
+            api_key_priorities: Classe de priorité par clé d'API
+            default_priority: Classe des requêtes sans en-tête ni clé connue
+            limiter: Limiteur adaptatif qui fixe le nombre de créneaux
+            queue_per_slot: Requêtes en attente admises par créneau (0 = sans limite)
+        """
+        if default_priority not in PRIORITY_WEIGHTS:
+            raise ValueError(f"DEFAULT_PRIORITY invalide: {default_priority}. Valeurs possibles: {list(PRIORITY_WEIGHTS)}")
+        self.fixed_limit = max(1, limit)
+        self.limiter = limiter
+        self.queue_per_slot = queue_per_slot
+        self.model_limits = dict(MODEL_CONCURRENCY if model_limits is None else model_limits)
+        self.api_key_priorities = dict(API_KEY_PRIORITIES if api_key_priorities is None else api_key_priorities)
+        self.default_priority = default_priority
+        self.running = 0
+        self.running_by_model: Dict[str, int] = {}
+        self.dropped = 0
+        self.abandoned = 0
+        self.shed = 0
+        self.mean_latency_ms = 0.0
+        self._queue: List[Ticket] = []
+        self._sequence = itertools.count()
+        # Temps virtuel : étiquette de la dernière requête servie
+        self._virtual_time = 0.0
+        # Étiquette de fin de la dernière requête de chaque client
+        self._finish: Dict[str, float] = {}
+        self._waits = {name: deque(maxlen=WAIT_SAMPLES) for name in PRIORITY_WEIGHTS}
+
+    @property
+    def limit(self) -> int:
+        """Nombre de créneaux d'inférence actuel"""
+        return self.limiter.limit if self.limiter is not None else self.fixed_limit
+
+    @property
+    def queued(self) -> int:
+        """Requêtes en attente d'un créneau"""
+        return len(self._queue)
+
+    def ticket(self, headers: Mapping[str, str], client_host: Optional[str], model: str,
+               cost: float = 1.0, cancellation: Optional[Cancellation] = None) -> Ticket:
+        """
+        Ticket d'une requête à partir de ses en-têtes
+
+        Args:
+            headers: En-têtes HTTP (X-Priority, X-API-Key)
+            client_host: Adresse du client, utilisée sans clé d'API
+            model: Modèle demandé (limite de concurrence)
+            cost: Coût relatif de la requête (latence estimée)
+            cancellation: Échéance et déconnexion de la requête
+
+        Returns:
+            Ticket: À passer à slot()
+        """
+        api_key = headers.get('x-api-key')
+        priority = self.api_key_priorities.get(api_key) if api_key else None
+        if priority is None:
+            priority = headers.get('x-priority', self.default_priority).lower()
+            if priority not in PRIORITY_WEIGHTS:
+                raise ValueError(f"Priorité '{priority}' invalide. Valeurs possibles: {list(PRIORITY_WEIGHTS)}")
+
+        client = f"key:{api_key}" if api_key else f"ip:{client_host or 'unknown'}"
+        return Ticket(client, priority, model, cost, cancellation or Cancellation())
+
+    @asynccontextmanager
+    async def slot(self, ticket: Ticket) -> AsyncIterator[None]:
+        """Attend un créneau d'inférence et le libère à la sortie du bloc"""
+        await self._acquire(ticket)
+        started = time.monotonic()
+        latency_ms = None
+        try:
+            yield
+            latency_ms = (time.monotonic() - started) * 1000
+        finally:
+            # Les inférences interrompues ne renseignent pas sur la latence
+            self._release(ticket, latency_ms)
+
+    async def _acquire(self, ticket: Ticket):
+        if ticket.expired(time.monotonic()):
+            self._drop(ticket)
+        self._check_queue(ticket)
+
+        start = max(self._virtual_time, self._finish.get(ticket.client, 0.0))
+        ticket.tag = start
+        ticket.sequence = next(self._sequence)
+        self._finish[ticket.client] = start + ticket.cost / PRIORITY_WEIGHTS[ticket.priority]
+        ticket.future = asyncio.get_running_loop().create_future()
+        self._queue.append(ticket)
+        self._dispatch()
+
+        deadline = ticket.cancellation.deadline
+        timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+        try:
+            await asyncio.wait_for(ticket.future, timeout)
+        except BaseException as e:
+            if ticket.future.done() and not ticket.future.cancelled() and ticket.future.exception() is None:
+                # Créneau attribué au moment de l'annulation : le rendre
+                self._release(ticket)
+            elif ticket in self._queue:
+                self._queue.remove(ticket)
+            if isinstance(e, asyncio.TimeoutError):
+                self._drop(ticket)
+            raise
+
+    def abandon(self, ticket: Ticket):
+        """Retire de la file la requête d'un client déconnecté"""
+        if ticket not in self._queue:
+            return
+        self._queue.remove(ticket)
+        self.abandoned += 1
+        logger.info(f"🔌 Client déconnecté, requête retirée de la file ({ticket.client}, {ticket.model})")
+        ticket.future.set_exception(ClientDisconnected("Client déconnecté avant l'inférence"))
+
+    def _check_queue(self, ticket: Ticket):
+        """Refuse la requête si la file dépasse QUEUE_PER_SLOT par créneau"""
+        if not self.queue_per_slot:
+            return
+        bound = max(1, math.ceil(self.limit * self.queue_per_slot))
+        if ticket.priority == 'interactive':
+            bound *= INTERACTIVE_QUEUE_FACTOR
+        if len(self._queue) < bound:
+            return
+        self.shed += 1
+        # Temps pour écouler la file au rythme actuel
+        drain_s = len(self._queue) / self.limit * self.mean_latency_ms / 1000
+        retry_after = max(1, math.ceil(drain_s))
+        logger.warning(f"🚦 Surcharge: {len(self._queue)} requêtes en attente pour {self.limit} créneaux, requête refusée")
+        raise Overloaded(f"Service surchargé, réessayer dans {retry_after} s", retry_after)
+
+    def _release(self, ticket: Ticket, latency_ms: Optional[float] = None):
+        in_flight = self.running
+        self.running -= 1
+        self.running_by_model[ticket.model] -= 1
+        if latency_ms is not None:
+            self.mean_latency_ms = (
+                latency_ms if not self.mean_latency_ms
+                else (1 - LATENCY_ALPHA) * self.mean_latency_ms + LATENCY_ALPHA * latency_ms
+            )
+            if self.limiter is not None:
+                self.limiter.update(ticket.model, latency_ms, in_flight, len(self._queue))
+        self._dispatch()
+
+    def _drop(self, ticket: Ticket):
+        self.dropped += 1
+        waited = (time.monotonic() - ticket.enqueued) * 1000
+        logger.warning(f"⏱️ Échéance dépassée après {waited:.0f} ms d'attente ({ticket.client}, {ticket.model})")
+        raise DeadlineExceeded(f"Échéance dépassée après {waited:.0f} ms d'attente")
+
+    def _dispatch(self):
+        """Attribue les créneaux libres aux requêtes de plus petite étiquette"""
+        now = time.monotonic()
+        for ticket in sorted(self._queue, key=lambda t: (t.tag, t.sequence)):
+            if self.running >= self.limit:
+                break
+            if ticket.expired(now):
+                # Réveillé par wait_for, qui compte l'abandon
+                continue
+            model_limit = self.model_limits.get(ticket.model)
+            running = self.running_by_model.get(ticket.model, 0)
+            if model_limit is not None and running >= model_limit:
+                continue
+            self._queue.remove(ticket)
+            self.running += 1
+            self.running_by_model[ticket.model] = running + 1
+            self._virtual_time = max(self._virtual_time, ticket.tag)
+            self._waits[ticket.priority].append((now - ticket.enqueued) * 1000)
+            ticket.future.set_result(None)
+
+        # Les clients sans requête récente n'ont plus besoin de leur étiquette
+        if len(self._finish) > 10000:
+            self._finish = {
+                client: finish for client, finish in self._finish.items()
+                if finish > self._virtual_time
+            }
+
+    def stats(self) -> dict:
+        """Occupation, files et temps d'attente par classe, pour /metrics"""
+        queue_wait = {}
+        for priority, waits in self._waits.items():
+            ordered = sorted(waits)
+            if ordered:
+                queue_wait[priority] = {
+                    'count': len(ordered),
+                    'p50_ms': round(ordered[len(ordered) // 2], 1),
+                    'p95_ms': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 1),
+                    'max_ms': round(ordered[-1], 1)
+                }
+        return {
+            'limit': self.limit,
+            'running': self.running,
+            'running_by_model': {model: count for model, count in self.running_by_model.items() if count},
+            'queued': self.queued,
+            'dropped_deadline': self.dropped,
+            'abandoned': self.abandoned,
+            'shed': self.shed,
+            'mean_latency_ms': round(self.mean_latency_ms, 1),
+            'limiter': self.limiter.stats() if self.limiter is not None else {'mode': 'fixed'},
+            'queue_wait': queue_wait
+        }
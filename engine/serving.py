@@ -0,0 +1,123 @@
+"""
+Mode de service multi-processus (pré-fork) avec modèles partagés
+
+Les sessions onnxruntime sont créées dans le processus parent puis partagées
+en copie sur écriture par les workers forkés : un seul exemplaire des poids
+en mémoire quel que soit le nombre de workers.
+
+onnxruntime ne survit pas à un fork avec un pool de threads déjà démarré :
+le partage n'est donc possible qu'avec INFERENCE_THREADS=1 (défaut en
+pré-fork). Au-delà, chaque worker crée ses propres sessions après le fork.
+
+Variables d'environnement :
+    SERVING_MODE         single (uvicorn, défaut) ou prefork (gunicorn)
+    WORKERS              nombre de workers en pré-fork (défaut: nb de CPU)
+    INFERENCE_THREADS    threads onnxruntime par session (0 = défaut onnxruntime)
+    MAX_REQUESTS         recyclage d'un worker après N requêtes (0 = jamais)
+    MAX_REQUESTS_JITTER  aléa ajouté à MAX_REQUESTS pour étaler les recyclages
+    GRACEFUL_TIMEOUT     délai (s) laissé aux requêtes en cours lors d'un recyclage
+"""
+
+import gc
+import logging
+import os
+from typing import Callable, Optional
+
+import onnxruntime as ort
+from rembg.sessions import sessions_class
+from rembg.sessions.u2net import U2netSession
+
+from .tensors import attach_tensor_buffers
+
+logger = logging.getLogger(__name__)
+
+SERVING_MODE = os.environ.get("SERVING_MODE", "single")
+WORKERS = int(os.environ.get("WORKERS", os.cpu_count() or 1))
+INFERENCE_THREADS = int(os.environ.get(
+    "INFERENCE_THREADS", 1 if SERVING_MODE == "prefork" else 0
+))
+MAX_REQUESTS = int(os.environ.get("MAX_REQUESTS", 0))
+MAX_REQUESTS_JITTER = int(os.environ.get("MAX_REQUESTS_JITTER", 50))
+GRACEFUL_TIMEOUT = int(os.environ.get("GRACEFUL_TIMEOUT", 30))
+TIMEOUT = int(os.environ.get("TIMEOUT", 300))
+
+
+def sessions_shared_across_workers() -> bool:
+    """Vrai si les sessions peuvent être créées avant le fork"""
+    return SERVING_MODE != "prefork" or INFERENCE_THREADS == 1
+
+
+def session_class_for(model_name: str):
+    """Classe de session rembg d'un modèle (U2netSession par défaut, comme rembg)"""
+    return next(
+        (sc for sc in sessions_class if sc.name() == model_name), U2netSession
+    )
+
+
+def build_session(model_name: str, model_path: Optional[str] = None):
+    """
+    Équivalent de rembg.new_session avec le nombre de threads configuré
+
+    new_session ne permet pas de passer ses propres SessionOptions. Avec
+    model_path (fichier déjà vérifié par le model store), la session est
+    construite sur ce fichier sans passer par le téléchargement de rembg.
+    Les tampons d'inférence sont préalloués et réutilisés (voir tensors.py).
+    """
+    session_class = session_class_for(model_name)
+
+    sess_opts = ort.SessionOptions()
+    if INFERENCE_THREADS > 0:
+        sess_opts.intra_op_num_threads = INFERENCE_THREADS
+        sess_opts.inter_op_num_threads = 1
+    elif "OMP_NUM_THREADS" in os.environ:
+        sess_opts.inter_op_num_threads = int(os.environ["OMP_NUM_THREADS"])
+
+    if model_path is None:
+        session = session_class(model_name, sess_opts, None)
+    else:
+        # Même initialisation que BaseSession.__init__, sans download_models()
+        session = session_class.__new__(session_class)
+        session.model_name = model_name
+        session.providers = ort.get_available_providers()
+        session.inner_session = ort.InferenceSession(
+            model_path, providers=session.providers, sess_options=sess_opts
+        )
+    return attach_tensor_buffers(session)
+
+
+def run_prefork(app, port: int, on_worker_start: Callable[[], None]):
+    """
+    Lance gunicorn avec des workers uvicorn forkés depuis ce processus
+
+    Args:
+        app: Application ASGI déjà importée (modèles chargés si partagés)
+        port: Port d'écoute
+        on_worker_start: Appelé dans chaque worker après le fork
+    """
+    from gunicorn.app.base import BaseApplication
+
+    class PreforkApplication(BaseApplication):
+        def load_config(self):
+            self.cfg.set("bind", f"0.0.0.0:{port}")
+            self.cfg.set("workers", WORKERS)
+            self.cfg.set("worker_class", "uvicorn.workers.UvicornWorker")
+            self.cfg.set("preload_app", True)
+            self.cfg.set("max_requests", MAX_REQUESTS)
+            self.cfg.set("max_requests_jitter", MAX_REQUESTS_JITTER if MAX_REQUESTS else 0)
+            self.cfg.set("graceful_timeout", GRACEFUL_TIMEOUT)
+            self.cfg.set("timeout", TIMEOUT)
+            self.cfg.set("post_fork", lambda server, worker: on_worker_start())
+
+        def load(self):
+            return app
+
+    # Les objets Python déjà créés ne seront plus parcourus par le GC :
+    # leurs pages restent partagées au lieu d'être copiées dans chaque worker
+    gc.collect()
+    gc.freeze()
+
+    logger.info(
+        f"Démarrage pré-fork: {WORKERS} workers, {INFERENCE_THREADS or 'auto'} thread(s) "
+        f"d'inférence, sessions partagées={sessions_shared_across_workers()}"
+    )
+    PreforkApplication().run()
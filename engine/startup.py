@@ -0,0 +1,165 @@
+"""
+Démarrage mesuré du service : phases chronométrées et état de préparation
+
+Phases suivies : import des bibliothèques, téléchargement/vérification de
+chaque modèle, création de la session onnxruntime et inférence de chauffe
+sur une image synthétique.
+
+Le mode de démarrage (eager, lazy, background) est fixé par EngineConfig.
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+import numpy as np
+from PIL import Image
+
+from .model_store import ModelStore
+from .serving import build_session, session_class_for
+
+logger = logging.getLogger(__name__)
+
+# Côté de l'image synthétique utilisée pour la chauffe
+WARMUP_IMAGE_SIZE = 64
+
+
+def warmup_image() -> Image.Image:
+    """Bruit déterministe : une image unie donnerait une division par zéro à la normalisation"""
+    pixels = np.random.default_rng(0).integers(
+        0, 256, (WARMUP_IMAGE_SIZE, WARMUP_IMAGE_SIZE, 3), dtype=np.uint8
+    )
+    return Image.fromarray(pixels, mode="RGB")
+
+
+class StartupTracker:
+    """Durées des phases de démarrage et état de chaque modèle configuré"""
+
+    def __init__(self, mode: str, models: List[str]):
+        self.mode = mode
+        self.models = list(models)
+        self.started_at = time.time()
+        self.phases: Dict[str, float] = {}
+        self.model_status: Dict[str, str] = {name: 'pending' for name in self.models}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, duration_ms: float):
+        with self._lock:
+            self.phases[name] = round(duration_ms, 1)
+
+    @contextmanager
+    def phase(self, name: str):
+        """Chronomètre un bloc et l'enregistre sous `name`"""
+        start_time = time.time()
+        try:
+            yield
+        finally:
+            duration_ms = (time.time() - start_time) * 1000
+            self.record(name, duration_ms)
+            logger.info(f"⏱️ Phase {name}: {duration_ms:.0f} ms")
+
+    def set_model_status(self, model_name: str, status: str):
+        with self._lock:
+            self.model_status[model_name] = status
+
+    @property
+    def ready(self) -> bool:
+        """Prêt quand tous les modèles configurés sont chauds (immédiat en lazy)"""
+        if self.mode == 'lazy':
+            return True
+        with self._lock:
+            return all(self.model_status.get(name) == 'warm' for name in self.models)
+
+    def report(self) -> dict:
+        ready = self.ready
+        with self._lock:
+            return {
+                'mode': self.mode,
+                'ready': ready,
+                'uptime_s': round(time.time() - self.started_at, 1),
+                'phases_ms': dict(self.phases),
+                'models': dict(self.model_status),
+            }
+
+
+def load_model(model_name: str, tracker: StartupTracker, store: ModelStore):
+    """
+    Charge un modèle en chronométrant chaque phase
+
+    Returns:
+        Session rembg chauffée
+    """
+    tracker.set_model_status(model_name, 'loading')
+    try:
+        with tracker.phase(f"{model_name}.download"):
+            model_path = store.ensure(model_name)
+            if model_path is None:
+                session_class_for(model_name).download_models()
+        with tracker.phase(f"{model_name}.session"):
+            session = build_session(model_name, model_path)
+        with tracker.phase(f"{model_name}.warmup"):
+            session.predict(warmup_image())
+    except Exception:
+        tracker.set_model_status(model_name, 'error')
+        raise
+    tracker.set_model_status(model_name, 'warm')
+    return session
+
+
+class ModelLoader:
+    """
+    Sessions chargées une seule fois, même sous demandes concurrentes
+
+    Une requête qui demande un modèle en cours de chargement attend ce
+    chargement au lieu d'en lancer un second.
+    """
+
+    def __init__(self, tracker: StartupTracker, store: Optional[ModelStore] = None):
+        self.tracker = tracker
+        self.store = store or ModelStore()
+        self.sessions = {}
+        self._loading: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def get(self, model_name: str):
+        """Session du modèle, chargée (et chauffée) au besoin"""
+        session = self.sessions.get(model_name)
+        if session is not None:
+            return session
+
+        with self._lock:
+            if model_name in self.sessions:
+                return self.sessions[model_name]
+            future = self._loading.get(model_name)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._loading[model_name] = future
+
+        if not owner:
+            logger.info(f"Attente du chargement en cours de {model_name}")
+            return future.result()
+
+        try:
+            session = load_model(model_name, self.tracker, self.store)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            self.sessions[model_name] = session
+            future.set_result(session)
+            return session
+        finally:
+            with self._lock:
+                del self._loading[model_name]
+
+    def warm(self, models: List[str]):
+        """Charge les modèles dans l'ordre donné (ordre de priorité)"""
+        for model_name in models:
+            try:
+                self.get(model_name)
+            except Exception as e:
+                logger.error(f"Pré-chargement de {model_name} impossible: {e}")
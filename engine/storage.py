@@ -0,0 +1,293 @@
+"""
+Entrée et sortie sur stockage objet (S3, GCS, MinIO) sans passer par le client
+
+Au lieu de télécharger l'image, l'encoder en base64, l'envoyer au service
+puis refaire le chemin inverse, le client donne deux URI : le service lit la
+source et écrit le résultat directement dans le bucket.
+
+    s3://bucket/cle   AWS S3, ou tout stockage compatible (STORAGE_ENDPOINT_URL, ex. MinIO)
+    gs://bucket/cle   Google Cloud Storage via son API compatible S3 (clés HMAC)
+
+Le téléchargement est écrit au fil de l'eau dans un SpooledTemporaryFile
+(mémoire jusqu'à 1 Mo, disque au-delà) que le moteur lit en place. Le
+résultat est envoyé pendant son encodage : un seul PUT s'il tient dans une
+partie, sinon un envoi multipart dont les parties partent en parallèle.
+Les connexions HTTP sont gardées dans un pool partagé par les requêtes.
+
+Le paquet boto3 est nécessaire (pip install boto3) ; les identifiants
+suivent la chaîne habituelle d'AWS (variables AWS_*, rôle de l'instance).
+
+Variables d'environnement :
+    STORAGE_ENDPOINT_URL         endpoint des URI s3:// (défaut: AWS)
+    GCS_ENDPOINT_URL             endpoint des URI gs:// (défaut: https://storage.googleapis.com)
+    GCS_ACCESS_KEY_ID            clé HMAC GCS (défaut: identifiants AWS_*)
+    GCS_SECRET_ACCESS_KEY        secret HMAC GCS
+    STORAGE_ALLOWED_BUCKETS      buckets autorisés, ex. "s3://photos,gs://catalogue" (défaut: aucun,
+                                 le service n'authentifie pas ses clients : toute URI est refusée)
+    STORAGE_MAX_CONNECTIONS      taille du pool de connexions par stockage (défaut: 32)
+    STORAGE_PART_BYTES           taille des parties multipart (défaut: 8 Mo, minimum S3: 5 Mo)
+    STORAGE_UPLOAD_CONCURRENCY   parties envoyées en parallèle par résultat (défaut: 4)
+"""
+
+import logging
+import mimetypes
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Dict, Iterable, Tuple
+
+logger = logging.getLogger(__name__)
+
+STORAGE_ENDPOINT_URL = os.environ.get("STORAGE_ENDPOINT_URL") or None
+GCS_ENDPOINT_URL = os.environ.get("GCS_ENDPOINT_URL", "https://storage.googleapis.com")
+GCS_ACCESS_KEY_ID = os.environ.get("GCS_ACCESS_KEY_ID") or None
+GCS_SECRET_ACCESS_KEY = os.environ.get("GCS_SECRET_ACCESS_KEY") or None
+STORAGE_ALLOWED_BUCKETS = os.environ.get("STORAGE_ALLOWED_BUCKETS", "")
+STORAGE_MAX_CONNECTIONS = int(os.environ.get("STORAGE_MAX_CONNECTIONS", 32))
+STORAGE_PART_BYTES = int(os.environ.get("STORAGE_PART_BYTES", 8 * 1024 * 1024))
+STORAGE_UPLOAD_CONCURRENCY = int(os.environ.get("STORAGE_UPLOAD_CONCURRENCY", 4))
+
+STORAGE_SCHEMES = ('s3', 'gs')
+
+# Taille des lectures du corps téléchargé
+DOWNLOAD_CHUNK_BYTES = 1024 * 1024
+# Au-delà, le téléchargement passe de la mémoire à un fichier temporaire
+SPOOL_BYTES = 1024 * 1024
+
+
+class StorageError(Exception):
+    """Erreur du stockage objet, avec le statut HTTP à renvoyer au client"""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def parse_uri(uri: str) -> Tuple[str, str, str]:
+    """
+    Découpe une URI de stockage
+
+    Returns:
+        Tuple (schéma, bucket, clé)
+    """
+    scheme, separator, path = uri.partition("://")
+    bucket, _, key = path.partition("/")
+    if not separator or scheme not in STORAGE_SCHEMES or not bucket or not key:
+        raise ValueError(f"URI de stockage invalide: '{uri}' (attendu s3://bucket/cle ou gs://bucket/cle)")
+    return scheme, bucket, key
+
+
+def _status(error: Exception) -> int:
+    """Statut HTTP d'une erreur botocore : 404 et 403 transmis, le reste en 502"""
+    code = str(getattr(error, 'response', {}).get('Error', {}).get('Code', ''))
+    if code in ('NoSuchKey', 'NoSuchBucket', '404', 'NotFound'):
+        return 404
+    if code in ('AccessDenied', '403', 'Forbidden'):
+        return 403
+    return 502
+
+
+class ObjectStorage:
+    """Clients S3 (un par stockage, pool de connexions partagé) et transferts en flux"""
+
+    def __init__(self, allowed_buckets: str = STORAGE_ALLOWED_BUCKETS,
+                 part_bytes: int = STORAGE_PART_BYTES,
+                 upload_concurrency: int = STORAGE_UPLOAD_CONCURRENCY):
+        """
+        Args:
+            allowed_buckets: "schéma://bucket" autorisés, séparés par des virgules (vide = aucun)
+            part_bytes: Taille des parties multipart
+            upload_concurrency: Parties envoyées en parallèle par résultat
+        """
+        self.allowed = {bucket.strip().rstrip("/") for bucket in allowed_buckets.split(",") if bucket.strip()}
+        if not self.allowed:
+            logger.warning("🔒 STORAGE_ALLOWED_BUCKETS vide : les requêtes sur stockage objet seront refusées (403)")
+        self.part_bytes = max(part_bytes, 5 * 1024 * 1024)
+        self.upload_concurrency = max(1, upload_concurrency)
+        self.metrics = {'downloads': 0, 'uploads': 0, 'multipart_uploads': 0,
+                        'bytes_downloaded': 0, 'bytes_uploaded': 0, 'errors': 0}
+        self._clients: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def _client(self, scheme: str):
+        """Client boto3 du stockage, créé une fois (il est sûr entre threads)"""
+        with self._lock:
+            client = self._clients.get(scheme)
+            if client is not None:
+                return client
+            try:
+                import boto3
+                from botocore.config import Config
+            except ImportError:
+                raise RuntimeError("Le stockage objet nécessite le paquet boto3 (pip install boto3)")
+            config = Config(
+                max_pool_connections=STORAGE_MAX_CONNECTIONS,
+                retries={'max_attempts': 3, 'mode': 'standard'},
+                s3={'addressing_style': 'path'} if scheme == 's3' and STORAGE_ENDPOINT_URL else None
+            )
+            if scheme == 'gs':
+                client = boto3.client(
+                    's3', endpoint_url=GCS_ENDPOINT_URL, config=config,
+                    aws_access_key_id=GCS_ACCESS_KEY_ID, aws_secret_access_key=GCS_SECRET_ACCESS_KEY
+                )
+            else:
+                client = boto3.client('s3', endpoint_url=STORAGE_ENDPOINT_URL, config=config)
+            self._clients[scheme] = client
+            return client
+
+    def authorize(self, uri: str) -> Tuple[str, str, str]:
+        """
+        Vérifie qu'une URI vise un bucket autorisé
+
+        Le service n'authentifie pas ses clients : sans liste de buckets
+        autorisés, tout est refusé, faute de quoi il agirait pour eux sur
+        tout ce que son rôle IAM peut atteindre.
+
+        Returns:
+            Tuple (schéma, bucket, clé) ; StorageError 403 si le bucket n'est pas autorisé
+        """
+        scheme, bucket, key = parse_uri(uri)
+        if not self.allowed:
+            raise StorageError(403, "Stockage objet désactivé : aucun bucket autorisé (STORAGE_ALLOWED_BUCKETS)")
+        if f"{scheme}://{bucket}" not in self.allowed:
+            raise StorageError(403, f"Bucket non autorisé: {scheme}://{bucket}")
+        return scheme, bucket, key
+
+    def _resolve(self, uri: str):
+        """Client, bucket et clé d'une URI autorisée"""
+        scheme, bucket, key = self.authorize(uri)
+        return self._client(scheme), bucket, key
+
+    def download(self, uri: str, max_bytes: int = 0) -> Tuple[BinaryIO, str]:
+        """
+        Télécharge un objet en flux dans un fichier temporaire
+
+        Args:
+            uri: Source (s3:// ou gs://)
+            max_bytes: Taille maximale acceptée (0 = pas de limite)
+
+        Returns:
+            Tuple: Fichier (à fermer par l'appelant, positionné au début) et type MIME
+        """
+        client, bucket, key = self._resolve(uri)
+        try:
+            response = client.get_object(Bucket=bucket, Key=key)
+        except Exception as e:
+            raise self._failed(f"lecture de {uri}", e)
+        size = response.get('ContentLength') or 0
+        if max_bytes and size > max_bytes:
+            response['Body'].close()
+            raise ValueError(f"Image trop grande ({size} bytes). Maximum: {max_bytes} bytes")
+
+        content_type = response.get('ContentType') or ''
+        if not content_type.startswith(('image/', 'video/')):
+            content_type = mimetypes.guess_type(key)[0] or content_type
+        spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES)
+        try:
+            for chunk in response['Body'].iter_chunks(DOWNLOAD_CHUNK_BYTES):
+                spool.write(chunk)
+        except Exception as e:
+            spool.close()
+            raise self._failed(f"lecture de {uri}", e)
+        spool.seek(0)
+        self.metrics['downloads'] += 1
+        self.metrics['bytes_downloaded'] += size
+        logger.info(f"⬇️ {uri} téléchargé ({size} bytes, {content_type})")
+        return spool, content_type
+
+    def upload(self, uri: str, chunks: Iterable[bytes], content_type: str) -> int:
+        """
+        Envoie un résultat pendant qu'il est produit
+
+        Un seul PUT si le résultat tient dans une partie ; sinon envoi
+        multipart, au plus upload_concurrency parties en vol (et en mémoire).
+
+        Returns:
+            int: Taille envoyée
+        """
+        client, bucket, key = self._resolve(uri)
+        buffer = bytearray()
+        chunks = iter(chunks)
+        for chunk in chunks:
+            buffer += chunk
+            if len(buffer) >= self.part_bytes:
+                return self._upload_multipart(client, uri, bucket, key, buffer, chunks, content_type)
+        try:
+            client.put_object(Bucket=bucket, Key=key, Body=bytes(buffer), ContentType=content_type)
+        except Exception as e:
+            raise self._failed(f"écriture de {uri}", e)
+        self.metrics['uploads'] += 1
+        self.metrics['bytes_uploaded'] += len(buffer)
+        logger.info(f"⬆️ {uri} écrit ({len(buffer)} bytes)")
+        return len(buffer)
+
+    def _upload_multipart(self, client, uri: str, bucket: str, key: str, buffer: bytearray,
+                          chunks: Iterable[bytes], content_type: str) -> int:
+        try:
+            upload_id = client.create_multipart_upload(
+                Bucket=bucket, Key=key, ContentType=content_type
+            )['UploadId']
+        except Exception as e:
+            raise self._failed(f"écriture de {uri}", e)
+
+        # Borne les parties en mémoire : l'encodeur attend si l'envoi est plus lent
+        slots = threading.Semaphore(self.upload_concurrency)
+
+        def send(number: int, data: bytes) -> dict:
+            try:
+                response = client.upload_part(
+                    Bucket=bucket, Key=key, UploadId=upload_id, PartNumber=number, Body=data
+                )
+                return {'PartNumber': number, 'ETag': response['ETag']}
+            finally:
+                slots.release()
+
+        size = 0
+        futures = []
+        with ThreadPoolExecutor(self.upload_concurrency, thread_name_prefix="storage-upload") as pool:
+            try:
+                def submit(data: bytes):
+                    slots.acquire()
+                    futures.append(pool.submit(send, len(futures) + 1, data))
+
+                for chunk in chunks:
+                    buffer += chunk
+                    while len(buffer) >= self.part_bytes:
+                        submit(bytes(buffer[:self.part_bytes]))
+                        del buffer[:self.part_bytes]
+                        size += self.part_bytes
+                        # Échec d'une partie déjà envoyée : inutile de continuer à encoder
+                        for future in futures:
+                            if future.done() and future.exception() is not None:
+                                future.result()
+                if buffer:
+                    submit(bytes(buffer))
+                    size += len(buffer)
+                parts = [future.result() for future in futures]
+                client.complete_multipart_upload(
+                    Bucket=bucket, Key=key, UploadId=upload_id, MultipartUpload={'Parts': parts}
+                )
+            except Exception as e:
+                try:
+                    client.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+                except Exception as abort_error:
+                    logger.error(f"❌ Abandon de l'envoi multipart {uri} impossible: {abort_error}")
+                raise self._failed(f"écriture de {uri}", e)
+
+        self.metrics['uploads'] += 1
+        self.metrics['multipart_uploads'] += 1
+        self.metrics['bytes_uploaded'] += size
+        logger.info(f"⬆️ {uri} écrit en {len(futures)} parties ({size} bytes)")
+        return size
+
+    def _failed(self, operation: str, error: Exception) -> Exception:
+        """Erreur à lever : les erreurs du moteur (client parti...) sont transmises telles quelles"""
+        if not type(error).__module__.startswith(('botocore', 'boto3', 'urllib3')):
+            return error
+        self.metrics['errors'] += 1
+        logger.error(f"❌ Stockage objet, {operation}: {error}")
+        return StorageError(_status(error), f"Stockage objet, {operation}: {error}")
+
+    def stats(self) -> dict:
+        return dict(self.metrics)
@@ -0,0 +1,163 @@
+"""
+Encodage en flux des résultats : les morceaux produits par l'encodeur sont
+envoyés au client pendant que l'encodage continue
+
+L'encodeur PNG (zlib) et JPEG de Pillow écrivent leur sortie par blocs :
+ils tournent dans un thread qui alimente une file bornée, consommée par la
+réponse HTTP. Le premier octet part dès le premier bloc compressé et seuls
+quelques blocs sont en mémoire à la fois. libwebp encode l'image d'un seul
+tenant : les WebP (et les animations déjà encodées) sont envoyés tels quels.
+"""
+
+import base64
+import json
+import logging
+import queue
+import threading
+from typing import Iterable, Iterator
+
+from PIL import Image
+
+from .formats import media_type as result_media_type
+
+logger = logging.getLogger(__name__)
+
+# Taille des morceaux envoyés au client
+CHUNK_SIZE = 64 * 1024
+# Morceaux en attente au maximum : l'encodeur est freiné si le client lit lentement
+MAX_PENDING_CHUNKS = 8
+
+_DONE = object()
+
+
+class _Aborted(Exception):
+    """Le consommateur a abandonné le flux (client déconnecté)"""
+
+
+class _ChunkWriter:
+    """Fichier en écriture seule qui regroupe les écritures en morceaux de CHUNK_SIZE"""
+
+    def __init__(self, chunks: queue.Queue, closed: threading.Event):
+        self.chunks = chunks
+        self.closed = closed
+        self.buffer = bytearray()
+
+    def write(self, data) -> int:
+        self.buffer += data
+        if len(self.buffer) >= CHUNK_SIZE:
+            self.flush()
+        return len(data)
+
+    def flush(self):
+        if self.buffer:
+            self._put(bytes(self.buffer))
+            self.buffer.clear()
+
+    def _put(self, item):
+        while True:
+            if self.closed.is_set():
+                raise _Aborted()
+            try:
+                self.chunks.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+
+def iter_encoded(image: Image.Image, format: str, **params) -> Iterator[bytes]:
+    """
+    Encode une image en flux
+
+    Args:
+        image: Image à encoder
+        format: Format Pillow ('PNG', 'JPEG'...)
+        params: Options de l'encodeur (quality...)
+
+    Returns:
+        Iterator[bytes]: Morceaux du fichier encodé, dans l'ordre
+    """
+    chunks = queue.Queue(maxsize=MAX_PENDING_CHUNKS)
+    closed = threading.Event()
+    writer = _ChunkWriter(chunks, closed)
+
+    def encode():
+        try:
+            image.save(writer, format, **params)
+            writer.flush()
+            writer._put(_DONE)
+        except _Aborted:
+            logger.info("Flux abandonné par le client, encodage interrompu")
+        except Exception as e:
+            logger.error(f"Erreur d'encodage en flux: {e}")
+            try:
+                writer._put(e)
+            except _Aborted:
+                pass
+
+    threading.Thread(target=encode, name="stream-encoder", daemon=True).start()
+    try:
+        while True:
+            item = chunks.get()
+            if item is _DONE:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        closed.set()
+
+
+class EncodedStream:
+    """Résultat prêt à être envoyé : morceaux, type MIME et nom de fichier"""
+
+    def __init__(self, chunks: Iterable[bytes], media_type: str, filename: str):
+        self.chunks = iter(chunks)
+        self.media_type = media_type
+        self.filename = filename
+        # Boîte du sujet dans l'image d'origine, si le résultat a été recadré
+        self.bbox = None
+        # Identifiant du masque conservé (voir masks.MaskStore), pour /composite
+        self.mask_id = None
+
+    def __iter__(self) -> Iterator[bytes]:
+        return self
+
+    def __next__(self) -> bytes:
+        return next(self.chunks)
+
+    @classmethod
+    def from_bytes(cls, data: bytes, jpeg: bool = False) -> 'EncodedStream':
+        """Résultat déjà encodé (animations, WebP), bytes ou memoryview sur le cache disque"""
+        media_type, filename = result_media_type(data, jpeg)
+        if isinstance(data, bytes):
+            return cls([data], media_type, filename)
+        # Copié morceau par morceau au fil de l'envoi
+        chunks = (bytes(data[start:start + CHUNK_SIZE]) for start in range(0, len(data), CHUNK_SIZE))
+        return cls(chunks, media_type, filename)
+
+    @classmethod
+    def from_image(cls, image: Image.Image, jpeg: bool = False) -> 'EncodedStream':
+        """PNG (transparent) ou JPEG (fond blanc) encodé en flux"""
+        if jpeg:
+            return cls(iter_encoded(image, 'JPEG', quality=95), "image/jpeg", "result.jpg")
+        return cls(iter_encoded(image, 'PNG'), "image/png", "result.png")
+
+
+def iter_base64_json(fields: dict, stream: Iterable[bytes], key: str = 'image') -> Iterator[bytes]:
+    """
+    Document JSON dont le champ `key` contient le flux encodé en base64
+
+    Le base64 est produit par morceaux (multiples de 3 octets) : ni le
+    résultat complet ni sa version base64 ne sont gardés en mémoire.
+    """
+    prefix = json.dumps(fields)[:-1] + (', ' if fields else '')
+    yield (prefix + f'"{key}": "').encode()
+    remainder = b''
+    for chunk in stream:
+        data = remainder + chunk
+        cut = len(data) - len(data) % 3
+        remainder = data[cut:]
+        if cut:
+            yield base64.b64encode(data[:cut])
+    yield base64.b64encode(remainder) + b'"}'
+
@@ -0,0 +1,185 @@
+"""
+Tampons d'inférence préalloués et réutilisés, par session et par worker
+
+BaseSession.normalize de rembg alloue à chaque inférence un tableau
+float64 HxWx3, sa transposée, puis une copie float32 1x3xHxW ; run()
+alloue ensuite toutes les sorties du modèle (7 pour u2net) et le
+post-traitement plusieurs tableaux à la résolution du modèle.
+
+Pour les modèles à un seul masque (u2net, silueta, isnet...), predict est
+remplacé : chaque inférence emprunte à un pool de la session un jeu de
+tampons (entrée float32, sortie, calcul du masque) liés au modèle par
+IOBinding, si bien qu'onnxruntime écrit directement dans la sortie
+préallouée. Le pool grandit jusqu'au nombre d'inférences simultanées puis
+ne réalloue plus. Les autres sessions (u2net_cloth_seg) gardent leur
+predict mais normalisent dans un tenseur réutilisé par thread.
+"""
+
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+from PIL import Image
+from rembg.sessions.base import BaseSession
+
+logger = logging.getLogger(__name__)
+
+# Paramètres de normalisation (moyenne, écart-type, taille) du predict rembg
+# des sessions à un seul masque
+SINGLE_MASK_SESSIONS = {
+    'u2net': ((0.485, 0.456, 0.406), (0.229, 0.224, 0.225), (320, 320)),
+    'u2netp': ((0.485, 0.456, 0.406), (0.229, 0.224, 0.225), (320, 320)),
+    'u2net_human_seg': ((0.485, 0.456, 0.406), (0.229, 0.224, 0.225), (320, 320)),
+    'silueta': ((0.485, 0.456, 0.406), (0.229, 0.224, 0.225), (320, 320)),
+    'isnet-general-use': ((0.485, 0.456, 0.406), (1.0, 1.0, 1.0), (1024, 1024)),
+    'isnet-anime': ((0.485, 0.456, 0.406), (1.0, 1.0, 1.0), (1024, 1024)),
+}
+
+
+def normalize_into(tensor: np.ndarray, img: Image.Image, mean: Tuple[float, float, float],
+                   std: Tuple[float, float, float], size: Tuple[int, int]):
+    """Même calcul que BaseSession.normalize, écrit dans un tenseur 1x3xHxW existant"""
+    pixels = np.asarray(img.convert("RGB").resize(size, Image.LANCZOS))
+    # Image noire : rembg diviserait par zéro
+    scale = float(pixels.max()) or 1.0
+    for channel in range(3):
+        plane = tensor[0, channel]
+        np.multiply(pixels[:, :, channel], 1.0 / (scale * std[channel]), out=plane, casting="unsafe")
+        plane -= mean[channel] / std[channel]
+
+
+class InputTensors:
+    """Remplace session.normalize : un tenseur d'entrée réutilisé par thread"""
+
+    def __init__(self, session):
+        self.input_name = session.inner_session.get_inputs()[0].name
+        self.allocations = 0
+        self.reuses = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _tensor(self, size: Tuple[int, int]) -> np.ndarray:
+        width, height = size
+        tensor = getattr(self._local, "tensor", None)
+        reused = tensor is not None and tensor.shape == (1, 3, height, width)
+        if not reused:
+            tensor = np.empty((1, 3, height, width), dtype=np.float32)
+            self._local.tensor = tensor
+        with self._lock:
+            if reused:
+                self.reuses += 1
+            else:
+                self.allocations += 1
+        return tensor
+
+    def normalize(self, img: Image.Image, mean: Tuple[float, float, float],
+                  std: Tuple[float, float, float], size: Tuple[int, int],
+                  *args, **kwargs) -> Dict[str, np.ndarray]:
+        tensor = self._tensor(size)
+        normalize_into(tensor, img, mean, std, size)
+        return {self.input_name: tensor}
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'allocations': self.allocations, 'reuses': self.reuses}
+
+
+class InferenceBuffers:
+    """Jeu de tampons d'une inférence : entrée, sortie, calcul du masque"""
+
+    def __init__(self, inner_session, input_name: str, output_name: str, size: Tuple[int, int]):
+        width, height = size
+        self.input = np.empty((1, 3, height, width), dtype=np.float32)
+        self.output = np.empty((1, 1, height, width), dtype=np.float32)
+        self.scratch = np.empty((height, width), dtype=np.float32)
+        self.mask = np.empty((height, width), dtype=np.uint8)
+        self.binding = None
+        try:
+            binding = inner_session.io_binding()
+            binding.bind_input(
+                input_name, 'cpu', 0, np.float32, list(self.input.shape), self.input.ctypes.data
+            )
+            binding.bind_output(
+                output_name, 'cpu', 0, np.float32, list(self.output.shape), self.output.ctypes.data
+            )
+            self.binding = binding
+        except Exception as e:
+            logger.warning(f"IOBinding indisponible, sorties allouées par onnxruntime: {e}")
+
+
+class PooledPredictor:
+    """Remplace session.predict pour les modèles à un seul masque"""
+
+    def __init__(self, session, mean: Tuple[float, float, float],
+                 std: Tuple[float, float, float], size: Tuple[int, int]):
+        self.session = session
+        self.mean = mean
+        self.std = std
+        self.size = size
+        self.input_name = session.inner_session.get_inputs()[0].name
+        self.output_name = session.inner_session.get_outputs()[0].name
+        self.allocations = 0
+        self.reuses = 0
+        self._free: List[InferenceBuffers] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _buffers(self) -> Iterator[InferenceBuffers]:
+        """Emprunte un jeu de tampons (le dernier rendu, encore chaud en cache)"""
+        with self._lock:
+            buffers = self._free.pop() if self._free else None
+            if buffers is None:
+                self.allocations += 1
+            else:
+                self.reuses += 1
+        if buffers is None:
+            buffers = InferenceBuffers(
+                self.session.inner_session, self.input_name, self.output_name, self.size
+            )
+        try:
+            yield buffers
+        finally:
+            with self._lock:
+                self._free.append(buffers)
+
+    def predict(self, img: Image.Image, *args, **kwargs) -> List[Image.Image]:
+        """Même résultat que le predict rembg, sans allocation à la résolution du modèle"""
+        with self._buffers() as buffers:
+            normalize_into(buffers.input, img, self.mean, self.std, self.size)
+            if buffers.binding is not None:
+                self.session.inner_session.run_with_iobinding(buffers.binding)
+                pred = buffers.output[0, 0]
+            else:
+                pred = self.session.inner_session.run(
+                    [self.output_name], {self.input_name: buffers.input}
+                )[0][0, 0]
+
+            low, high = float(pred.min()), float(pred.max())
+            np.subtract(pred, low, out=buffers.scratch)
+            buffers.scratch *= 255.0 / (high - low) if high > low else 0.0
+            np.copyto(buffers.mask, buffers.scratch, casting="unsafe")
+            # fromarray peut partager le tampon : redimensionner avant de le rendre
+            mask = Image.fromarray(buffers.mask, mode="L").resize(img.size, Image.LANCZOS)
+        return [mask]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'allocations': self.allocations, 'reuses': self.reuses}
+
+
+def attach_tensor_buffers(session):
+    """
+    Installe les tampons préalloués sur une session rembg
+
+    Les sessions qui redéfinissent normalize (SAM...) sont laissées telles quelles.
+    """
+    params = SINGLE_MASK_SESSIONS.get(type(session).name())
+    if params is not None:
+        session.tensor_buffers = PooledPredictor(session, *params)
+        session.predict = session.tensor_buffers.predict
+    elif type(session).normalize is BaseSession.normalize:
+        session.tensor_buffers = InputTensors(session)
+        session.normalize = session.tensor_buffers.normalize
+    return session
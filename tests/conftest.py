@@ -0,0 +1,73 @@
+"""
+Fixtures communes : images de test générées et application en mode lazy
+
+Les tests qui passent par le moteur remplacent ses sessions (stub_sessions) ;
+ceux qui lancent un autre processus nécessitent les modèles et sont ignorés
+sans eux (voir engine/model_store.py : python -m engine.model_store fetch u2net).
+"""
+
+import io
+import os
+import sys
+
+import pytest
+from PIL import Image, ImageDraw
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+def make_image(format: str = 'PNG', size=(64, 48)) -> bytes:
+    """Sujet sombre sur fond clair"""
+    image = Image.new('RGB', size, (240, 240, 240))
+    ImageDraw.Draw(image).ellipse((16, 8, 48, 40), fill=(30, 60, 120))
+    buffer = io.BytesIO()
+    image.save(buffer, format=format)
+    return buffer.getvalue()
+
+
+class StubSession:
+    """Session sans poids : le sujet sombre est détouré par seuillage"""
+
+    def predict(self, image, *args, **kwargs):
+        return [image.convert('L').point(lambda value: 255 if value < 128 else 0)]
+
+
+def stub_sessions(engine):
+    """Remplace les sessions onnxruntime du moteur (tests hors ligne, sans modèles)"""
+    engine.get_session = lambda model_name='u2net': StubSession()
+    return engine
+
+
+def model_weights_available(model_name: str = 'u2net') -> bool:
+    """Poids du modèle présents et vérifiés (python -m engine.model_store fetch u2net)"""
+    from engine.model_store import ModelStore, ModelStoreError
+    try:
+        ModelStore().verify(model_name)
+    except (ModelStoreError, OSError, KeyError):
+        return False
+    return True
+
+
+@pytest.fixture
+def png_bytes() -> bytes:
+    return make_image('PNG')
+
+
+@pytest.fixture
+def jpeg_bytes() -> bytes:
+    return make_image('JPEG')
+
+
+@pytest.fixture(scope='session')
+def app():
+    from engine import EngineConfig, create_app
+    return create_app(EngineConfig(startup_mode='lazy'))
+
+
+@pytest.fixture
+def http(app):
+    from fastapi.testclient import TestClient
+    with TestClient(app) as client:
+        yield client
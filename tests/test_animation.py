@@ -0,0 +1,69 @@
+import io
+import sys
+
+import pytest
+from PIL import Image, features
+
+from engine.animation import APNGWriter, AnimatedWebPWriter
+
+pytestmark = pytest.mark.skipif(not features.check("webp_anim"), reason="Pillow sans WebP animé")
+
+
+def frames():
+    for shade in (0, 120, 240):
+        yield Image.new("RGBA", (32, 24), (shade, 80, 160, 255)), 50
+
+
+def encode(writer) -> Image.Image:
+    for frame, duration in frames():
+        writer.add(frame, duration)
+    return Image.open(io.BytesIO(writer.finish()))
+
+
+def test_webp_streaming_encoder():
+    animation = encode(AnimatedWebPWriter((32, 24)))
+    assert animation.format == "WEBP" and animation.n_frames == 3
+
+
+def test_webp_with_changed_private_encoder(monkeypatch):
+    # Signature de PIL._webp.WebPAnimEncoder modifiée : repli sur Image.save
+    from PIL import _webp
+    original = _webp.WebPAnimEncoder
+
+    def encoder(*args):
+        # Image.save (Pillow) garde l'encodeur d'origine
+        if sys._getframe(1).f_globals['__name__'] == 'engine.animation':
+            raise TypeError("signature inattendue")
+        return original(*args)
+
+    monkeypatch.setattr(_webp, "WebPAnimEncoder", encoder)
+    writer = AnimatedWebPWriter((32, 24))
+    assert writer.encoder is None
+    animation = encode(writer)
+    assert animation.format == "WEBP" and animation.n_frames == 3
+
+
+def test_apng():
+    animation = encode(APNGWriter((32, 24)))
+    assert animation.format == "PNG" and animation.n_frames == 3
+
+
+def test_video_temp_file_removed_without_iteration(tmp_path, monkeypatch):
+    cv2 = pytest.importorskip("cv2")
+    import numpy as np
+    from engine import animation
+
+    clip = tmp_path / "clip.avi"
+    writer = cv2.VideoWriter(str(clip), cv2.VideoWriter_fourcc(*"MJPG"), 10, (32, 24))
+    for value in range(3):
+        writer.write(np.full((24, 32, 3), value * 80, dtype=np.uint8))
+    writer.release()
+
+    monkeypatch.setattr(animation.tempfile, "tempdir", str(tmp_path / "tmp"))
+    (tmp_path / "tmp").mkdir()
+    # Requête annulée avant la première image
+    with pytest.raises(RuntimeError):
+        with animation.open_video_frames(clip.read_bytes()) as (frame_count, frames):
+            assert frame_count == 3
+            raise RuntimeError("annulée")
+    assert not list((tmp_path / "tmp").iterdir())
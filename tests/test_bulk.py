@@ -0,0 +1,76 @@
+import io
+import os
+import subprocess
+import sys
+import zipfile
+
+import pytest
+
+from engine import bulk
+
+from conftest import ROOT, make_image, model_weights_available
+
+
+def test_safe_name_rejects_paths_outside_output():
+    assert bulk.safe_name("photos/./a.png") == "photos/a.png"
+    assert bulk.safe_name("../x.png") is None
+    assert bulk.safe_name("photos/../../x.png") is None
+    assert bulk.safe_name("/etc/x.png") is None
+    assert bulk.safe_name("C:\\x.png") is None
+
+
+def test_archive_members_are_normalised(tmp_path):
+    archive = tmp_path / "export.zip"
+    with zipfile.ZipFile(archive, "w") as handle:
+        for name in ("ok/a.png", "../x.png", "/etc/x.png", "notes.txt"):
+            handle.writestr(name, b"data")
+    assert [name for name, _, _ in bulk.iter_inputs(str(archive))] == ["ok/a.png"]
+
+
+def test_content_hash_of_file_matches_bytes(tmp_path):
+    data = make_image()
+    path = tmp_path / "a.png"
+    path.write_bytes(data)
+    assert bulk.content_hash(("a.png", str(path), None)) == bulk.content_hash(("a.png", None, data))
+
+
+def test_coordinator_does_not_load_inference():
+    code = "import sys, engine.bulk; print(sorted(m for m in ('rembg', 'onnxruntime', 'engine.app') if m in sys.modules))"
+    output = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert output.stdout.strip() == "[]"
+
+
+def test_cli_jpeg_output_and_exit(tmp_path):
+    # Les workers (spawn) chargent les vrais modèles : pas de stub possible
+    if not model_weights_available():
+        pytest.skip("poids de u2net absents (python -m engine.model_store fetch u2net)")
+    source, output = tmp_path / "in", tmp_path / "out"
+    source.mkdir()
+    (source / "a.jpg").write_bytes(make_image('JPEG'))
+    (source / "a.png").write_bytes(make_image('PNG'))
+
+    # Le CLI doit rendre la main (timeout sinon)
+    process = subprocess.run(
+        [sys.executable, "-m", "engine.bulk", str(source), str(output), "--format", "jpeg", "--workers", "1"],
+        cwd=ROOT, capture_output=True, text=True, timeout=300
+    )
+    assert process.returncode == 0, process.stdout + process.stderr
+
+    # a.jpg et a.png ne se remplacent pas, et sont en JPEG
+    outputs = sorted(path.name for path in output.iterdir() if path.name != bulk.MANIFEST_NAME)
+    assert outputs == ["a.jpg.jpg", "a.png.jpg"]
+    for name in outputs:
+        assert (output / name).read_bytes()[:3] == b"\xff\xd8\xff"
+
+
+def test_duplicate_of_failed_file_counts_as_failed(tmp_path):
+    from engine import EngineConfig
+
+    source, output = tmp_path / "in", tmp_path / "out"
+    source.mkdir()
+    for name in ("a.png", "b.png"):
+        (source / name).write_bytes(b"pas une image")
+    options = {'model': 'u2net', 'white_bg': False, 'roi': False,
+               'latency_budget_ms': None, 'animation_format': 'webp'}
+    stats = bulk.run_bulk(str(source), str(output), EngineConfig(startup_mode='lazy'), options, workers=1)
+    assert (stats['processed'], stats['skipped'], stats['failed']) == (0, 0, 2)
@@ -0,0 +1,66 @@
+import os
+
+import pytest
+
+from engine import cache
+from engine.cache import KEY_PREFIX, MemoryCache, RedisCache, TieredCache
+
+redis = pytest.importorskip("redis")
+fakeredis = pytest.importorskip("fakeredis")
+
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer()
+
+
+def redis_cache(server, **options) -> RedisCache:
+    connection = getattr(fakeredis, "FakeRedisConnection", None) or fakeredis.FakeConnection
+    pool = redis.ConnectionPool(connection_class=connection, server=server)
+    return RedisCache(connection_pool=pool, **options)
+
+
+def test_values_shared_between_instances(server, monkeypatch):
+    writer = redis_cache(server)
+    writer.put("mask", b"\x00" * 10_000)
+    assert writer.get("mask") == b"\x00" * 10_000
+
+    # Autre instance (autre hôte) : accès comptés comme distants
+    monkeypatch.setattr(cache, "INSTANCE_ID", b"autre-id")
+    reader = redis_cache(server)
+    assert reader.get_many(["mask", "absent"]) == {"mask": b"\x00" * 10_000}
+    stats = reader.stats()
+    assert (stats['hits'], stats['remote_hits'], stats['misses']) == (1, 1, 1)
+
+
+def test_compression_only_when_it_pays(server):
+    store = redis_cache(server)
+    store.put("zeros", b"\x00" * 10_000)
+    random_bytes = os.urandom(10_000)
+    store.put("random", random_bytes)
+    assert store.stats()['compression_saved_bytes'] > 9_000
+    assert store.get("random") == random_bytes
+
+
+@pytest.mark.parametrize("stored", [b"", b"\x01", b"\x01" + b"12345678" + b"pas du zlib"])
+def test_corrupt_value_is_a_miss(server, stored):
+    store = redis_cache(server)
+    store.client.set(KEY_PREFIX + "k", stored)
+    assert store.get("k") is None
+    assert store.get_many(["k"]) == {}
+    stats = store.stats()
+    assert stats['misses'] == 2 and stats['errors'] == 2
+
+
+def test_unreachable_server_degrades_to_misses():
+    store = RedisCache(url="redis://127.0.0.1:1/0")
+    store.put("k", b"valeur")
+    assert store.get("k") is None
+    assert store.stats()['errors'] == 2
+
+
+def test_tiered_cache_fills_memory_front(server):
+    tiered = TieredCache(MemoryCache(1 << 20), redis_cache(server))
+    redis_cache(server).put("k", b"valeur")
+    assert tiered.get("k") == b"valeur"
+    assert tiered.front.get("k") is not None
@@ -0,0 +1,53 @@
+import httpx
+from fastapi.testclient import TestClient
+
+from client import IN_FLIGHT_PER_WORKER, BackgroundRemovalClient, RemovalResult, retry_delay, sniff_content_type
+from engine import EngineConfig, create_app
+
+from conftest import make_image, stub_sessions
+
+
+def test_sniff_content_type():
+    assert sniff_content_type(make_image('JPEG')[:16]) == 'image/jpeg'
+    assert sniff_content_type(make_image('WEBP')[:16]) == 'image/webp'
+    assert sniff_content_type(b'\x00\x00\x00\x18ftypmp42') == 'video/mp4'
+    assert sniff_content_type(b'inconnu') == 'image/png'
+
+
+def test_malformed_retry_after_falls_back_to_backoff():
+    response = httpx.Response(429, headers={'Retry-After': 'Mon, 99 Foo 2024'})
+    assert 0.5 <= retry_delay(response, 1, backoff=1.0, max_backoff=30.0) <= 2.0
+
+
+def test_remove_background_from_bytes(png_bytes):
+    app = create_app(EngineConfig(startup_mode='lazy'))
+    stub_sessions(app.state.engine.get())
+    with TestClient(app) as http, BackgroundRemovalClient(max_retries=0) as client:
+        client.http.close()
+        client.http = http
+        result = client.remove_background(png_bytes)
+    assert result.media_type == 'image/png'
+    assert result.content[:8] == b'\x89PNG\r\n\x1a\n'
+
+
+def test_map_keeps_a_bounded_window(tmp_path, monkeypatch):
+    source, output = tmp_path / "in", tmp_path / "out"
+    source.mkdir()
+    for index in range(12):
+        (source / f"{index}.png").write_bytes(make_image())
+    submitted, peak = [], []
+
+    def remove_background(path, **options):
+        submitted.append(path)
+        return RemovalResult(b"png", 'image/png', 'u2net', None, None)
+
+    with BackgroundRemovalClient(max_concurrency=2) as client:
+        monkeypatch.setattr(client, 'remove_background', remove_background)
+        outcomes = []
+        for path, outcome in client.map(source, output):
+            # Soumises mais pas encore rendues : au plus max_concurrency * IN_FLIGHT_PER_WORKER
+            peak.append(len(submitted) - len(outcomes))
+            outcomes.append(outcome)
+    assert sorted(path.name for path in outcomes) == sorted(f"{index}.png" for index in range(12))
+    assert all((output / f"{index}.png").read_bytes() == b"png" for index in range(12))
+    assert max(peak) <= 2 * IN_FLIGHT_PER_WORKER
@@ -0,0 +1,52 @@
+import threading
+import time
+
+import pytest
+
+from engine.coalesce import InFlightRequests
+from engine.deadline import Cancellation, ClientDisconnected, DeadlineExceeded
+
+
+def _leader(in_flight: InFlightRequests, release: threading.Event) -> threading.Thread:
+    """Calcul en cours pour la clé 'k', terminé quand release est levé"""
+    started = threading.Event()
+
+    def compute():
+        started.set()
+        release.wait(5)
+        return "résultat"
+
+    thread = threading.Thread(target=in_flight.run, args=("k", compute))
+    thread.start()
+    started.wait(5)
+    return thread
+
+
+def test_follower_shares_result():
+    in_flight, release = InFlightRequests(), threading.Event()
+    leader = _leader(in_flight, release)
+    threading.Timer(0.1, release.set).start()
+    assert in_flight.run("k", lambda: "autre", Cancellation()) == ("résultat", True)
+    leader.join()
+
+
+def test_follower_stops_at_its_deadline():
+    in_flight, release = InFlightRequests(), threading.Event()
+    leader = _leader(in_flight, release)
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        in_flight.run("k", lambda: "autre", Cancellation(time.monotonic() + 0.2))
+    assert time.monotonic() - started < 1
+    release.set()
+    leader.join()
+
+
+def test_follower_stops_when_client_leaves():
+    in_flight, release = InFlightRequests(), threading.Event()
+    leader = _leader(in_flight, release)
+    cancellation = Cancellation()
+    threading.Timer(0.1, cancellation.disconnected.set).start()
+    with pytest.raises(ClientDisconnected):
+        in_flight.run("k", lambda: "autre", cancellation)
+    release.set()
+    leader.join()
@@ -0,0 +1,61 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from engine import EngineConfig, create_app
+from engine.deadline import Cancellation
+
+
+def test_disconnect_detected_with_request_logging(png_bytes):
+    app = create_app(EngineConfig(startup_mode='lazy', log_requests=True))
+    engine = app.state.engine.get()
+    seen = {}
+
+    def remove_background_stream(image_data, cancellation=None, **options):
+        # Traitement long : attend la déconnexion du client
+        seen['disconnected'] = cancellation.disconnected.wait(5)
+        cancellation.check("du test")
+
+    engine.remove_background_stream = remove_background_stream
+
+    upload = httpx.Request("POST", "http://testserver/remove-background",
+                           files={'image': ('a.png', png_bytes, 'image/png')})
+    body = upload.read()
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'POST',
+        'scheme': 'http', 'path': '/remove-background', 'raw_path': b'/remove-background',
+        'query_string': b'', 'root_path': '', 'client': ('127.0.0.1', 1234), 'server': ('testserver', 80),
+        'headers': [(key.lower(), value) for key, value in upload.headers.raw],
+    }
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    sent = []
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        # Le client part pendant le traitement
+        await asyncio.sleep(0.2)
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+
+    started = time.monotonic()
+    asyncio.run(app(scope, receive, send))
+    assert seen['disconnected']
+    assert time.monotonic() - started < 5
+    assert sent[0]['status'] == 499
+
+
+@pytest.mark.parametrize("value", ["nan", "inf", "-inf", "0", "-5", "abc"])
+def test_invalid_deadline_header_rejected(value):
+    with pytest.raises(ValueError):
+        Cancellation.from_headers({'x-deadline-ms': value})
+
+
+def test_invalid_deadline_header_is_400(http, png_bytes):
+    response = http.post("/remove-background", headers={'X-Deadline-Ms': 'nan'},
+                         files={'image': ('a.png', png_bytes, 'image/png')})
+    assert response.status_code == 400
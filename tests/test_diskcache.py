@@ -0,0 +1,111 @@
+import threading
+import time
+
+from engine import cache as cache_module, diskcache
+from engine.diskcache import DiskCache
+
+
+def test_values_survive_restart(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=1 << 20)
+    cache.put("a", b"valeur")
+    assert bytes(DiskCache(str(tmp_path), max_bytes=1 << 20).get("a")) == b"valeur"
+
+
+def test_compaction_keeps_recent_entries(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=10_000, segment_bytes=2_000)
+    for index in range(12):
+        cache.put(f"k{index}", bytes([index]) * 1_000)
+        cache.get("k0")
+        time.sleep(0.01)
+    cache._compactor.submit(lambda: None).result()
+
+    assert cache.compactions >= 1
+    assert cache.size <= 10_000
+    # k0, lu après chaque écriture, est le plus récent pour la politique LRU
+    assert bytes(cache.get("k0")) == bytes([0]) * 1_000
+    assert cache.get("k1") is None
+    assert not [path for path in tmp_path.iterdir() if path.name.endswith(".tmp")]
+
+
+def test_reads_continue_during_compaction(tmp_path, monkeypatch):
+    cache = DiskCache(str(tmp_path), max_bytes=10_000)
+    for index in range(8):
+        cache.put(f"k{index}", bytes([index]) * 1_000)
+
+    # Copie ralentie : les lectures ne doivent pas attendre la compaction
+    copying, release = threading.Event(), threading.Event()
+    write_record = DiskCache._write_record
+
+    def slow_write(*args):
+        copying.set()
+        release.wait(5)
+        return write_record(*args)
+
+    monkeypatch.setattr(DiskCache, "_write_record", staticmethod(slow_write))
+    cache.max_bytes = 5_000
+    compaction = threading.Thread(target=cache._compact)
+    compaction.start()
+    assert copying.wait(5)
+
+    started = time.monotonic()
+    assert bytes(cache.get("k7")) == bytes([7]) * 1_000
+    assert time.monotonic() - started < 1
+    release.set()
+    compaction.join()
+    assert bytes(cache.get("k7")) == bytes([7]) * 1_000
+
+
+def test_misses_refresh_only_after_writes(tmp_path, monkeypatch):
+    cache = DiskCache(str(tmp_path), max_bytes=1 << 20)
+    other = DiskCache(str(tmp_path), max_bytes=1 << 20)
+    refreshes = []
+    refresh = cache._refresh
+    monkeypatch.setattr(cache, "_refresh", lambda: refreshes.append(1) or refresh())
+    for index in range(20):
+        assert cache.get(f"absent{index}") is None
+    assert not refreshes
+
+    # Écriture d'un autre processus : un seul rattrapage
+    other.put("k", b"valeur")
+    assert bytes(cache.get("k")) == b"valeur"
+    assert cache.get("absent") is None
+    assert len(refreshes) == 1
+
+
+def test_disk_backend_has_no_memory_copy(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache_module, "CACHE_BACKEND", "disk")
+    monkeypatch.setattr(diskcache, "DISK_CACHE_DIR", str(tmp_path))
+    cache = cache_module.cache_from_env()
+    assert isinstance(cache, DiskCache)
+    cache.put("a", b"valeur")
+    # Lecture en place dans le segment
+    assert isinstance(cache.get("a"), memoryview)
+
+
+def test_access_stats_survive_restart(tmp_path, monkeypatch):
+    monkeypatch.setattr(diskcache, "ACCESS_FLUSH_S", 0)
+    cache = DiskCache(str(tmp_path), max_bytes=1 << 20)
+    cache.put("a", b"valeur a")
+    cache.put("b", b"valeur b")
+    for _ in range(3):
+        cache.get("a")
+
+    restarted = DiskCache(str(tmp_path), max_bytes=1 << 20)
+    assert restarted._index["a"].hits == 3
+    assert restarted._index["a"].atime > restarted._index["b"].atime
+
+
+def test_eviction_sees_other_workers_reads(tmp_path, monkeypatch):
+    monkeypatch.setattr(diskcache, "ACCESS_FLUSH_S", 0)
+    writer = DiskCache(str(tmp_path), max_bytes=10_000, segment_bytes=2_000)
+    reader = DiskCache(str(tmp_path), max_bytes=10_000, segment_bytes=2_000)
+    for index in range(12):
+        writer.put(f"k{index}", bytes([index]) * 1_000)
+        # k0 n'est lu que par l'autre worker
+        assert reader.get("k0") is not None
+        time.sleep(0.01)
+    writer._compactor.submit(lambda: None).result()
+
+    assert writer.compactions >= 1
+    assert bytes(writer.get("k0")) == bytes([0]) * 1_000
+    assert writer.get("k1") is None
@@ -0,0 +1,20 @@
+import numpy as np
+
+from engine.fastpath import clean_mask
+
+
+def test_clean_mask_removes_specks_and_fills_holes():
+    mask = np.zeros((40, 40), dtype=bool)
+    mask[10:30, 10:30] = True
+    mask[20, 20] = False  # trou
+    mask[2, 2] = True     # poussière
+    cleaned = clean_mask(mask)
+    assert cleaned.dtype == bool
+    assert cleaned[20, 20] and not cleaned[2, 2]
+    assert cleaned[10:30, 10:30].all()
+
+
+def test_clean_mask_keeps_subject_touching_the_border():
+    mask = np.zeros((20, 20), dtype=bool)
+    mask[:, :8] = True
+    assert (clean_mask(mask) == mask).all()
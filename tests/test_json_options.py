@@ -0,0 +1,62 @@
+import base64
+
+import pytest
+from fastapi import HTTPException
+
+from engine.app import read_options
+from engine.framing import pack_frame, unpack_frame
+
+
+def test_defaults_and_number_budget():
+    options = read_options({'latency_budget_ms': 800, 'white_bg': None})
+    assert options['latency_budget_ms'] == 800.0
+    assert options['white_bg'] is False
+    assert options['model'] == 'u2net'
+
+
+@pytest.mark.parametrize("body", [
+    {'latency_budget_ms': "800"},
+    {'format': 3},
+    {'padding': True},
+    {'padding': -1},
+    {'roi': "yes"},
+    {'model': ['u2net']},
+    {'return': 'masque'},
+])
+def test_invalid_options_rejected(body):
+    with pytest.raises(HTTPException) as error:
+        read_options(body)
+    assert error.value.status_code == 400
+
+
+def test_base64_string_budget_is_400(http, png_bytes):
+    response = http.post("/remove-background-base64", json={
+        'image': base64.b64encode(png_bytes).decode(), 'latency_budget_ms': "fast"
+    })
+    assert response.status_code == 400
+    assert 'latency_budget_ms' in response.json()['detail']
+
+
+def test_base64_non_string_image_is_400(http):
+    response = http.post("/remove-background-base64", json={'image': 12})
+    assert response.status_code == 400
+
+
+def test_uri_non_string_format_is_400(http):
+    response = http.post("/remove-background-uri", json={
+        'source': "s3://bucket/a.png", 'destination': "s3://bucket/b.png", 'format': 3
+    })
+    assert response.status_code == 400
+    response = http.post("/remove-background-uri", json={'source': 5, 'destination': "s3://bucket/b.png"})
+    assert response.status_code == 400
+
+
+def test_websocket_invalid_option_is_400_frame(http, png_bytes):
+    with http.websocket_connect("/ws/remove-background") as websocket:
+        websocket.send_bytes(pack_frame({'id': 1, 'format': 3}, png_bytes))
+        header, _ = unpack_frame(websocket.receive_bytes())
+        assert (header['id'], header['status']) == (1, 400)
+        # La connexion reste utilisable
+        websocket.send_bytes(pack_frame({'id': 2, 'latency_budget_ms': "800"}, png_bytes))
+        header, _ = unpack_frame(websocket.receive_bytes())
+        assert (header['id'], header['status']) == (2, 400)
@@ -0,0 +1,67 @@
+import io
+
+import numpy as np
+from PIL import Image
+
+from engine import EngineConfig, core, create_app
+
+
+def _noise_image() -> bytes:
+    """Image sans fond uni : le fast path la refuse"""
+    pixels = np.random.default_rng(0).integers(0, 256, (48, 64, 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def _admitted_models(app, image: bytes, model: str = 'auto'):
+    """(modèle reçu par le moteur, créneaux par modèle pendant le traitement)"""
+    engine = app.state.engine.get()
+    scheduler = app.state.scheduler
+    seen = {}
+
+    def remove_background_stream(image_data, model_name=None, **options):
+        seen['model'] = model_name
+        seen['running'] = dict(scheduler.running_by_model)
+        raise ValueError("arrêt du test")
+
+    engine.remove_background_stream = remove_background_stream
+    from fastapi.testclient import TestClient
+    with TestClient(app) as client:
+        response = client.post(
+            "/remove-background", params={'model': model},
+            files={'image': ('a.png', image, 'image/png')}
+        )
+    assert response.status_code == 500
+    return seen['model'], {name: count for name, count in seen['running'].items() if count}
+
+
+def test_auto_admitted_as_fast_path(png_bytes):
+    app = create_app(EngineConfig(startup_mode='lazy'))
+    assert _admitted_models(app, png_bytes) == ('fast-path', {'fast-path': 1})
+
+
+def test_auto_admitted_as_routed_model():
+    app = create_app(EngineConfig(startup_mode='lazy'))
+    expected = app.state.engine.get().router.choose(Image.open(io.BytesIO(_noise_image())))
+    assert expected != 'auto'
+    assert _admitted_models(app, _noise_image()) == (expected, {expected: 1})
+
+
+def test_explicit_model_unchanged(png_bytes):
+    app = create_app(EngineConfig(startup_mode='lazy'))
+    assert _admitted_models(app, png_bytes, 'silueta') == ('silueta', {'silueta': 1})
+
+
+def test_engine_accepts_resolved_fast_path(png_bytes, monkeypatch):
+    engine = create_app(EngineConfig(startup_mode='lazy')).state.engine.get()
+    calls = []
+    segment = core.segment_uniform_background
+    monkeypatch.setattr(core, 'segment_uniform_background', lambda image: calls.append(1) or segment(image))
+
+    assert engine.resolve_model(png_bytes, 'auto') == 'fast-path'
+    stream, model_used = engine.remove_background_stream(png_bytes, model_name='fast-path')
+    assert model_used == 'fast-path'
+    assert b"".join(stream).startswith(b"\x89PNG")
+    # Le masque du routage est repris : une seule segmentation
+    assert len(calls) == 1
@@ -0,0 +1,110 @@
+import os
+
+import pytest
+
+from engine.storage import ObjectStorage, StorageError, parse_uri
+
+from conftest import StubSession
+
+boto3 = pytest.importorskip("boto3")
+moto = pytest.importorskip("moto")
+
+MB = 1024 * 1024
+ALLOWED = "s3://src-in,s3://dst-out"
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    for name, value in (('AWS_ACCESS_KEY_ID', 'test'), ('AWS_SECRET_ACCESS_KEY', 'test'),
+                        ('AWS_DEFAULT_REGION', 'us-east-1')):
+        monkeypatch.setenv(name, value)
+    with moto.mock_aws():
+        client = boto3.client('s3')
+        for bucket in ('src-in', 'dst-out'):
+            client.create_bucket(Bucket=bucket)
+        yield client
+
+
+def test_parse_uri():
+    assert parse_uri("gs://catalogue/photos/a.jpg") == ('gs', 'catalogue', 'photos/a.jpg')
+    with pytest.raises(ValueError):
+        parse_uri("http://catalogue/a.jpg")
+
+
+def test_download(s3, png_bytes):
+    s3.put_object(Bucket='src-in', Key='photos/a.png', Body=png_bytes)
+    storage = ObjectStorage(allowed_buckets=ALLOWED)
+    handle, content_type = storage.download("s3://src-in/photos/a.png")
+    with handle:
+        assert handle.read() == png_bytes
+    assert content_type == 'image/png'
+
+    with pytest.raises(StorageError) as error:
+        storage.download("s3://src-in/absent.png")
+    assert error.value.status_code == 404
+    with pytest.raises(ValueError):
+        storage.download("s3://src-in/photos/a.png", max_bytes=10)
+
+
+def test_allowed_buckets(s3):
+    with pytest.raises(StorageError) as error:
+        ObjectStorage(allowed_buckets="s3://src-in").download("s3://dst-out/a.png")
+    assert error.value.status_code == 403
+
+
+def test_unconfigured_storage_denies_every_bucket(s3, app, http):
+    with pytest.raises(StorageError) as error:
+        ObjectStorage(allowed_buckets="").download("s3://other/a.png")
+    assert error.value.status_code == 403
+
+    # Instance sans STORAGE_ALLOWED_BUCKETS
+    assert not app.state.storage.allowed
+    response = http.post("/remove-background-uri", json={
+        'source': "s3://other/a.png", 'destination': "s3://other/b.png"
+    })
+    assert response.status_code == 403
+
+
+def test_small_result_single_put(s3):
+    storage = ObjectStorage(allowed_buckets=ALLOWED)
+    assert storage.upload("s3://dst-out/a.png", [b"ab", b"cd"], 'image/png') == 4
+    stored = s3.get_object(Bucket='dst-out', Key='a.png')
+    assert stored['Body'].read() == b"abcd" and stored['ContentType'] == 'image/png'
+    assert storage.stats()['multipart_uploads'] == 0
+
+
+def test_large_result_multipart(s3):
+    storage = ObjectStorage(allowed_buckets=ALLOWED, part_bytes=5 * MB, upload_concurrency=2)
+    data = os.urandom(12 * MB)
+    chunks = (data[offset:offset + MB] for offset in range(0, len(data), MB))
+    assert storage.upload("s3://dst-out/large.png", chunks, 'image/png') == len(data)
+    assert s3.get_object(Bucket='dst-out', Key='large.png')['Body'].read() == data
+    assert storage.stats()['multipart_uploads'] == 1
+
+
+def test_failed_encoding_aborts_multipart(s3):
+    def chunks():
+        yield b"\x00" * 6 * MB
+        raise RuntimeError("encodage interrompu")
+
+    storage = ObjectStorage(allowed_buckets=ALLOWED, part_bytes=5 * MB)
+    with pytest.raises(RuntimeError):
+        storage.upload("s3://dst-out/broken.png", chunks(), 'image/png')
+    assert not s3.list_multipart_uploads(Bucket='dst-out').get('Uploads')
+    assert 'Contents' not in s3.list_objects_v2(Bucket='dst-out')
+
+
+def test_remove_background_uri_endpoint(s3, app, http, png_bytes, monkeypatch):
+    monkeypatch.setattr(app.state.storage, 'allowed', set(ALLOWED.split(",")))
+    monkeypatch.setattr(app.state.engine.get(), 'get_session', lambda model_name='u2net': StubSession())
+    s3.put_object(Bucket='src-in', Key='a.png', Body=png_bytes, ContentType='image/png')
+    response = http.post("/remove-background-uri", json={
+        'source': "s3://src-in/a.png", 'destination': "s3://dst-out/a.png"
+    })
+    assert response.status_code == 200, response.text
+    assert s3.get_object(Bucket='dst-out', Key='a.png')['Body'].read()[:8] == b'\x89PNG\r\n\x1a\n'
+
+    response = http.post("/remove-background-uri", json={
+        'source': "s3://src-in/absent.png", 'destination': "s3://dst-out/b.png"
+    })
+    assert response.status_code == 404